@@ -1,59 +1,98 @@
 import time
 from core.database import DatabaseManager
 from core.cloud_client import CloudClient
+from core.rates import RateEngine
 
 class TrafficAggregator:
-    def __init__(self):
+    def __init__(self, db=None, checksum_every=60, archive=None, cloud=None):
         self.last_check_time = time.time()
-        self.db = DatabaseManager()
+        self.db = db or DatabaseManager()
+        # Optional columnar copy of every tick's flows (core.archive), written on save
+        self.archive = archive
         self.global_totals = self.db.load_traffic()
+
+        # Only apps that moved bytes since the last save_data() are written, as deltas;
+        # every checksum_every saves the stored totals are verified against ours
+        self.dirty = {}
+        self.checksum_every = checksum_every
+        self.saves = 0
+
+        # Smoothed per-app speeds for the apps active right now (rates.current)
+        self.rates = RateEngine()
         
-        # Initialize Cloud Client (starts in logged-out state)
-        self.cloud = CloudClient()
+        # Initialize Cloud Client (starts in logged-out state; logs still go to its outbox)
+        self.cloud = cloud or CloudClient()
 
-    def calculate_rates(self, fresh_traffic_data):
-        now = time.time()
+        # Packet sampling behind the latest tick (PacketSniffer.get_sampling_stats)
+        self.sampling = {"rate": 1, "max_rate": 1, "error": 0.0}
+
+    def calculate_rates(self, fresh_traffic_data, now=None, sampling=None):
+        """Folds one tick of flows into totals, logs and rates; returns the RateChanges."""
+        # `now` lets offline replay tick on capture time instead of the wall clock
+        if now is None: now = time.time()
+        if sampling is not None: self.sampling = sampling
         elapsed = now - self.last_check_time
         if elapsed < 0.1: elapsed = 0.1
         self.last_check_time = now
         
-        current_rates_ui = {app: [0.0, 0.0] for app in self.global_totals.keys()}
+        app_bytes = {}
         log_entries = []
         
         for (app_name, src_ip, dst_ip), (new_down, new_up) in fresh_traffic_data.items():
-            if app_name not in self.global_totals:
-                self.global_totals[app_name] = [0, 0]
-                if app_name not in current_rates_ui:
-                    current_rates_ui[app_name] = [0.0, 0.0]
-            
-            self.global_totals[app_name][0] += new_down
-            self.global_totals[app_name][1] += new_up
+            if new_down <= 0 and new_up <= 0: continue
+            moved = app_bytes.get(app_name)
+            if moved is None:
+                moved = app_bytes[app_name] = [0, 0]
+            moved[0] += new_down
+            moved[1] += new_up
             
             down_speed = (new_down / 1024) / elapsed
             up_speed = (new_up / 1024) / elapsed
             
-            current_rates_ui[app_name][0] += down_speed
-            current_rates_ui[app_name][1] += up_speed
-            
-            if new_down > 0 or new_up > 0:
-                # Format: (ts, app, down_spd, up_spd, src, dst)
-                log_entries.append((
-                    now, app_name, down_speed, up_speed, src_ip, dst_ip
-                ))
+            # Format: (ts, app, down_spd, up_spd, src, dst)
+            log_entries.append((
+                now, app_name, down_speed, up_speed, src_ip, dst_ip
+            ))
+
+        # Totals and pending deltas, once per app rather than per flow
+        for app_name, (new_down, new_up) in app_bytes.items():
+            total = self.global_totals.get(app_name)
+            if total is None:
+                total = self.global_totals[app_name] = [0, 0]
+            total[0] += new_down
+            total[1] += new_up
+            delta = self.dirty.get(app_name)
+            if delta is None:
+                delta = self.dirty[app_name] = [0, 0]
+            delta[0] += new_down
+            delta[1] += new_up
+        changes = self.rates.update(app_bytes, elapsed, now)
 
         # 1. Save logs locally and queue for cloud upload
         if log_entries:
             self.db.log_instances(log_entries)
             self.cloud.add_logs(log_entries)
+            if self.archive is not None: self.archive.append(now, fresh_traffic_data)
             
         # 2. [NEW] Send Live Status (Active Apps) to Cloud Client
         # This allows the web dashboard to see real-time apps and show the "Close" button.
-        self.cloud.update_status(current_rates_ui)
+        self.cloud.update_status(self.rates.current)
             
-        return current_rates_ui
+        return changes
 
     def save_data(self):
-        self.db.save_traffic(self.global_totals)
+        dirty, self.dirty = self.dirty, {}
+        self.db.add_traffic(dirty)
+        if self.archive is not None: self.archive.flush()
+        self.saves += 1
+        if self.checksum_every and self.saves % self.checksum_every == 0:
+            self.db.verify_traffic(self.global_totals)
+
+    def get_logs(self, app_filter=None, since=None):
+        return self.db.fetch_logs(limit=100, app_filter=app_filter, since=since)
+
+    def get_history(self, app_name, seconds):
+        """Per-bucket (down, up) KB/s for one app over the last `seconds`."""
+        now = time.time()
+        return self.db.fetch_series(now - seconds, now, app_name=app_name)
 
-    def get_logs(self, app_filter=None):
-        return self.db.fetch_logs(limit=100, app_filter=app_filter)
\ No newline at end of file
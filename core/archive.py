@@ -0,0 +1,344 @@
+import os
+import shutil
+import socket
+import threading
+from core.config import ARCHIVE_DIR, ARCHIVE_RETENTION, ARCHIVE_MAX_BYTES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# One flat little-endian file per column in every segment; a row is 36 bytes
+COLUMNS = (
+    ("timestamp", "<f8"),
+    ("app_id", "<u4"),
+    ("down", "<u8"),    # bytes in the tick, not KB/s
+    ("up", "<u8"),
+    ("src", "<u4"),     # IPv4 as an int; 0 for anything else
+    ("dst", "<u4"),
+)
+FOOTER = "footer.npz"
+APPS = "apps.txt"
+
+def open_archive(path=ARCHIVE_DIR):
+    """The configured TrafficArchive, or None if it is turned off or numpy is missing."""
+    if path is None: return None
+    if np is None:
+        print("Traffic archive disabled: numpy is not installed")
+        return None
+    return TrafficArchive(path)
+
+def ip_to_column(ip):
+    if isinstance(ip, int): return ip
+    try:
+        return int.from_bytes(socket.inet_aton(ip), "big")
+    except (OSError, TypeError):
+        return 0
+
+class Segment:
+    """One hour of rows: a directory named after its start time holding one file per
+    column. A sealed segment also has a footer with its time range, row count and
+    per-app byte sums; only the newest segment is ever appended to."""
+    def __init__(self, path):
+        self.path = path
+        self.start = int(os.path.basename(path))
+        self.footer = None
+        self._columns = None
+        self.app_set = frozenset()  # apps with bytes in a sealed segment
+        if os.path.exists(os.path.join(path, FOOTER)):
+            with np.load(os.path.join(path, FOOTER)) as data:
+                self._set_footer({key: data[key] for key in data.files})
+
+    def _set_footer(self, footer):
+        self.footer = footer
+        self.app_set = frozenset(footer["app_ids"].tolist())
+
+    @property
+    def sealed(self):
+        return self.footer is not None
+
+    def rows(self):
+        # A crash between column writes can leave some columns one batch longer
+        return min(_file_rows(os.path.join(self.path, name), dtype) for name, dtype in COLUMNS)
+
+    def columns(self):
+        """{name: read-only np.memmap} over the rows every column has (cached once sealed)."""
+        if self._columns is not None: return self._columns
+        rows = self.rows()
+        columns = {}
+        for name, dtype in COLUMNS:
+            # Plain ndarray views (the map stays alive as their base): np.memmap's
+            # subclass hooks cost more than the arithmetic on an hour's rows
+            if rows: columns[name] = np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r",
+                                               shape=(rows,)).view(np.ndarray)
+            else: columns[name] = np.zeros(0, dtype=dtype)
+        if self.sealed: self._columns = columns
+        return columns
+
+    def seal(self, app_count):
+        """Writes the footer. The segment must not be appended to afterwards."""
+        columns = self.columns()
+        ts = columns["timestamp"]
+        app_id = columns["app_id"]
+        down = np.bincount(app_id, weights=columns["down"], minlength=app_count)
+        up = np.bincount(app_id, weights=columns["up"], minlength=app_count)
+        active = np.flatnonzero(down + up)
+        footer = {
+            "rows": np.array(len(ts)),
+            "time_range": np.array([ts.min(), ts.max()] if len(ts) else [self.start, self.start]),
+            "app_ids": active.astype("<u4"),
+            "down": down[active],
+            "up": up[active],
+        }
+        tmp = os.path.join(self.path, FOOTER + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **footer)
+        os.replace(tmp, os.path.join(self.path, FOOTER))
+        self._set_footer(footer)
+
+    def disk_bytes(self):
+        return sum(_file_size(os.path.join(self.path, name)) for name in os.listdir(self.path))
+
+    def time_range(self):
+        if self.sealed:
+            first, last = self.footer["time_range"]
+            return float(first), float(last)
+        return self.start, float("inf")
+
+def _file_rows(path, dtype):
+    return _file_size(path) // np.dtype(dtype).itemsize
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+class TrafficArchive:
+    """Append-only columnar archive of per-flow bytes for long-range analysis.
+
+    Rows (time, app id, down/up bytes, src, dst) are buffered by append() and written
+    by flush() as fixed-width column files, one segment per segment_seconds of capture
+    time. When a newer segment starts, the previous one is sealed with a small footer
+    (time range and per-app totals). Queries memory-map the columns (np.memmap, no
+    copies) and aggregate them with numpy. A segment that lies wholly inside the
+    queried range is answered from its footer without being read, so a 30-day top
+    apps query only scans the partial hours at either end.
+
+    Sealed segments older than `retention` seconds before the newest row are
+    deleted, and then the oldest ones while the archive is over max_bytes. This
+    happens on opening and whenever a segment is sealed. The segment being written
+    is never deleted.
+
+    App names are kept in apps.txt, one per line, where the line number is the id.
+    One lock covers every method: the pipeline thread appends and flushes while
+    other threads query, and a query flushes pending rows first so it sees them.
+    """
+    def __init__(self, path, segment_seconds=3600, retention=ARCHIVE_RETENTION, max_bytes=ARCHIVE_MAX_BYTES):
+        self.path = path
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        self.stats = {"pruned_segments": 0, "pruned_bytes": 0}
+        self.pending = []   # (timestamp, {(app, src, dst): [down, up]}) waiting for flush()
+        self.ip_cache = {}
+        os.makedirs(path, exist_ok=True)
+
+        self.names = []
+        apps_path = os.path.join(path, APPS)
+        if os.path.exists(apps_path):
+            with open(apps_path, encoding="utf-8") as f:
+                self.names = f.read().splitlines()
+        self.ids = {name: i for i, name in enumerate(self.names)}
+
+        self.segments = sorted((Segment(os.path.join(path, entry)) for entry in os.listdir(path) if entry.isdigit()),
+                               key=lambda segment: segment.start)
+        self.current = self.segments[-1] if self.segments and not self.segments[-1].sealed else None
+        if self.current is not None:
+            self._truncate(self.current)
+        self.prune()
+
+    # --- Writes ---
+    def append(self, now, traffic_data):
+        """Queues one tick of PacketSniffer.get_traffic_data() output (bytes per flow)."""
+        if not traffic_data: return
+        with self.lock:
+            self.pending.append((now, traffic_data))
+
+    def flush(self):
+        """Writes everything appended so far, rotating to a new segment as needed."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        pending, self.pending = self.pending, []
+        batch = []
+        for now, traffic_data in pending:
+            start = int(now // self.segment_seconds) * self.segment_seconds
+            if self.current is None or start > self.current.start:
+                self._write(batch)
+                batch = []
+                self._rotate(start)
+            batch.append((now, traffic_data))
+        self._write(batch)
+
+    def close(self):
+        self.flush()
+
+    def prune(self):
+        """Deletes sealed segments past the retention or the size cap; returns how many."""
+        with self.lock:
+            sealed = [segment for segment in self.segments if segment.sealed]
+            if not sealed: return 0
+            doomed = []
+            if self.retention is not None:
+                newest = max(segment.time_range()[1] for segment in sealed)
+                if self.current is not None and self.current.rows():
+                    newest = max(newest, float(self.current.columns()["timestamp"][-1]))
+                doomed = [segment for segment in sealed if segment.time_range()[1] < newest - self.retention]
+            if self.max_bytes is not None:
+                sizes = {segment.path: segment.disk_bytes() for segment in self.segments}
+                total = sum(sizes.values()) - sum(sizes[segment.path] for segment in doomed)
+                for segment in sealed:
+                    if total <= self.max_bytes: break
+                    if segment in doomed: continue
+                    doomed.append(segment)
+                    total -= sizes[segment.path]
+            for segment in doomed:
+                size = segment.disk_bytes()
+                segment._columns = None   # unmap first: Windows cannot delete mapped files
+                try:
+                    shutil.rmtree(segment.path)
+                except OSError as e:
+                    print(f"Archive: could not delete {segment.path} ({e}), retrying later")
+                    continue
+                self.segments.remove(segment)
+                self.stats["pruned_segments"] += 1
+                self.stats["pruned_bytes"] += size
+            return len(doomed)
+
+    def _rotate(self, start):
+        if self.current is not None:
+            self.current.seal(len(self.names))
+        path = os.path.join(self.path, str(start))
+        os.makedirs(path, exist_ok=True)
+        self.current = Segment(path)
+        self.segments.append(self.current)
+        self.prune()
+
+    def _write(self, batch):
+        if not batch: return
+        ts, app_id, down, up, src, dst = [], [], [], [], [], []
+        ids, ips, new_names = self.ids, self.ip_cache, []
+        for now, traffic_data in batch:
+            for (app_name, src_ip, dst_ip), (new_down, new_up) in traffic_data.items():
+                if new_down <= 0 and new_up <= 0: continue
+                i = ids.get(app_name)
+                if i is None:
+                    i = ids[app_name] = len(self.names)
+                    self.names.append(app_name)
+                    new_names.append(app_name)
+                packed_src = ips.get(src_ip)
+                if packed_src is None: packed_src = ips[src_ip] = ip_to_column(src_ip)
+                packed_dst = ips.get(dst_ip)
+                if packed_dst is None: packed_dst = ips[dst_ip] = ip_to_column(dst_ip)
+                ts.append(now); app_id.append(i); down.append(new_down); up.append(new_up)
+                src.append(packed_src); dst.append(packed_dst)
+        if len(ips) > 65536: ips.clear()
+
+        if new_names:
+            # Names go first, so every id on disk always has its name
+            with open(os.path.join(self.path, APPS), "a", encoding="utf-8") as f:
+                f.writelines(name.replace("\n", " ") + "\n" for name in new_names)
+        for (name, dtype), values in zip(COLUMNS, (ts, app_id, down, up, src, dst)):
+            with open(os.path.join(self.current.path, name), "ab") as f:
+                f.write(np.asarray(values, dtype=dtype).tobytes())
+
+    def _truncate(self, segment):
+        rows = segment.rows()
+        for name, dtype in COLUMNS:
+            path = os.path.join(segment.path, name)
+            if os.path.exists(path):
+                os.truncate(path, rows * np.dtype(dtype).itemsize)
+
+    # --- Queries ---
+    def _overlapping(self, start, end):
+        for segment in self.segments:
+            first, last = segment.time_range()
+            if first < end and last >= start:
+                yield segment
+
+    def _scan(self, segment, start, end, names, app_id=None):
+        """The named columns of the segment's rows with start <= timestamp < end (and
+        of one app, if given). Only the columns needed are ever touched."""
+        columns = segment.columns()
+        mask = None
+        first, last = segment.time_range()
+        if not (start <= first and last < end):
+            ts = columns["timestamp"]
+            mask = (ts >= start) & (ts < end)
+        if app_id is not None:
+            is_app = columns["app_id"] == app_id
+            mask = is_app if mask is None else mask & is_app
+        if mask is None:
+            return [columns[name] for name in names]
+        return [columns[name][mask] for name in names]
+
+    def app_totals(self, start, end):
+        """(down, up) byte arrays indexed by app id, summed over [start, end)."""
+        with self.lock:
+            self._flush()
+            return self._app_totals(start, end)
+
+    def _app_totals(self, start, end):
+        ids, down, up = [], [], []
+        for segment in self._overlapping(start, end):
+            first, last = segment.time_range()
+            if segment.sealed and start <= first and last < end:
+                footer = segment.footer
+                parts = footer["app_ids"], footer["down"], footer["up"]
+            else:
+                parts = self._scan(segment, start, end, ("app_id", "down", "up"))
+            for acc, part in zip((ids, down, up), parts): acc.append(part)
+        return self._sum_by(ids, down, up, len(self.names))
+
+    def _sum_by(self, index, down, up, size):
+        # One bincount over all segments: per-segment numpy calls dominate otherwise
+        if not index: return np.zeros(size), np.zeros(size)
+        index = np.concatenate(index)
+        return (np.bincount(index, weights=np.concatenate(down), minlength=size),
+                np.bincount(index, weights=np.concatenate(up), minlength=size))
+
+    def top_apps(self, start, end, n=10):
+        """[(app_name, down_bytes, up_bytes)] of the n busiest apps in [start, end)."""
+        with self.lock:
+            down, up = self.app_totals(start, end)
+            total = down + up
+            order = np.argsort(total)[::-1][:n]
+            return [(self.names[i], int(down[i]), int(up[i])) for i in order if total[i] > 0]
+
+    def series(self, start, end, step, app_name=None):
+        """Bucket start times and (down, up) bytes per bucket of `step` seconds in [start, end),
+        for one app or all of them."""
+        with self.lock:
+            self._flush()
+            return self._series(start, end, step, app_name)
+
+    def _series(self, start, end, step, app_name):
+        buckets = max(1, int(np.ceil((end - start) / step)))
+        times = start + np.arange(buckets) * step
+        app_id = self.ids.get(app_name) if app_name is not None else None
+        if app_name is not None and app_id is None:
+            return times, np.zeros(buckets), np.zeros(buckets)
+        index, down, up = [], [], []
+        for segment in self._overlapping(start, end):
+            if app_id is not None and segment.sealed and app_id not in segment.app_set:
+                continue
+            ts, seg_down, seg_up = self._scan(segment, start, end, ("timestamp", "down", "up"), app_id)
+            index.append(((ts - start) // step).astype(np.intp))
+            down.append(seg_down)
+            up.append(seg_up)
+        down, up = self._sum_by(index, down, up, buckets)
+        return times, down, up
@@ -0,0 +1,83 @@
+import ctypes
+import shutil
+import socket
+import struct
+import subprocess
+
+SO_ATTACH_FILTER = 26
+BPF_RET_K = 0x06
+BPF_INSN = struct.Struct("HBBI")
+
+def _accept(snaplen):
+    return [(BPF_RET_K, 0, 0, snaplen)]
+
+def _ipv4(snaplen):
+    return [
+        (0x28, 0, 0, 12),          # ldh [12]
+        (0x15, 0, 1, 0x0800),      # jeq #0x800, next, drop
+        (BPF_RET_K, 0, 0, snaplen),
+        (BPF_RET_K, 0, 0, 0),
+    ]
+
+def _ipv4_tcp_udp(snaplen):
+    return [
+        (0x28, 0, 0, 12),          # ldh [12]
+        (0x15, 0, 4, 0x0800),      # jeq #0x800, next, drop
+        (0x30, 0, 0, 23),          # ldb [23] (ip proto)
+        (0x15, 1, 0, 6),           # jeq #6 (tcp), keep
+        (0x15, 0, 1, 17),          # jeq #17 (udp), keep, drop
+        (BPF_RET_K, 0, 0, snaplen),
+        (BPF_RET_K, 0, 0, 0),
+    ]
+
+# Hand-assembled programs for the common filters, usable without libpcap/tcpdump
+BUILTIN_FILTERS = {
+    "": _accept,
+    "ip": _ipv4,
+    "ip and (tcp or udp)": _ipv4_tcp_udp,
+}
+
+def compile_filter(expr, snaplen=262144):
+    """Compiles a pcap filter expression to classic BPF for an Ethernet link.
+
+    Returns a list of (code, jt, jf, k). Every accepting `ret` is clamped to snaplen,
+    so the kernel only copies the headers while tp_len still reports the wire size.
+    """
+    expr = " ".join((expr or "").split())
+    builtin = BUILTIN_FILTERS.get(expr)
+    if builtin is not None:
+        return builtin(snaplen)
+
+    program = _compile_with_libpcap(expr) or _compile_with_tcpdump(expr)
+    if program is None:
+        raise ValueError(f"Cannot compile capture filter {expr!r}: need libpcap or tcpdump")
+    return [(code, jt, jf, min(k, snaplen) if code == BPF_RET_K and k else k)
+            for code, jt, jf, k in program]
+
+def _compile_with_libpcap(expr):
+    try:
+        from scapy.arch.common import compile_filter as scapy_compile
+        prog = scapy_compile(expr, linktype=1)
+    except Exception:
+        return None
+    return [(i.code, i.jt, i.jf, i.k) for i in prog.bf_insns[:prog.bf_len]]
+
+def _compile_with_tcpdump(expr):
+    tcpdump = shutil.which("tcpdump")
+    if not tcpdump: return None
+    try:
+        out = subprocess.check_output([tcpdump, "-ddd", "-y", "EN10MB", expr],
+                                      stderr=subprocess.DEVNULL, text=True)
+    except Exception:
+        return None
+    lines = out.split()
+    count = int(lines[0])
+    values = [int(v) for v in lines[1:1 + count * 4]]
+    return [tuple(values[i:i + 4]) for i in range(0, len(values), 4)]
+
+def attach_filter(sock, program):
+    """Attaches a compiled program to a socket with SO_ATTACH_FILTER."""
+    insns = b"".join(BPF_INSN.pack(*insn) for insn in program)
+    buf = ctypes.create_string_buffer(insns, len(insns))
+    fprog = struct.pack("HL", len(program), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
@@ -1,24 +1,106 @@
-import threading, requests, time
+import gzip, json, random, threading, time, requests
+from core.config import CLOUD_OUTBOX_DIR, CLOUD_OUTBOX_MAX_BYTES, CLOUD_OVERFLOW
+from core.outbox import Outbox
 from core.system_control import kill_process_by_name
 
 BASE_URL = "http://127.0.0.1:5000/api"
 
+# Log tuple fields, in order, as columns of a sync payload
+LOG_COLUMNS = ("timestamp", "app", "down", "up", "src", "dst")
+
+def encode_batch(logs, status, client=None, seq=None):
+    """Gzipped JSON sync body: logs as columns, app names as a dictionary.
+
+    {"format": "columnar", "client": outbox id, "seq": sequence number of the first row,
+    "apps": [name, ...], "logs": {"timestamp": [...], "app": [index into apps, ...],
+    "down": [...], "up": [...], "src": [...], "dst": [...]}, "status": [...]}
+
+    Row i of a batch is row seq + i of its client, and a resent batch keeps its
+    numbers, so the server can skip rows it has already stored.
+    """
+    apps, app_index = [], {}
+    timestamps, app_ids, down, up, src, dst = [], [], [], [], [], []
+    for ts, app, down_speed, up_speed, src_ip, dst_ip in logs:
+        i = app_index.get(app)
+        if i is None:
+            i = app_index[app] = len(apps)
+            apps.append(app)
+        timestamps.append(ts); app_ids.append(i); down.append(down_speed); up.append(up_speed)
+        src.append(src_ip); dst.append(dst_ip)
+    payload = {
+        "format": "columnar",
+        "client": client,
+        "seq": seq,
+        "apps": apps,
+        "logs": dict(zip(LOG_COLUMNS, (timestamps, app_ids, down, up, src, dst))),
+        "status": status,
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return raw, gzip.compress(raw, compresslevel=1)
+
 class CloudClient:
-    def __init__(self):
-        self.queue = []
+    """Uploads logs and live status to the cloud dashboard and runs its commands.
+
+    Logs wait in a durable on-disk Outbox (core.outbox) under outbox_path, logged in
+    or not, and drain in order after login, a reconnect or a restart. The outbox is
+    capped at CLOUD_OUTBOX_MAX_BYTES; CLOUD_OVERFLOW decides whether the oldest or
+    the newest rows are dropped past that. With outbox_path None, logs are not
+    uploaded at all. A worker thread posts them over one keep-alive Session as
+    gzipped columnar batches (encode_batch), each acknowledged in the outbox only
+    once the server has accepted it.
+
+    Batches adapt to the link: one that comes back within target_latency with more
+    rows waiting doubles the batch size, and a slow one halves it (min_batch to
+    max_batch). A batch the server refuses as too large (413) is halved and retried
+    at once, and the batch size stays below it from then on. The worker posts again immediately while a full batch is waiting,
+    and otherwise waits up to `interval` seconds, so live status and commands still
+    flow when idle. After a failed post the same batch is sent again, once an
+    exponential backoff (with jitter, up to max_backoff seconds) has passed.
+    """
+    def __init__(self, base_url=BASE_URL, outbox_path=CLOUD_OUTBOX_DIR, interval=2.0, min_batch=50,
+                 max_batch=20000, target_latency=0.5, max_backoff=60.0, timeout=10.0):
+        self.base_url = base_url
+        self.outbox = Outbox(outbox_path, CLOUD_OUTBOX_MAX_BYTES, CLOUD_OVERFLOW) if outbox_path is not None else None
+        self.interval = interval
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.batch = min_batch
+        self.batch_limit = max_batch   # lowered by 413 replies
+        self.target_latency = target_latency
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
         self.latest_status = []
         self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.session = requests.Session()
         self.running = True
         self.token = None
-        threading.Thread(target=self._worker, daemon=True).start()
+        self.failures = 0
+        self.stats = {"sent_rows": 0, "batches": 0, "raw_bytes": 0, "sent_bytes": 0, "failures": 0,
+                      "too_large": 0, "last_latency_ms": 0.0}
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
 
     def login(self, username, password):
         try:
-            r = requests.post(f"{BASE_URL}/login", json={"username": username, "password": password})
-            if r.status_code == 200: self.token = r.json().get("access_token"); return True
-        except: pass
+            r = self.session.post(f"{self.base_url}/login", json={"username": username, "password": password},
+                                  timeout=self.timeout)
+            if r.status_code == 200:
+                with self.lock:
+                    self.token = r.json().get("access_token")
+                    self.failures = 0
+                    self.wakeup.notify()  # start draining the outbox now
+                return True
+        except Exception: pass
         return False
 
+    def logout(self):
+        """Stops syncing; unsent logs stay in the outbox for the next login."""
+        with self.lock:
+            self.token = None
+            self.latest_status = []
+
     def update_status(self, rates):
         """Prepares live status list: [{'name': 'Chrome', 'down': 50.0, 'up': 2.0}, ...]"""
         if not self.token: return
@@ -28,27 +110,97 @@ class CloudClient:
         with self.lock: self.latest_status = status
 
     def add_logs(self, logs):
-        if self.token:
-            with self.lock: self.queue.extend(logs)
+        if self.outbox is None: return
+        self.outbox.append(logs)
+        if self.token and self.outbox.backlog >= self.batch:
+            with self.lock: self.wakeup.notify()
+
+    def stop(self, timeout=None):
+        """Ends the worker (after any post in flight) and syncs the outbox to disk. A post
+        that outlasts `timeout` may still ack its batch; the closed outbox allows that."""
+        with self.lock:
+            self.running = False
+            self.wakeup.notify()
+        self.thread.join(self.timeout if timeout is None else timeout)
+        self.session.close()
+        if self.outbox is not None: self.outbox.close()
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.stats, batch=self.batch)
+        if self.outbox is not None:
+            metrics.update(self.outbox.stats, backlog=self.outbox.backlog, outbox_bytes=self.outbox.disk_bytes)
+        return metrics
 
+    # --- Worker thread ---
     def _worker(self):
-        while self.running:
-            time.sleep(2)
-            if not self.token: continue
-            
+        while True:
             with self.lock:
-                logs_chunk = self.queue[:50]
-                del self.queue[:50]
+                if self.failures:
+                    # New logs do not cut a backoff short; only stop() does
+                    delay = min(self.max_backoff, self.interval * 2 ** (self.failures - 1))
+                    deadline = time.monotonic() + delay * random.uniform(0.5, 1.0)
+                    while self.running and time.monotonic() < deadline:
+                        self.wakeup.wait(deadline - time.monotonic())
+                elif not self.token or self.outbox is None or self.outbox.backlog < self.batch:
+                    self.wakeup.wait(self.interval)
+                if not self.running: return
+                token = self.token
+                if not token: continue
+                size = self.batch
                 current_status = self.latest_status
+            batch = self.outbox.peek(size) if self.outbox is not None else None
+            self._sync(token, batch, current_status)
+
+    def _sync(self, token, batch, current_status):
+        if batch is None:
+            raw, body = encode_batch([], current_status)
+        else:
+            raw, body = encode_batch(batch.rows, current_status, self.outbox.client_id, batch.seq)
+        rows = len(batch.rows) if batch is not None else 0
+        started = time.monotonic()
+        try:
+            r = self.session.post(
+                f"{self.base_url}/sync", data=body,
+                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json",
+                         "Content-Encoding": "gzip"},
+                timeout=self.timeout
+            )
+            if r.status_code == 401:
+                print("Cloud sync: session expired, logged out")
+                self.logout()
+                return
+            if r.status_code == 413 and self.batch > self.min_batch:
+                # Otherwise (already at min_batch) it backs off like any other failure
+                with self.lock:
+                    self.stats["too_large"] += 1
+                    self.batch_limit = max(self.min_batch, min(rows, self.batch) // 2)
+                    self.batch = min(self.batch, self.batch_limit)
+                return
+            r.raise_for_status()
+            commands = r.json().get("commands", [])
+        except Exception:
+            # Unacknowledged, the batch is simply read again on the next attempt
+            with self.lock:
+                self.failures += 1
+                self.stats["failures"] += 1
+                self.batch = max(self.min_batch, self.batch // 2)
+            return
 
-            try:
-                r = requests.post(
-                    f"{BASE_URL}/sync",
-                    json={"logs": logs_chunk, "status": current_status},
-                    headers={"Authorization": f"Bearer {self.token}"}, timeout=3
-                )
-                # Execute Commands (e.g., Kill App)
-                if r.status_code == 200:
-                    for cmd in r.json().get("commands", []):
-                        if cmd['action'] == 'kill': kill_process_by_name(cmd['target'])
-            except: pass
\ No newline at end of file
+        latency = time.monotonic() - started
+        if batch is not None: self.outbox.ack(batch)
+        with self.lock:
+            self.failures = 0
+            stats = self.stats
+            stats["sent_rows"] += rows
+            stats["batches"] += 1
+            stats["raw_bytes"] += len(raw)
+            stats["sent_bytes"] += len(body)
+            stats["last_latency_ms"] = latency * 1000
+            if latency > self.target_latency:
+                self.batch = max(self.min_batch, self.batch // 2)
+            elif latency < self.target_latency / 2 and self.outbox.backlog > self.batch:
+                self.batch = min(self.batch_limit, self.batch * 2)
+        # Execute Commands (e.g., Kill App)
+        for cmd in commands:
+            if cmd.get('action') == 'kill': kill_process_by_name(cmd['target'])
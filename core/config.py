@@ -0,0 +1,90 @@
+# Capture engine: "scapy" (portable), "raw" (Linux AF_PACKET ring, much faster),
+# "fanout" (Linux, CAPTURE_WORKERS raw capture processes sharing a PACKET_FANOUT group)
+# or "sockdiag" (Linux, no capture: per-socket TCP byte counters from the kernel)
+CAPTURE_BACKEND = "scapy"
+
+# Interface to capture on; None lets the backend choose (raw: all interfaces)
+CAPTURE_INTERFACE = None
+
+# Kernel-side capture filter (pcap syntax) and bytes kept per packet. Sizes are
+# always taken from the on-wire length, so a small snaplen only trims payloads.
+CAPTURE_FILTER = "ip"
+CAPTURE_SNAPLEN = 128
+
+# Worker processes for the "fanout" backend; None uses one per CPU
+CAPTURE_WORKERS = None
+
+# Most distinct (app, src, dst) flows kept per interval; beyond that the smallest are
+# folded into a per-app "other" entry (src/dst "*"), so a port scan or torrent swarm
+# cannot grow memory, log rows or cloud payloads. Per-app totals stay exact. None = no cap.
+FLOW_TABLE_MAX_FLOWS = 20000
+
+# Overload mode: when the capture falls behind, switch to 1-in-N packet sampling (N up
+# to SAMPLING_MAX_RATE, 1 disables) and scale byte counts back up. For scapy, "behind"
+# means packets reach the callback more than SAMPLING_LAG_BUDGET seconds late.
+SAMPLING_MAX_RATE = 1024
+SAMPLING_LAG_BUDGET = 0.5
+
+# How long instance logs are kept at each resolution, in seconds (None = forever).
+# Raw rows are rolled up into 1-minute, 1-hour and 1-day tables as they arrive; the
+# log viewer and history graphs read from the coarsest tier that covers the range.
+LOG_RETENTION = {
+    "raw": 7 * 86400,
+    "1m": 30 * 86400,
+    "1h": 365 * 86400,
+    "1d": None,
+}
+
+# Per-app speeds on the dashboard: "ewma" (each tick weighs RATE_EWMA_ALPHA against
+# the previous value; 1.0 shows raw per-tick speeds) or "window" (mean over the last
+# RATE_WINDOW seconds). Apps leave the list after RATE_IDLE_TIMEOUT seconds without traffic.
+RATE_SMOOTHING = "ewma"
+RATE_EWMA_ALPHA = 0.5
+RATE_WINDOW = 5.0
+RATE_IDLE_TIMEOUT = 10.0
+
+# The capture -> aggregate -> persist pipeline ticks on its own thread every TICK_INTERVAL
+# seconds (monotonic clock) and hands the UI a snapshot of each tick; per-app totals
+# are written every SAVE_INTERVAL seconds.
+TICK_INTERVAL = 1.0
+SAVE_INTERVAL = 5.0
+
+# Logs wait for cloud upload in a durable outbox under CLOUD_OUTBOX_DIR (None: no
+# upload), kept while logged out and across restarts. It holds at most
+# CLOUD_OUTBOX_MAX_BYTES; past that "drop_oldest" discards the oldest rows and
+# "drop_newest" the incoming ones.
+CLOUD_OUTBOX_DIR = "cloud_outbox"
+CLOUD_OUTBOX_MAX_BYTES = 256 * 1024 * 1024
+CLOUD_OVERFLOW = "drop_oldest"
+
+# Latency probes (core/pinger.py): display name -> IPv4 address for ICMP echo, or
+# "tcp://host:port" for TCP connect time. Every target is probed every PING_INTERVAL
+# seconds; no answer within PING_TIMEOUT counts as lost. Without ICMP sockets
+# (unprivileged on Windows), ICMP targets are probed on TCP port PING_TCP_FALLBACK_PORT.
+PING_TARGETS = {
+    "Cloudflare (1.1.1.1)": "1.1.1.1",
+    "Google (8.8.8.8)": "8.8.8.8",
+    "Mumbai Server": "9.9.9.9",   # Quad9 DNS, which always answers pings
+}
+PING_INTERVAL = 1.0
+PING_TIMEOUT = 1.0
+PING_TCP_FALLBACK_PORT = 53
+# Latency percentiles, jitter and loss on the latency tab cover the last PING_STATS_WINDOW seconds
+PING_STATS_WINDOW = 60.0
+
+# Database upkeep (core/maintenance.py), done a step at a time while the storage thread
+# is idle: expired rows (LOG_RETENTION) are deleted, the live data is kept under
+# DB_MAX_BYTES (None = no cap; the oldest raw logs go first, then the oldest rollups)
+# and freed pages are returned to the filesystem. No step should take much longer
+# than MAINTENANCE_STEP_MS.
+DB_MAX_BYTES = 2 * 1024 ** 3
+MAINTENANCE_STEP_MS = 5
+
+# Columnar archive of per-flow bytes for long-range analysis (core/archive.py, needs
+# numpy): one segment per hour under this directory. None turns it off.
+ARCHIVE_DIR = "traffic_archive"
+# Sealed hours are deleted once older than ARCHIVE_RETENTION seconds (measured from
+# the newest archived row) and, oldest first, while the archive exceeds
+# ARCHIVE_MAX_BYTES. None = no limit.
+ARCHIVE_RETENTION = 90 * 86400
+ARCHIVE_MAX_BYTES = 2 * 1024 ** 3
@@ -1,77 +1,432 @@
+import heapq
+import itertools
+import os
+import queue
 import sqlite3
 import threading
+import time
+from core.maintenance import Maintenance
+from core.rollups import LogRollups, REMOTE_IP, STEPS
+from core.schema import migrate, pack_ip, unpack_ip
+
+SAVE_TRAFFIC_SQL = """
+    INSERT OR REPLACE INTO app_traffic (app_name, download_bytes, upload_bytes)
+    VALUES (?, ?, ?)
+"""
+ADD_TRAFFIC_SQL = """
+    INSERT INTO app_traffic (app_name, download_bytes, upload_bytes)
+    VALUES (?, ?, ?)
+    ON CONFLICT (app_name) DO UPDATE SET
+        download_bytes = download_bytes + excluded.download_bytes,
+        upload_bytes = upload_bytes + excluded.upload_bytes
+"""
+LOG_INSTANCES_SQL = """
+    INSERT INTO instance_logs (timestamp, app_id, download_speed, upload_speed, src_ip, dst_ip)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+LOG_COLUMNS = "timestamp, app_id, download_speed, upload_speed, src_ip, dst_ip"
+# Above this many matching apps, one newest-first timestamp scan beats per-app lookups
+MAX_PER_APP_QUERIES = 64
 
 class DatabaseManager:
-    def __init__(self, db_name="traffic_history.db"):
+    """SQLite storage with a write-behind writer thread.
+
+    save_traffic() and log_instances() only put a batch on a bounded queue; one
+    background thread owns the write connection and applies everything that arrives
+    within commit_interval in a single transaction (WAL, synchronous=NORMAL, so a
+    commit is one WAL append and fsyncs only happen at checkpoints). Reads go through
+    a separate connection and never wait for the writer, so they see data as of the
+    last commit; call flush() to wait for everything queued so far.
+
+    When the queue is full, batches are dropped (and counted) rather than stalling the
+    UI; offline producers that must not lose rows pass block_when_full=True.
+
+    Every rollup_interval the writer also rolls new instance_logs rows up into the
+    1m/1h/1d tiers (see core.rollups), and whenever its queue is idle it runs bounded
+    retention, size-cap and vacuum steps (see core.maintenance).
+
+    Logs are stored normalized (see core.schema): the writer turns app names into
+    ids from the apps dictionary and packs IPs; readers turn them back, so callers
+    still see (timestamp, app_name, down, up, src_ip, dst_ip) rows.
+    """
+    def __init__(self, db_name="traffic_history.db", queue_size=256, commit_interval=1.0, block_when_full=False,
+                 rollups=None, rollup_interval=10.0, maintenance=None):
+        self.db_name = db_name
+        self.commit_interval = commit_interval
+        self.block_when_full = block_when_full
+        self.rollups = rollups or LogRollups()
+        self.rollup_interval = rollup_interval
+        self.maintenance = maintenance or Maintenance()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = {"batches": 0, "rows": 0, "commits": 0, "dropped": 0, "last_commit_ms": 0.0,
+                      "traffic_repairs": 0}
+        self.app_ids = {}   # writer: app name -> id
+        self.ip_cache = {}  # writer: address text -> packed
+        self.app_names = {} # readers: id -> app name
+        self.ip_texts = {}  # readers: packed address -> text
+
         self.conn = sqlite3.connect(db_name, check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes on a new file
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA wal_autocheckpoint=1000")
+        self.conn.execute("PRAGMA journal_size_limit=67108864")
         self._create_tables()
 
+        # Readers (load_traffic, fetch_logs) never touch the writer's connection
+        self.read_conn = sqlite3.connect(db_name, check_same_thread=False)
+        self.read_conn.execute("PRAGMA query_only=ON")
+        self.cursor = self.read_conn.cursor()
+        self.lock = threading.Lock()
+
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+
     def _create_tables(self):
-        with self.lock:
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS app_traffic (
-                    app_name TEXT PRIMARY KEY,
-                    download_bytes INTEGER,
-                    upload_bytes INTEGER
-                )
-            """)
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS instance_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp REAL,
-                    app_name TEXT,
-                    download_speed REAL,
-                    upload_speed REAL,
-                    src_ip TEXT,
-                    dst_ip TEXT
-                )
-            """)
-            self.conn.commit()
+        # Creates the current schema, or migrates an older database in place
+        self.has_fts = migrate(self.conn)
+
+    # --- Writes (enqueue only) ---
+    def save_traffic(self, traffic_dict):
+        """Replaces the stored totals of every app in traffic_dict."""
+        # Copy now: the aggregator keeps mutating its [down, up] lists
+        self._enqueue(self._write_traffic, [(app, down, up) for app, (down, up) in traffic_dict.items()])
+
+    def add_traffic(self, deltas):
+        """Adds {app: [down, up]} byte deltas to the stored totals (one UPSERT per app)."""
+        if not deltas: return
+        self._enqueue(self._add_traffic, [(app, down, up) for app, (down, up) in deltas.items()])
+
+    def verify_traffic(self, traffic_dict):
+        """Checks the stored totals against traffic_dict once everything queued before is
+        applied, and rewrites the table from it if they differ (e.g. a dropped batch)."""
+        self._enqueue(self._check_traffic, [(app, down, up) for app, (down, up) in traffic_dict.items()])
+
+    def log_instances(self, instances):
+        if not instances: return
+        self._enqueue(self._write_logs, list(instances))
+
+    def _enqueue(self, handler, rows):
+        try:
+            self.queue.put((handler, rows), block=self.block_when_full)
+        except queue.Full:
+            # Never stall the caller (the UI thread) on a stuck disk
+            self.stats["dropped"] += len(rows)
+
+    def flush(self, timeout=None):
+        """Blocks until everything queued before this call is committed."""
+        done = threading.Event()
+        self.queue.put((None, done))
+        return done.wait(timeout)
+
+    # --- Writer thread ---
+    def _writer_loop(self):
+        cursor = self.conn.cursor()
+        running = True
+        next_rollup = time.monotonic()
+        self.next_maintenance = time.monotonic()
+        while running:
+            try:
+                timeout = min(next_rollup, self.next_maintenance) - time.monotonic()
+                item = self.queue.get(timeout=max(0.0, timeout))
+            except queue.Empty:
+                item = None
+            waiters = []
+            deadline = time.monotonic() + self.commit_interval
+            try:
+                if item is None:
+                    self._maintain(cursor, deadline)
+                # Group everything arriving within commit_interval into one transaction
+                while item is not None:
+                    handler, payload = item
+                    if handler is None:
+                        # flush() or close(): commit what we have right away
+                        if payload is None: running = False
+                        else: waiters.append(payload)
+                        break
+                    else:
+                        handler(cursor, payload)
+                        self.stats["batches"] += 1
+                        self.stats["rows"] += len(payload)
+                    # Waiting for the next batch is idle time: spend it on upkeep steps
+                    self._maintain(cursor, deadline)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0: break
+                    try:
+                        item = self.queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+
+                if not running or time.monotonic() >= next_rollup:
+                    # Keep going back-to-back while a backlog of raw rows remains
+                    backlog = self.rollups.run(cursor)
+                    next_rollup = time.monotonic() + (0 if backlog else self.rollup_interval)
+                started = time.monotonic()
+                self.conn.commit()
+                self.stats["commits"] += 1
+                self.stats["last_commit_ms"] = (time.monotonic() - started) * 1000
+            except Exception as e:
+                print(f"Database Error: {e}")
+                self.conn.rollback()
+                self.app_ids.clear()  # ids handed out in the failed transaction are gone
+            finally:
+                for waiter in waiters: waiter.set()
+
+    def _maintain(self, cursor, until):
+        """Runs bounded upkeep steps (core.maintenance) while nothing is queued, until
+        `until` or until nothing more is due; the queue is checked between steps."""
+        while self.queue.empty() and time.monotonic() < until and time.monotonic() >= self.next_maintenance:
+            more = self.maintenance.step(cursor)
+            self.next_maintenance = time.monotonic() + (0 if more else self.maintenance.idle_interval)
+
+    def _write_traffic(self, cursor, rows):
+        cursor.executemany(SAVE_TRAFFIC_SQL, rows)
+
+    def _add_traffic(self, cursor, rows):
+        cursor.executemany(ADD_TRAFFIC_SQL, rows)
+
+    def _check_traffic(self, cursor, rows):
+        # Checksum first: row count and byte sums, one aggregate over the table
+        cursor.execute("SELECT COUNT(*), COALESCE(SUM(download_bytes), 0), COALESCE(SUM(upload_bytes), 0) FROM app_traffic")
+        expected = (len(rows), sum(row[1] for row in rows), sum(row[2] for row in rows))
+        if cursor.fetchone() == expected: return
+        print("Database Warning: stored app totals drifted, rewriting them")
+        self.stats["traffic_repairs"] += 1
+        cursor.execute("DELETE FROM app_traffic")
+        cursor.executemany(SAVE_TRAFFIC_SQL, rows)
 
+    def _write_logs(self, cursor, rows):
+        app_ids, ips = self.app_ids, self.ip_cache
+        encoded = []
+        for ts, app, down, up, src, dst in rows:
+            app_id = app_ids.get(app)
+            if app_id is None:
+                app_id = app_ids[app] = self._app_id(cursor, app)
+            packed_src = ips.get(src)
+            if packed_src is None: packed_src = ips[src] = pack_ip(src)
+            packed_dst = ips.get(dst)
+            if packed_dst is None: packed_dst = ips[dst] = pack_ip(dst)
+            encoded.append((ts, app_id, down, up, packed_src, packed_dst))
+        if len(ips) > 65536: ips.clear()
+        cursor.executemany(LOG_INSTANCES_SQL, encoded)
+
+    def _app_id(self, cursor, name):
+        cursor.execute("INSERT OR IGNORE INTO apps (name) VALUES (?)", (name,))
+        cursor.execute("SELECT id FROM apps WHERE name = ?", (name,))
+        return cursor.fetchone()[0]
+
+    # --- Reads (own connection) ---
     def load_traffic(self):
         with self.lock:
             self.cursor.execute("SELECT * FROM app_traffic")
             rows = self.cursor.fetchall()
             return {row[0]: [row[1], row[2]] for row in rows}
 
-    def save_traffic(self, traffic_dict):
+    def fetch_logs(self, limit=100, app_filter=None, since=None):
+        """Fetches logs, optionally filtering by app_name.
+
+        With `since` (a unix time) the rows come from the coarsest rollup tier that
+        covers it, one row per (bucket, app, remote IP) with average speeds and the
+        remote IP in place of src and None for dst.
+        """
+        if since is not None:
+            now = time.time()
+            tier = self.rollups.pick_tier(since, now, now)
+            if tier != "raw":
+                return self._fetch_rollup_logs(tier, limit, app_filter, since)
         with self.lock:
-            for app, (down, up) in traffic_dict.items():
-                self.cursor.execute("""
-                    INSERT OR REPLACE INTO app_traffic (app_name, download_bytes, upload_bytes)
-                    VALUES (?, ?, ?)
-                """, (app, down, up))
-            self.conn.commit()
+            where, params = [], []
+            if since is not None:
+                where.append("timestamp >= ?")
+                params.append(since)
+            if app_filter:
+                app_ids = self._match_apps(app_filter)
+                if not app_ids: return []
+                if len(app_ids) <= MAX_PER_APP_QUERIES:
+                    # One newest-first cursor per app on (app_id, timestamp), merged lazily:
+                    # only about limit + len(app_ids) rows are ever stepped
+                    sql = f"""
+                        SELECT {LOG_COLUMNS} FROM instance_logs
+                        WHERE {" AND ".join(where + ["app_id = ?"])}
+                        ORDER BY timestamp DESC LIMIT ?
+                    """
+                    cursors = [self.read_conn.execute(sql, params + [app_id, limit]) for app_id in app_ids]
+                    merged = heapq.merge(*cursors, key=lambda row: row[0], reverse=True)
+                    return self._decode_logs(list(itertools.islice(merged, limit)))
+                where.append(f"app_id IN ({','.join('?' * len(app_ids))})")
+                self.cursor.execute(f"""
+                    SELECT {LOG_COLUMNS} FROM instance_logs INDEXED BY idx_instance_logs_timestamp
+                    WHERE {" AND ".join(where)}
+                    ORDER BY timestamp DESC LIMIT ?
+                """, params + app_ids + [limit])
+            else:
+                self.cursor.execute(f"""
+                    SELECT {LOG_COLUMNS} FROM instance_logs
+                    {"WHERE " + " AND ".join(where) if where else ""}
+                    ORDER BY id DESC LIMIT ?
+                """, params + [limit])
+            return self._decode_logs(self.cursor.fetchall())
 
-    def log_instances(self, instances):
-        if not instances: return
+    def query_logs(self, start=None, end=None, app_filter=None, remote_ip=None, min_rate=None,
+                   limit=500, after=None, newest_first=False):
+        """One page of raw logs matching every given filter, in time order.
+
+        Filters: start <= timestamp < end, app name containing app_filter, remote end
+        equal to remote_ip, and download + upload of at least min_rate KB/s. Pages use
+        keyset cursors: pass the returned `after` back to get the next page. It is the
+        (timestamp, id) of the page's last row, so deep pages cost the same as the first
+        and rows logged meanwhile never shift or repeat a page.
+
+        Returns (rows, after); `after` is None once the last page has been read.
+        """
         with self.lock:
-            self.cursor.executemany("""
-                INSERT INTO instance_logs (timestamp, app_name, download_speed, upload_speed, src_ip, dst_ip)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, instances)
-            self.conn.commit()
-
-    def fetch_logs(self, limit=100, app_filter=None):
-        """Fetches logs, optionally filtering by app_name"""
+            where, params = [], []
+            if start is not None:
+                where.append("timestamp >= ?")
+                params.append(start)
+            if end is not None:
+                where.append("timestamp < ?")
+                params.append(end)
+            index = "INDEXED BY idx_instance_logs_timestamp"
+            if app_filter:
+                app_ids = self._match_apps(app_filter)
+                if not app_ids: return [], None
+                if len(app_ids) == 1:
+                    index = ""  # (app_id, timestamp) index, rowid included: already in order
+                where.append(f"app_id IN ({','.join('?' * len(app_ids))})")
+                params += app_ids
+            if remote_ip is not None:
+                where.append(f"{REMOTE_IP} = ?")
+                params.append(pack_ip(remote_ip))
+            if min_rate is not None:
+                where.append("download_speed + upload_speed >= ?")
+                params.append(min_rate)
+            if after is not None:
+                where.append("(timestamp, id) < (?, ?)" if newest_first else "(timestamp, id) > (?, ?)")
+                params += list(after)
+            order = "DESC" if newest_first else "ASC"
+            self.cursor.execute(f"""
+                SELECT id, {LOG_COLUMNS} FROM instance_logs {index}
+                {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY timestamp {order}, id {order} LIMIT ?
+            """, params + [limit])
+            rows = self.cursor.fetchall()
+            after = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+            return self._decode_logs([row[1:] for row in rows]), after
+
+    def log_time_range(self):
+        """(oldest, newest) timestamp in instance_logs, or (None, None) when it is empty."""
+        with self.lock:
+            self.cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM instance_logs")
+            return self.cursor.fetchone()
+
+    def iter_logs(self, page_size=5000, **filters):
+        """Yields every row query_logs(**filters) matches, a page at a time, in constant
+        memory. The read lock is only held while a page is fetched."""
+        after = None
+        while True:
+            rows, after = self.query_logs(limit=page_size, after=after, **filters)
+            yield from rows
+            if after is None: return
+
+    def _fetch_rollup_logs(self, tier, limit, app_filter, since):
+        step = STEPS[tier]
         with self.lock:
+            where, params = ["bucket >= ?"], [since - since % step]
             if app_filter:
-                query = """
-                    SELECT timestamp, app_name, download_speed, upload_speed, src_ip, dst_ip 
-                    FROM instance_logs 
-                    WHERE app_name LIKE ?
-                    ORDER BY id DESC LIMIT ?
-                """
-                self.cursor.execute(query, (f"%{app_filter}%", limit))
+                app_ids = self._match_apps(app_filter)
+                if not app_ids: return []
+                where.append(f"app_id IN ({','.join('?' * len(app_ids))})")
+                params += app_ids
+            self.cursor.execute(f"""
+                SELECT bucket, app_id, down_sum / {step}, up_sum / {step}, remote_ip, NULL
+                FROM log_rollup_{tier}
+                WHERE {" AND ".join(where)}
+                ORDER BY bucket DESC, down_sum + up_sum DESC LIMIT ?
+            """, params + [limit])
+            return self._decode_logs(self.cursor.fetchall())
+
+    def _match_apps(self, app_filter):
+        """Ids of apps whose name contains app_filter (trigram index, else LIKE on apps)."""
+        if self.has_fts and len(app_filter) >= 3:
+            self.cursor.execute("SELECT rowid FROM apps_fts WHERE apps_fts MATCH ?",
+                                ('"' + app_filter.replace('"', '""') + '"',))
+        else:
+            self.cursor.execute("SELECT id FROM apps WHERE name LIKE ?", (f"%{app_filter}%",))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def _decode_logs(self, rows):
+        names = self.app_names
+        if any(row[1] not in names for row in rows):
+            self.cursor.execute("SELECT id, name FROM apps")
+            names.update(self.cursor.fetchall())
+        texts = self.ip_texts
+        if len(texts) > 65536: texts.clear()
+        out = []
+        for ts, app_id, down, up, src, dst in rows:
+            src_text = texts.get(src)
+            if src_text is None: src_text = texts[src] = unpack_ip(src)
+            dst_text = texts.get(dst)
+            if dst_text is None: dst_text = texts[dst] = unpack_ip(dst)
+            out.append((ts, names.get(app_id), down, up, src_text, dst_text))
+        return out
+
+    def fetch_series(self, start, end, app_name=None, remote_ip=None, min_points=60):
+        """Average and peak speeds over [start, end) from the coarsest tier covering it.
+
+        Returns (tier, [(bucket, down_avg, up_avg, down_max, up_max), ...]) in KB/s,
+        one entry per bucket that has data.
+        """
+        tier = self.rollups.pick_tier(start, end, time.time(), min_points)
+        step = STEPS[tier]
+        with self.lock:
+            where, params = ["bucket >= ?", "bucket < ?"], [start - start % step, end]
+            if app_name is not None:
+                self.cursor.execute("SELECT id FROM apps WHERE name = ?", (app_name,))
+                row = self.cursor.fetchone()
+                if row is None: return tier, []
+                where.append("app_id = ?")
+                params.append(row[0])
+            if tier == "raw":
+                table = "(SELECT CAST(timestamp AS INTEGER) AS bucket, app_id, download_speed AS down_sum, " \
+                        "upload_speed AS up_sum, download_speed AS down_max, upload_speed AS up_max, " \
+                        f"{REMOTE_IP} AS remote_ip FROM instance_logs WHERE timestamp >= ? AND timestamp < ?)"
+                params = [start, end] + params
             else:
-                self.cursor.execute("""
-                    SELECT timestamp, app_name, download_speed, upload_speed, src_ip, dst_ip 
-                    FROM instance_logs 
-                    ORDER BY id DESC LIMIT ?
-                """, (limit,))
-            return self.cursor.fetchall()
+                table = f"log_rollup_{tier}"
+            if remote_ip is not None:
+                where.append("remote_ip = ?")
+                params.append(pack_ip(remote_ip))
+            self.cursor.execute(f"""
+                SELECT bucket, SUM(down_sum) / {step}, SUM(up_sum) / {step}, MAX(down_max), MAX(up_max)
+                FROM {table}
+                WHERE {" AND ".join(where)}
+                GROUP BY bucket ORDER BY bucket
+            """, params)
+            return tier, self.cursor.fetchall()
+
+    def get_metrics(self):
+        """Writer and maintenance counters, the writer's queue depth (batches) and the
+        current file sizes, in bytes."""
+        metrics = dict(self.stats, queued=self.queue.qsize())
+        metrics.update(self.maintenance.stats)
+        for suffix, name in (("", "db_bytes"), ("-wal", "wal_bytes")):
+            try:
+                metrics[name] = os.path.getsize(self.db_name + suffix)
+            except OSError:
+                metrics[name] = 0
+        return metrics
 
     def close(self):
-        self.conn.close()
\ No newline at end of file
+        """Commits everything still queued, checkpoints the WAL and closes both connections."""
+        if self.writer.is_alive():
+            self.queue.put((None, None))
+            self.writer.join()
+        try:
+            # Refreshes planner statistics where they went stale (cheap when none did)
+            self.conn.execute("PRAGMA optimize")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error:
+            pass
+        self.read_conn.close()
+        self.conn.close()
@@ -0,0 +1,95 @@
+import csv
+import datetime
+import json
+import os
+import threading
+import time
+
+CSV_HEADER = ["Timestamp", "App Name", "Download (KB/s)", "Upload (KB/s)", "Src IP", "Dst IP"]
+
+class LogExporter:
+    """Streams raw logs matching DatabaseManager.query_logs filters to a CSV or JSON Lines
+    file on a background thread.
+
+    Rows are pulled page by page through DatabaseManager.iter_logs and written as they
+    arrive, so memory stays flat however many rows match. The file is written under
+    path + ".part" and renamed when complete; cancel() stops between pages and removes
+    it. `rows` and `progress` (0..1, by timestamp position in the range) can be read
+    from any thread while it runs; `state` ends as "done", "cancelled" or "failed".
+    """
+    def __init__(self, db, path, fmt="csv", page_size=5000, **filters):
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"unknown export format: {fmt!r}")
+        self.db = db
+        self.path = path
+        self.fmt = fmt
+        self.page_size = page_size
+        self.filters = filters
+        self.rows = 0
+        self.progress = 0.0
+        self.state = "pending"
+        self.error = None
+        self.cancelled = threading.Event()
+
+    def start(self):
+        self.state = "running"
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return self.state
+
+    @property
+    def finished(self):
+        return self.state in ("done", "cancelled", "failed")
+
+    def _run(self):
+        tmp = self.path + ".part"
+        started = time.monotonic()
+        try:
+            start, end = self.filters.get("start"), self.filters.get("end")
+            if start is None or end is None:
+                first, last = self.db.log_time_range()
+                if start is None: start = first
+                if end is None: end = last
+            span = (end - start) if start is not None and end is not None and end > start else 0
+
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                write = self._writer(f)
+                for row in self.db.iter_logs(page_size=self.page_size, **self.filters):
+                    write(row)
+                    self.rows += 1
+                    if not self.rows % self.page_size:
+                        if self.cancelled.is_set(): break
+                        if span: self.progress = min(1.0, (row[0] - start) / span)
+            if self.cancelled.is_set():
+                os.remove(tmp)
+                self.state = "cancelled"
+                return
+            os.replace(tmp, self.path)
+            self.progress = 1.0
+            self.state = "done"
+            print(f"Exported {self.rows:,} rows to {self.path} in {time.monotonic() - started:.1f} s")
+        except Exception as e:
+            self.error = e
+            self.state = "failed"
+            print(f"Export Error: {e}")
+            if os.path.exists(tmp): os.remove(tmp)
+
+    def _writer(self, f):
+        if self.fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            def write(row):
+                ts_str = datetime.datetime.fromtimestamp(row[0]).strftime('%Y-%m-%d %H:%M:%S')
+                writer.writerow([ts_str, row[1], row[2], row[3], row[4], row[5]])
+            return write
+        def write(row):
+            f.write(json.dumps({"timestamp": row[0], "app": row[1], "down_kbps": row[2], "up_kbps": row[3],
+                                "src": row[4], "dst": row[5]}) + "\n")
+        return write
@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing.connection import wait
+from core.raw_capture import RawCapture
+
+PACKET_FANOUT_HASH = 0
+
+# Worker -> parent message: header, then one record per (src, dst, proto, sport, dport)
+DELTA_HEADER = struct.Struct("=QQI")       # packets, ring drops, record count
+DELTA_RECORD = struct.Struct("=IIBBHHQ")    # src, dst, proto, has_ports, sport, dport, bytes
+
+def pack_deltas(flows, packets, drops):
+    buf = bytearray(DELTA_HEADER.size + DELTA_RECORD.size * len(flows))
+    DELTA_HEADER.pack_into(buf, 0, packets, drops, len(flows))
+    offset = DELTA_HEADER.size
+    pack = DELTA_RECORD.pack_into
+    for (src, dst, proto, sport, dport), size in flows.items():
+        if sport is None:
+            pack(buf, offset, src, dst, proto, 0, 0, 0, size)
+        else:
+            pack(buf, offset, src, dst, proto, 1, sport, dport, size)
+        offset += DELTA_RECORD.size
+    return buf
+
+def unpack_deltas(buf):
+    """Returns (packets, drops, [(src, dst, proto, sport, dport, bytes), ...])."""
+    packets, drops, _ = DELTA_HEADER.unpack_from(buf, 0)
+    records = []
+    for src, dst, proto, has_ports, sport, dport, size in DELTA_RECORD.iter_unpack(memoryview(buf)[DELTA_HEADER.size:]):
+        if not has_ports: sport = dport = None
+        records.append((src, dst, proto, sport, dport, size))
+    return packets, drops, records
+
+def _capture_worker(conn, iface, capture_filter, snaplen, fanout_arg, interval, max_flows=None):
+    """Runs in a child process: one fanout member, flushing flow deltas every interval
+    (or as soon as it holds max_flows header tuples, so a scan cannot grow it)."""
+    capture = RawCapture(iface, capture_filter, snaplen, fanout=fanout_arg)
+    try:
+        capture.open()
+    except Exception as e:
+        print(f"Fanout Worker Error: {e}")
+        conn.close()
+        return
+
+    flows = {}
+    def on_header(src, dst, proto, sport, dport, size):
+        key = (src, dst, proto, sport, dport)
+        flows[key] = flows.get(key, 0) + size
+
+    packets = 0
+    reported_drops = 0
+    next_flush = time.monotonic() + interval
+    try:
+        while True:
+            packets += capture.poll(on_header, timeout_ms=int(interval * 1000))
+            if time.monotonic() < next_flush and (max_flows is None or len(flows) < max_flows): continue
+            drops = capture.read_stats()[1]
+            conn.send_bytes(pack_deltas(flows, packets, drops - reported_drops))
+            flows.clear()
+            packets = 0
+            reported_drops = drops
+            next_flush = time.monotonic() + interval
+    except (BrokenPipeError, EOFError, OSError):
+        pass  # parent went away
+    finally:
+        capture.close()
+
+class FanoutCapture:
+    """N capture processes sharing one interface through a PACKET_FANOUT hash group.
+
+    The kernel hashes each flow to a single worker, so each worker's counters are
+    disjoint and the parent only has to add their per-interval deltas together.
+    IP fragments are counted one by one, as on the other backends. Those after the
+    first carry no ports, so they may hash to a different worker than the first; the
+    sums are the same either way.
+    """
+    def __init__(self, iface=None, capture_filter="", snaplen=262144, workers=None, interval=0.25, max_flows=None):
+        self.iface = iface
+        self.capture_filter = capture_filter
+        self.snaplen = snaplen
+        self.worker_count = workers or os.cpu_count() or 1
+        self.interval = interval
+        self.max_flows = max_flows
+        self.group_id = os.getpid() & 0xFFFF
+        self.workers = []
+        self.conns = []
+        self.kernel_drops = 0
+
+    def start(self):
+        # fork: the app's __main__ (Kivy) must not be re-imported in every worker
+        ctx = multiprocessing.get_context("fork")
+        # No PACKET_FANOUT_FLAG_DEFRAG: it would reassemble fragments before the workers
+        # see them, so packet counts and sizes would differ from the other backends
+        fanout_arg = self.group_id | (PACKET_FANOUT_HASH << 16)
+        for _ in range(self.worker_count):
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_capture_worker, daemon=True,
+                               args=(child_conn, self.iface, self.capture_filter, self.snaplen,
+                                     fanout_arg, self.interval, self.max_flows))
+            proc.start()
+            child_conn.close()
+            self.workers.append(proc)
+            self.conns.append(parent_conn)
+        return self
+
+    def stop(self):
+        for proc in self.workers:
+            proc.terminate()
+        for conn in self.conns:
+            conn.close()
+        self.workers = []
+        self.conns = []
+
+    def receive(self, timeout=1.0):
+        """Waits for worker deltas; returns a list of unpacked messages."""
+        messages = []
+        if not self.conns:
+            time.sleep(timeout)
+            return messages
+        for conn in wait(self.conns, timeout):
+            try:
+                messages.append(unpack_deltas(conn.recv_bytes()))
+            except (EOFError, OSError):
+                self.conns.remove(conn)
+        for _, drops, _ in messages:
+            self.kernel_drops += drops
+        return messages
+
+    def read_stats(self):
+        return 0, self.kernel_drops
@@ -0,0 +1,197 @@
+import heapq
+import socket
+from array import array
+
+# src/dst of an app's "other" bucket: the bytes of flows folded out of a full table
+OTHER = "*"
+
+def ip_to_int(ip):
+    return int.from_bytes(socket.inet_aton(ip), "big")
+
+def int_to_ip(value):
+    return socket.inet_ntoa(value.to_bytes(4, "big"))
+
+class AppNames:
+    """Interns app names to small integer ids (shared by both flow buffers)."""
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name):
+        app_id = self.ids.get(name)
+        if app_id is None:
+            app_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return app_id
+
+class FlowTable:
+    """Per-interval (app, src, dst) -> [down, up] counters without per-flow objects.
+
+    A flow key is a single int (app_id << 64 | src << 32 | dst, IPv4 addresses packed),
+    mapped to a slot in two unsigned 64-bit arrays. Slots and arrays are reused after
+    drain(), so a steady flow count causes no allocation on the packet path.
+
+    With max_flows set, the table holds at most that many flows per interval
+    (Space-Saving): a new flow in a full table takes over the slot of the flow with
+    the smallest count, whose bytes are folded into its app's "other" bucket, and
+    inherits that count as its error bound. Flows bigger than the interval's total
+    / max_flows are always kept; no kept flow is under-counted by more than its
+    inherited count; and since bytes are only ever moved to the same app's bucket,
+    per-app totals stay exact.
+    """
+    def __init__(self, apps, max_flows=None):
+        self.apps = apps
+        self.max_flows = max_flows
+        self.slots = {}
+        self.down = array("Q")
+        self.up = array("Q")
+        self.size = 0
+
+        # Space-Saving state, used once the table is full
+        self.base = array("Q")   # slot -> count inherited on taking it over (error bound)
+        self.keys = []           # slot -> key
+        self.heap = []           # (count, slot) min-heap, refreshed lazily
+        self.other = {}          # app_id -> [down, up] folded out of the table
+        self.evicted = 0
+        self.stats = {"flows": 0, "folded": 0, "max_error": 0}
+
+    def __len__(self):
+        return self.size
+
+    def new_slot(self, key):
+        if self.max_flows is not None and self.size >= self.max_flows:
+            return self._evict(key)
+        slot = self.slots[key] = self.size
+        self.size += 1
+        if slot < len(self.down):
+            self.down[slot] = 0
+            self.up[slot] = 0
+            self.base[slot] = 0
+            self.keys[slot] = key
+        else:
+            self.down.append(0)
+            self.up.append(0)
+            self.base.append(0)
+            self.keys.append(key)
+        return slot
+
+    def _evict(self, key):
+        base, down, up, heap = self.base, self.down, self.up, self.heap
+        if not heap:
+            heap.extend((base[slot] + down[slot] + up[slot], slot) for slot in range(self.size))
+            heapq.heapify(heap)
+        # Counts only grow, so a heap entry is at most stale-low: refresh until the top is current
+        while True:
+            count, slot = heap[0]
+            current = base[slot] + down[slot] + up[slot]
+            if current == count: break
+            heapq.heapreplace(heap, (current, slot))
+
+        victim = self.keys[slot]
+        del self.slots[victim]
+        other = self.other.get(victim >> 64)
+        if other is None: other = self.other[victim >> 64] = [0, 0]
+        other[0] += down[slot]
+        other[1] += up[slot]
+
+        # The newcomer may have had up to `count` bytes folded away before: that is its error
+        base[slot] = count
+        down[slot] = 0
+        up[slot] = 0
+        self.keys[slot] = key
+        self.slots[key] = slot
+        self.evicted += 1
+        return slot
+
+    def add(self, app_id, src, dst, is_up, nbytes):
+        key = (app_id << 64) | (src << 32) | dst
+        slot = self.slots.get(key)
+        if slot is None: slot = self.new_slot(key)
+        if is_up:
+            self.up[slot] += nbytes
+        else:
+            self.down[slot] += nbytes
+
+    def drain(self, ip_cache=None, labels=None):
+        """Returns the counters as {(app_name, src_ip, dst_ip): (down, up)} and empties the table.
+
+        Folded flows appear as one (app_name, OTHER, OTHER) entry per app. ip_cache
+        (int -> dotted string) and labels (flow key -> that tuple) may be kept across
+        drains: a flow seen in an earlier interval then costs one lookup.
+        """
+        names = self.apps.names
+        if ip_cache is None: ip_cache = {}
+        if labels is None: labels = {}
+
+        def label(key):
+            src = (key >> 32) & 0xFFFFFFFF
+            dst = key & 0xFFFFFFFF
+            src_ip = ip_cache.get(src)
+            if src_ip is None: src_ip = ip_cache[src] = int_to_ip(src)
+            dst_ip = ip_cache.get(dst)
+            if dst_ip is None: dst_ip = ip_cache[dst] = int_to_ip(dst)
+            result = labels[key] = (names[key >> 64], src_ip, dst_ip)
+            return result
+
+        # Zipped straight out of the arrays. Tuples, not lists: the GC stops tracking
+        # them, where 100k new lists per tick set off full collections of the heap
+        size = self.size
+        known = labels.get
+        keys = [known(key) or label(key) for key in self.keys[:size]]
+        data = dict(zip(keys, zip(self.down[:size], self.up[:size])))
+        for app_id, (other_down, other_up) in self.other.items():
+            data[(names[app_id], OTHER, OTHER)] = (other_down, other_up)
+
+        self.stats = {
+            "flows": self.size,
+            "folded": self.evicted,
+            "max_error": max(self.base[:self.size]) if self.evicted else 0,
+        }
+        self.slots.clear()
+        self.size = 0
+        self.heap.clear()
+        self.other.clear()
+        self.evicted = 0
+        return data
+
+class DoubleBufferedFlows:
+    """Two FlowTables: the packet path fills one while the reader drains the other.
+
+    The lock is only held for one add() or for swapping the active pointer, never
+    for copying, so a reader with 100k flows does not stall the capture thread.
+    """
+    def __init__(self, lock, max_flows=None):
+        self.lock = lock
+        self.apps = AppNames()
+        self.active = FlowTable(self.apps, max_flows)
+        self.spare = FlowTable(self.apps, max_flows)
+        self.ip_cache = {}  # int -> dotted string, reused across drains
+        self.labels = {}    # flow key -> (app_name, src_ip, dst_ip), reused across drains
+        self.stats = self.active.stats  # FlowTable.stats of the last drained interval
+
+    def add(self, app_name, src, dst, is_up, nbytes):
+        # FlowTable.add inlined: this runs once per packet
+        app_id = self.apps.ids.get(app_name)
+        if app_id is None: app_id = self.apps.intern(app_name)
+        key = (app_id << 64) | (src << 32) | dst
+        with self.lock:
+            table = self.active
+            slot = table.slots.get(key)
+            if slot is None: slot = table.new_slot(key)
+            if is_up:
+                table.up[slot] += nbytes
+            else:
+                table.down[slot] += nbytes
+
+    def swap_and_drain(self):
+        with self.lock:
+            table = self.active
+            self.active = self.spare
+        # Sized to the flows actually seen: cleared once they churn past 4x that
+        limit = max(65536, 4 * len(table))
+        if len(self.labels) > limit: self.labels.clear()
+        if len(self.ip_cache) > 2 * limit: self.ip_cache.clear()
+        data = table.drain(self.ip_cache, self.labels)
+        self.stats = table.stats
+        self.spare = table
+        return data
@@ -0,0 +1,100 @@
+import math
+from collections import deque, namedtuple
+
+# Summary of one target's rolling window; latencies in ms, None when there are no replies
+LatencyStats = namedtuple("LatencyStats", "last p50 p95 p99 jitter loss sent")
+
+class LatencyTracker:
+    """Streaming latency statistics for one probe target over a rolling window.
+
+    Round trips go into a log-bucketed histogram (HDR style): bucket i holds values
+    up to min_ms * (1 + precision) ** i, so any percentile is within `precision` of
+    the true value across 1 us .. 60 s, and the number of buckets is fixed however
+    many samples arrive. The window is `slices` sub-windows of window / slices
+    seconds each. Every sub-window keeps its own bucket counts, and those are also
+    added into running window totals. When a sub-window expires its counts are
+    subtracted. Recording a sample is therefore O(1); expiry costs one pass over a
+    sub-window's occupied buckets, once per sub-window.
+
+    Lost probes (None) count toward the loss ratio, never as a latency. Jitter is the
+    RFC 3550 interarrival estimate applied to successive round trips:
+    J += (|D| - J) / 16.
+    """
+    def __init__(self, window=60.0, slices=12, precision=0.02, min_ms=0.001, max_ms=60000.0):
+        self.slice_seconds = window / slices
+        self.slices = slices
+        self.min_ms = min_ms
+        self.log_base = math.log1p(precision)
+        self.max_bucket = math.ceil(math.log(max_ms / min_ms) / self.log_base)
+
+        self.ring = deque()     # [slice id, {bucket: count}, sent, lost], oldest first
+        self.counts = {}        # bucket -> count over the whole window
+        self.sent = 0
+        self.lost = 0
+        self.last = None
+        self.previous = None    # last round trip, for jitter
+        self.jitter = 0.0
+
+    def bucket(self, ms):
+        if ms <= self.min_ms: return 0
+        return min(self.max_bucket, math.ceil(math.log(ms / self.min_ms) / self.log_base))
+
+    def bucket_value(self, bucket):
+        """Upper edge of a bucket in ms: the highest value it can hold."""
+        return self.min_ms * math.exp(bucket * self.log_base)
+
+    def record(self, rtt_ms, now):
+        """Adds one probe result: its round trip in ms, or None if it was lost."""
+        current = self._slice(now)
+        current[2] += 1
+        self.sent += 1
+        self.last = rtt_ms
+        if rtt_ms is None:
+            current[3] += 1
+            self.lost += 1
+            return
+        b = self.bucket(rtt_ms)
+        current[1][b] = current[1].get(b, 0) + 1
+        self.counts[b] = self.counts.get(b, 0) + 1
+        if self.previous is not None:
+            self.jitter += (abs(rtt_ms - self.previous) - self.jitter) / 16
+        self.previous = rtt_ms
+
+    def percentile(self, pct):
+        replies = self.sent - self.lost
+        if not replies: return None
+        rank = max(1, math.ceil(replies * pct / 100))
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= rank: return self.bucket_value(b)
+        return None
+
+    def summary(self, now=None):
+        if now is not None: self._expire(int(now // self.slice_seconds))
+        return LatencyStats(
+            last=self.last,
+            p50=self.percentile(50),
+            p95=self.percentile(95),
+            p99=self.percentile(99),
+            jitter=self.jitter if self.previous is not None else None,
+            loss=self.lost / self.sent if self.sent else 0.0,
+            sent=self.sent,
+        )
+
+    def _slice(self, now):
+        slice_id = int(now // self.slice_seconds)
+        if not self.ring or self.ring[-1][0] != slice_id:
+            self._expire(slice_id)
+            self.ring.append([slice_id, {}, 0, 0])
+        return self.ring[-1]
+
+    def _expire(self, slice_id):
+        while self.ring and self.ring[0][0] <= slice_id - self.slices:
+            _, counts, sent, lost = self.ring.popleft()
+            self.sent -= sent
+            self.lost -= lost
+            for b, count in counts.items():
+                left = self.counts[b] - count
+                if left: self.counts[b] = left
+                else: del self.counts[b]
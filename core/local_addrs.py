@@ -0,0 +1,104 @@
+import ipaddress
+import socket
+import threading
+import time
+import psutil
+from core.flow_table import ip_to_int
+from core.platform import IS_LINUX
+
+INBOUND, OUTBOUND, LOCAL, TRANSIT = range(4)
+
+# rtnetlink multicast groups that announce interface/address changes
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+class LocalAddresses:
+    """This host's IPv4 addresses, for classifying packets before any process lookup.
+
+    classify() is a set lookup per address (plus any configured prefixes), so the
+    sniffer knows which side of a packet is local and only resolves that port.
+    The address set is rebuilt from psutil.net_if_addrs() whenever rtnetlink reports
+    an address or link change (Linux), or every poll_interval seconds otherwise.
+    """
+    def __init__(self, prefixes=(), live=True, poll_interval=30.0):
+        self.prefixes = [(int(n.network_address), int(n.netmask))
+                         for n in (ipaddress.IPv4Network(p, strict=False) for p in prefixes)]
+        self.poll_interval = poll_interval
+        self.addresses = frozenset()
+        self.broadcasts = frozenset()
+        self.running = False
+        if live:
+            self.refresh()
+
+    def start(self):
+        if self.running: return self
+        self.running = True
+        threading.Thread(target=self._watch_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    def refresh(self):
+        addresses, broadcasts = set(), set()
+        try:
+            for nic_addrs in psutil.net_if_addrs().values():
+                for addr in nic_addrs:
+                    if addr.family != socket.AF_INET: continue
+                    addresses.add(ip_to_int(addr.address))
+                    if addr.broadcast: broadcasts.add(ip_to_int(addr.broadcast))
+        except Exception as e:
+            print(f"Local Address Error: {e}")
+            return
+        # Swap whole sets so classify() never sees a half-built one
+        self.addresses = frozenset(addresses)
+        self.broadcasts = frozenset(broadcasts)
+
+    def is_local(self, ip):
+        if ip in self.addresses or ip >> 24 == 127:
+            return True
+        for network, mask in self.prefixes:
+            if ip & mask == network: return True
+        return False
+
+    def classify(self, src, dst):
+        """INBOUND, OUTBOUND, LOCAL (both ends here) or TRANSIT (neither, e.g. promiscuous)."""
+        if self.is_local(src):
+            return LOCAL if self.is_local(dst) else OUTBOUND
+        if self.is_local(dst) or dst in self.broadcasts or dst >= 0xE0000000:
+            return INBOUND  # includes broadcast and multicast delivered to us
+        return TRANSIT
+
+    def _watch_loop(self):
+        sock = None
+        if IS_LINUX:
+            try:
+                sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+                sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+                sock.settimeout(self.poll_interval)
+            except OSError:
+                sock = None
+        while self.running:
+            if sock is None:
+                time.sleep(self.poll_interval)
+            else:
+                try:
+                    sock.recv(65536)
+                except socket.timeout:
+                    pass
+                except OSError:
+                    sock = None
+            if self.running: self.refresh()
+
+_shared_addresses = None
+_shared_lock = threading.Lock()
+
+def get_local_addresses():
+    """Returns the process-wide address set, starting its watcher on first use."""
+    global _shared_addresses
+    with _shared_lock:
+        if _shared_addresses is None:
+            _shared_addresses = LocalAddresses().start()
+        return _shared_addresses
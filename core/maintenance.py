@@ -0,0 +1,148 @@
+import time
+from core.config import LOG_RETENTION, DB_MAX_BYTES, MAINTENANCE_STEP_MS
+from core.rollups import TIERS
+
+# (table, retention key), finest first: raw rows go before any rollup
+TABLES = (("instance_logs", "raw"),) + tuple((f"log_rollup_{tier}", tier) for tier, _ in TIERS)
+
+class Maintenance:
+    """Keeps the database inside its retention and size limits, a few ms at a time.
+
+    The storage writer calls step() while its queue is idle. Each call does one
+    bounded piece of work in the writer's transaction, the first of:
+
+    1. PRAGMA optimize (with a small analysis_limit), every optimize_interval
+    2. rows past their tier's retention (LOG_RETENTION, measured from the newest
+       logged row, so a replayed capture is not pruned on arrival)
+    3. while the live data exceeds max_bytes, the oldest rows: raw logs that are
+       already rolled up first, then the finest rollup tier that still has rows
+    4. incremental_vacuum of up to vacuum_pages free pages, shrinking the file (only
+       where auto_vacuum is INCREMENTAL: an older file needs one offline full VACUUM
+       first, python -m tools.vacuum_db, as no step may rewrite the whole file)
+
+    Delete batches are sized to step_ms: halved after a step that ran over, doubled
+    after one well under it, so no step holds the write lock much longer than that.
+    """
+    def __init__(self, retention=LOG_RETENTION, max_bytes=DB_MAX_BYTES, step_ms=MAINTENANCE_STEP_MS,
+                 vacuum_pages=256, optimize_interval=3600.0, idle_interval=10.0):
+        self.retention = dict(retention)
+        self.max_bytes = max_bytes
+        self.step_ms = step_ms
+        self.vacuum_pages = vacuum_pages
+        self.optimize_interval = optimize_interval
+        self.idle_interval = idle_interval  # between checks once there is nothing to do
+        self.batch = 500
+        self.next_optimize = time.monotonic() + optimize_interval
+        self.incremental = None   # auto_vacuum mode, read on the first step
+        self.stats = {
+            "steps": 0,
+            "last_step_ms": 0.0,
+            "max_step_ms": 0.0,
+            "retention_rows": 0,
+            "size_rows": 0,
+            "vacuumed_pages": 0,
+            "optimizes": 0,
+            "live_bytes": 0,
+            "free_bytes": 0,
+        }
+
+    def step(self, cursor):
+        """Does one bounded piece of upkeep. Returns True if more is waiting."""
+        started = time.monotonic()
+        kind, more = self._work(cursor)
+        elapsed = (time.monotonic() - started) * 1000
+        if kind is None: return False
+
+        stats = self.stats
+        stats["steps"] += 1
+        stats["last_step_ms"] = elapsed
+        stats["max_step_ms"] = max(stats["max_step_ms"], elapsed)
+        if kind == "delete":
+            if elapsed > self.step_ms:
+                self.batch = max(50, self.batch // 2)
+            elif elapsed < self.step_ms / 2:
+                self.batch = min(20000, self.batch * 2)
+        return more
+
+    def _work(self, cursor):
+        if time.monotonic() >= self.next_optimize:
+            # analysis_limit keeps any ANALYZE it decides on to a sample of each index
+            cursor.execute("PRAGMA analysis_limit = 400")
+            cursor.execute("PRAGMA optimize")
+            self.stats["optimizes"] += 1
+            self.next_optimize = time.monotonic() + self.optimize_interval
+            return "optimize", True
+
+        latest, rolled_id = self._get(cursor, "latest"), int(self._get(cursor, "raw_id") or 0)
+        if latest is not None:
+            for table, keep in TABLES:
+                cutoff = self.retention.get(keep)
+                if cutoff is None: continue
+                deleted = self._delete_oldest(cursor, table, rolled_id, latest - cutoff)
+                if deleted:
+                    self.stats["retention_rows"] += deleted
+                    return "delete", True
+
+        page_size, pages, free = self._pages(cursor)
+        self.stats["live_bytes"] = (pages - free) * page_size
+        self.stats["free_bytes"] = free * page_size
+        if self.max_bytes is not None and (pages - free) * page_size > self.max_bytes:
+            for table, _ in TABLES:
+                deleted = self._delete_oldest(cursor, table, rolled_id, None)
+                if deleted:
+                    self.stats["size_rows"] += deleted
+                    return "delete", True
+
+        if self.incremental is None:
+            cursor.execute("PRAGMA auto_vacuum")
+            self.incremental = cursor.fetchone()[0] == 2
+            if not self.incremental:
+                print("Traffic database predates incremental vacuum: free pages stay in the file "
+                      "until python -m tools.vacuum_db is run with the app closed")
+        if free and self.incremental:
+            cursor.execute(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+            cursor.fetchall()
+            left = self._pages(cursor)[2]
+            self.stats["vacuumed_pages"] += free - left
+            self.stats["free_bytes"] = left * page_size
+            # Pages freed earlier in this same transaction only move once it commits
+            return "vacuum", 0 < left < free
+
+        return None, False
+
+    def _delete_oldest(self, cursor, table, rolled_id, before):
+        if table == "instance_logs":
+            # Only rows that are already rolled up may go. With a cutoff, walk the
+            # timestamp index: stepping ids would scan every live row to find none.
+            if before is not None:
+                cursor.execute("""
+                    DELETE FROM instance_logs WHERE id IN (
+                        SELECT id FROM instance_logs WHERE timestamp < ? AND id <= ? ORDER BY timestamp LIMIT ?
+                    )
+                """, (before, rolled_id, self.batch))
+            else:
+                cursor.execute("""
+                    DELETE FROM instance_logs WHERE id IN (
+                        SELECT id FROM instance_logs WHERE id <= ? ORDER BY id LIMIT ?
+                    )
+                """, (rolled_id, self.batch))
+        else:
+            where, params = ("WHERE bucket < ?", [before]) if before is not None else ("", [])
+            cursor.execute(f"""
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table} {where} ORDER BY bucket LIMIT ?
+                )
+            """, params + [self.batch])
+        return cursor.rowcount
+
+    def _pages(self, cursor):
+        values = []
+        for pragma in ("page_size", "page_count", "freelist_count"):
+            cursor.execute(f"PRAGMA {pragma}")
+            values.append(cursor.fetchone()[0])
+        return values
+
+    def _get(self, cursor, name):
+        cursor.execute("SELECT value FROM rollup_state WHERE name = ?", (name,))
+        row = cursor.fetchone()
+        return row[0] if row else None
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import uuid
+from collections import namedtuple
+
+# Rows with sequence numbers [seq, seq + len(rows)); `end` is the cursor past them
+OutboxBatch = namedtuple("OutboxBatch", "seq rows end")
+# Next unacknowledged row: its sequence number, its segment (by first seq) and byte offset
+Cursor = namedtuple("Cursor", "seq segment offset")
+
+CURSOR = "cursor.json"
+CLIENT_ID = "client_id"
+
+class Outbox:
+    """Durable FIFO of log rows waiting for upload: append-only segment files and two cursors.
+
+    append() writes each call's rows as one JSON line to the newest segment,
+    <first seq>.log, and starts a new segment once it passes segment_bytes. The write
+    cursor is the sequence number the next row gets. The acknowledged cursor
+    (cursor.json) marks every row before it as delivered. peek() reads the batch after the acknowledged
+    cursor from disk, and ack() moves the cursor past it. A batch that is never
+    acknowledged (failed upload, crash, restart) is read again with the same sequence
+    numbers, so a receiver that remembers the next sequence number per client_id can
+    drop repeats. Segments wholly before the cursor are deleted. Only the batch being
+    sent is ever held in memory, however long the backlog.
+
+    Past max_bytes on disk, "drop_oldest" deletes the oldest segment (its unsent rows
+    count as dropped) and "drop_newest" refuses new rows. One thread may append while
+    another peeks and acks; peek() reads the files outside the lock, so an append
+    never waits on it. After close(), appends are refused and peek() returns None,
+    whichever thread is still running.
+    """
+    def __init__(self, path, max_bytes, overflow="drop_oldest", segment_bytes=8 * 1024 * 1024):
+        if overflow not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"unknown overflow policy: {overflow!r}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.overflow = overflow
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        self.closed = False
+        self.stats = {"appended": 0, "acked": 0, "dropped": 0}
+        os.makedirs(path, exist_ok=True)
+
+        id_path = os.path.join(path, CLIENT_ID)
+        if not os.path.exists(id_path):
+            with open(id_path, "w") as f: f.write(uuid.uuid4().hex)
+        with open(id_path) as f: self.client_id = f.read().strip()
+
+        self.segments = sorted(int(name[:-4]) for name in os.listdir(path)
+                               if name.endswith(".log") and name[:-4].isdigit())
+        self.cursor = self._load_cursor()
+        self.write_seq = self.cursor.seq
+        if self.segments:
+            self.write_seq = self.segments[-1] + self._recover(self.segments[-1])
+        else:
+            self.segments.append(self.cursor.seq)
+        if not (self.segments[0] <= self.cursor.segment <= self.segments[-1]) or self.cursor.seq > self.write_seq:
+            # Damaged or stale cursor: resend from the oldest row still on disk
+            self.cursor = Cursor(self.segments[0], self.segments[0], 0)
+        self.file = open(self._segment_path(self.segments[-1]), "ab")
+        self.disk_bytes = sum(os.path.getsize(self._segment_path(first)) for first in self.segments)
+
+    @property
+    def backlog(self):
+        """Rows appended but not yet acknowledged."""
+        return self.write_seq - self.cursor.seq
+
+    def append(self, rows):
+        """Adds log tuples at the write cursor. Returns False if they were refused."""
+        if not rows: return True
+        data = json.dumps(rows, separators=(",", ":")).encode() + b"\n"
+        with self.lock:
+            if self.closed:
+                self.stats["dropped"] += len(rows)
+                return False
+            while self.disk_bytes + len(data) > self.max_bytes:
+                if self.overflow == "drop_newest" or len(self.segments) < 2:
+                    self.stats["dropped"] += len(rows)
+                    return False
+                self._drop_oldest()
+            self.file.write(data)
+            self.file.flush()
+            self.disk_bytes += len(data)
+            self.write_seq += len(rows)
+            self.stats["appended"] += len(rows)
+            if self.file.tell() >= self.segment_bytes: self._rotate()
+        return True
+
+    def peek(self, max_rows):
+        """The oldest unacknowledged rows as an OutboxBatch, or None. Whole appends are
+        taken up to max_rows (a single larger append is returned on its own)."""
+        while True:
+            with self.lock:
+                if self.closed: return None
+                cursor, end_seq, segments = self.cursor, self.write_seq, list(self.segments)
+            try:
+                return self._read(cursor, end_seq, segments, max_rows)
+            except FileNotFoundError:
+                # drop_oldest deleted the segment meanwhile: read from the new cursor
+                continue
+
+    def _read(self, cursor, end_seq, segments, max_rows):
+        # Only rows before end_seq: every line holding them was complete when the
+        # snapshot was taken, while later appends may still be half written
+        seq, segment, offset = cursor
+        if seq >= end_seq: return None
+        rows = []
+        index = segments.index(segment)
+        while True:
+            with open(self._segment_path(segment), "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if seq + len(rows) >= end_seq: break
+                    appended = json.loads(line)
+                    if rows and len(rows) + len(appended) > max_rows: break
+                    rows.extend(appended)
+                    offset += len(line)
+                else:
+                    line = None
+            if line is not None or index + 1 == len(segments): break
+            index += 1
+            segment, offset = segments[index], 0
+        if not rows: return None
+        return OutboxBatch(seq, rows, Cursor(seq + len(rows), segment, offset))
+
+    def ack(self, batch):
+        """Marks a batch from peek() delivered and deletes segments it finished."""
+        with self.lock:
+            if batch.end.seq <= self.cursor.seq: return  # its rows were dropped meanwhile
+            self.stats["acked"] += batch.end.seq - self.cursor.seq
+            self.cursor = batch.end
+            self._save_cursor()
+            if not self.closed and self.cursor.seq == self.write_seq and self.file.tell() >= self.segment_bytes // 8:
+                # Caught up: start afresh rather than keep a delivered segment until it fills
+                self._rotate()
+                self.cursor = Cursor(self.write_seq, self.write_seq, 0)
+                self._save_cursor()
+            while self.segments[0] < self.cursor.segment:
+                self._delete(self.segments.pop(0))
+
+    def close(self):
+        """Syncs the newest segment to disk. A batch still being sent can be acked later."""
+        with self.lock:
+            if self.closed: return
+            self.closed = True
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    def _rotate(self):
+        self.file.close()
+        self.segments.append(self.write_seq)
+        self.file = open(self._segment_path(self.write_seq), "ab")
+
+    def _drop_oldest(self):
+        first, following = self.segments[0], self.segments[1]
+        if self.cursor.seq < following:
+            self.stats["dropped"] += following - self.cursor.seq
+            self.cursor = Cursor(following, following, 0)
+            self._save_cursor()
+        self._delete(self.segments.pop(0))
+
+    def _delete(self, first):
+        path = self._segment_path(first)
+        self.disk_bytes -= os.path.getsize(path)
+        os.remove(path)
+
+    def _recover(self, first):
+        """Rows in the newest segment, after cutting off a line torn by a crash."""
+        path = self._segment_path(first)
+        with open(path, "rb") as f: data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data): os.truncate(path, end)
+        return sum(len(json.loads(line)) for line in data[:end].splitlines())
+
+    def _segment_path(self, first):
+        return os.path.join(self.path, f"{first}.log")
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.path, CURSOR)) as f:
+                return Cursor(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            first = self.segments[0] if self.segments else 0
+            return Cursor(first, first, 0)
+
+    def _save_cursor(self):
+        # Not fsynced: after a power cut the receiver's de-duplication covers any resend
+        tmp = os.path.join(self.path, CURSOR + ".tmp")
+        with open(tmp, "w") as f: json.dump(self.cursor._asdict(), f)
+        os.replace(tmp, os.path.join(self.path, CURSOR))
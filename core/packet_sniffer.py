@@ -1,24 +1,53 @@
 import threading
 import time
 import psutil
-from scapy.all import sniff, TCP, IP, UDP
-from core.platform import IS_WINDOWS
+from scapy.all import conf, network_name, TCP, IP, UDP
+from core.flow_table import DoubleBufferedFlows, ip_to_int
+from core.local_addrs import get_local_addresses, INBOUND, OUTBOUND
+from core.config import CAPTURE_BACKEND, CAPTURE_INTERFACE, CAPTURE_FILTER, CAPTURE_SNAPLEN, CAPTURE_WORKERS
+from core.config import SAMPLING_MAX_RATE, SAMPLING_LAG_BUDGET, FLOW_TABLE_MAX_FLOWS
+from core.sampling import AdaptiveSampler
+from core.platform import IS_WINDOWS, IS_LINUX
+from core.socket_index import get_socket_index
 
 if IS_WINDOWS:
-    from scapy.all import conf
     conf.use_pcap = True
 
 class PacketSniffer:
-    def __init__(self):
+    def __init__(self, backend=CAPTURE_BACKEND, iface=CAPTURE_INTERFACE, resolver=None, local=None,
+                 capture_filter=CAPTURE_FILTER, snaplen=CAPTURE_SNAPLEN, workers=CAPTURE_WORKERS,
+                 max_flows=FLOW_TABLE_MAX_FLOWS):
         self.running = False
-        self.traffic_data = {} # Key: (app_name, src_ip, dst_ip), Value: [down, up]
         self.lock = threading.Lock()
-        self.port_cache = {}
-        self.cache_timeout = 10 
+        self.flows = DoubleBufferedFlows(self.lock, max_flows) # (app_name, src_ip, dst_ip) -> (down, up)
+        self.max_flows = max_flows
+        self.sockets = resolver or get_socket_index()
+        self.local = local or get_local_addresses()
+        self.iface = iface
+        self.capture_filter = capture_filter
+        self.snaplen = snaplen
+        self.workers = workers
+
+        # Capture counters (see get_capture_stats)
+        self.packets_captured = 0
+        self.capture = None
+        self.wire_baseline = None
+
+        # Overload protection: 1-in-N sampling with scaled sizes (see get_sampling_stats)
+        self.sampler = AdaptiveSampler(max_rate=SAMPLING_MAX_RATE)
+        self.last_sampling = self.sampler.snapshot()
+
+        if backend in ("raw", "fanout", "sockdiag") and not IS_LINUX:
+            print(f"{backend} capture backend is Linux-only, using scapy")
+            backend = "scapy"
+        self.backend = backend
 
     def start(self):
         self.running = True
-        self.thread = threading.Thread(target=self._sniff_loop)
+        self.wire_baseline = self._wire_packets()
+        loops = {"raw": self._raw_loop, "fanout": self._fanout_loop}
+        loop = loops.get(self.backend, self._sniff_loop)
+        self.thread = threading.Thread(target=loop)
         self.thread.daemon = True
         self.thread.start()
 
@@ -26,97 +55,199 @@ class PacketSniffer:
         self.running = False
 
     def get_traffic_data(self):
-        with self.lock:
-            data = self.traffic_data.copy()
-            self.traffic_data.clear()
+        data = self.flows.swap_and_drain()
+        self.last_sampling = self.sampler.snapshot()
         return data
 
+    def get_sampling_stats(self):
+        """Sampling over the interval returned by the last get_traffic_data().
+
+        rate is the current 1-in-N, max_rate the highest N used in the interval, and
+        error a 95% bound on the relative error of the interval's byte total.
+        """
+        return self.last_sampling
+
+    def get_capture_stats(self):
+        """Packets delivered to userspace vs. rejected in the kernel by the capture filter.
+
+        The kernel does not count filter rejections, so `kernel_filtered` is estimated
+        from the interface packet counters minus what reached (or overflowed) the capture.
+        """
+        ring_drops = 0
+        if self.capture is not None:
+            ring_drops = self.capture.read_stats()[1]
+        filtered = 0
+        if self.wire_baseline is not None:
+            on_wire = self._wire_packets() - self.wire_baseline
+            filtered = max(0, on_wire - self.packets_captured - ring_drops)
+        return {
+            "backend": self.backend,
+            "filter": self.capture_filter,
+            "snaplen": self.snaplen,
+            "captured": self.packets_captured,
+            "ring_drops": ring_drops,
+            "kernel_filtered": filtered,
+            # Last interval's flow table: flows kept, flows folded into "other" and the
+            # largest number of bytes a kept flow may be under-counted by
+            "flows": self.flows.stats["flows"],
+            "flows_folded": self.flows.stats["folded"],
+            "flow_error_bytes": self.flows.stats["max_error"],
+        }
+
+    def _wire_packets(self):
+        try:
+            counters = psutil.net_io_counters(pernic=True)
+            if self.backend != "scapy":
+                names = [self.iface] if self.iface else list(counters)
+            else:
+                names = [self.iface or network_name(conf.iface)]
+            if not any(n in counters for n in names):
+                names = list(counters)
+            return sum(counters[n].packets_sent + counters[n].packets_recv for n in names if n in counters)
+        except Exception:
+            return 0
+
     def _sniff_loop(self):
+        # Frames are read undissected so that sampling can skip them before scapy's
+        # dissection, which is most of this backend's per-packet cost
         while self.running:
             try:
-                sniff(prn=self._on_packet, store=False, timeout=1)
+                sock = conf.L2listen(iface=self.iface or conf.iface, filter=self.capture_filter or None)
             except Exception as e:
                 print(f"Sniff Error: {e}")
+                if self.capture_filter:
+                    # Compiling the filter needs libpcap/tcpdump; capture everything instead
+                    print("Dropping capture filter for the scapy backend")
+                    self.capture_filter = ""
                 time.sleep(1)
+                continue
+            try:
+                while self.running:
+                    for ready in sock.select([sock], 1.0) or ():
+                        cls, data, ts = ready.recv_raw()
+                        if data is not None: self._on_frame(cls, data, ts)
+            except Exception as e:
+                print(f"Sniff Error: {e}")
+                time.sleep(1)
+            finally:
+                sock.close()
+
+    def _raw_loop(self):
+        from core.raw_capture import RawCapture
+        while self.running:
+            capture = RawCapture(self.iface, self.capture_filter, self.snaplen)
+            try:
+                capture.open()
+                self.capture = capture
+                while self.running:
+                    self.packets_captured += capture.poll(self._on_header, timeout_ms=1000)
+                    self.sampler.update(capture.backlog())
+            except Exception as e:
+                print(f"Raw Capture Error: {e}")
+                time.sleep(1)
+            finally:
+                capture.close()
+
+    def _fanout_loop(self):
+        from core.fanout import FanoutCapture
+        self.capture = FanoutCapture(self.iface, self.capture_filter, self.snaplen, self.workers,
+                                     max_flows=self.max_flows).start()
+        try:
+            while self.running:
+                # Workers already summed bytes per header tuple; attribute once per flow
+                for packets, _, records in self.capture.receive(timeout=1.0):
+                    self.packets_captured += packets
+                    # Per-flow sums, not packets: these are never sampled
+                    for header in records:
+                        self._record(*header)
+        finally:
+            self.capture.stop()
+
+    def _on_frame(self, cls, data, ts):
+        """Scapy backend: a frame as read from the socket. Only sampled frames are dissected."""
+        if not self.running:
+            return
+        weight = self._sample(ts)
+        if weight:
+            self._on_dissected(cls(data), len(data), weight)
 
     def _on_packet(self, pkt):
+        """An already dissected packet (pcap replays, benchmarks)."""
         if not self.running:
             return
-        
+        weight = self._sample(float(pkt.time))
+        if weight:
+            self._on_dissected(pkt, len(pkt), weight)
+
+    def _sample(self, ts):
+        self.packets_captured += 1
+        if ts is not None and not self.packets_captured & 255:
+            # Capture lag (kernel timestamp vs. now) is scapy's only backlog signal
+            self.sampler.update(min(1.0, (time.time() - float(ts)) / SAMPLING_LAG_BUDGET))
+        return self.sampler.sample()
+
+    def _on_dissected(self, pkt, size, weight):
         if IP in pkt:
             try:
-                size = len(pkt)
-                app_name = "System (Unknown)"
-                direction = "down"
-                src_ip = pkt[IP].src
-                dst_ip = pkt[IP].dst
+                ip = pkt[IP]
+                sport = dport = None
 
-                # A. Handle TCP/UDP
                 if TCP in pkt or UDP in pkt:
                     if TCP in pkt: layer = TCP
                     else: layer = UDP
-                        
                     sport = pkt[layer].sport
                     dport = pkt[layer].dport
-                    
-                    app_by_dst = self._get_process_by_port(dport)
-                    
-                    if app_by_dst != "Unknown":
-                        app_name = app_by_dst
-                        direction = "down"
-                    else:
-                        app_by_src = self._get_process_by_port(sport)
-                        if app_by_src != "Unknown":
-                            app_name = app_by_src
-                            direction = "up"
-                        else:
-                            app_name = "System (Unknown)"
-                            direction = "down"
-
-                elif pkt[IP].proto == 1:
-                    app_name = "System (ICMP/Ping)"
-                    direction = "down" 
-                else:
-                    proto_id = pkt[IP].proto
-                    app_name = f"System (Proto {proto_id})"
-                    direction = "down"
-
-                # Update Data with IPs
-                key = (app_name, src_ip, dst_ip)
-                
-                with self.lock:
-                    if key not in self.traffic_data:
-                        self.traffic_data[key] = [0, 0]
-                    
-                    if direction == "down":
-                        self.traffic_data[key][0] += size
-                    else:
-                        self.traffic_data[key][1] += size
 
+                self.sampler.account(size, weight)
+                self._record(ip_to_int(ip.src), ip_to_int(ip.dst), ip.proto, sport, dport, size * weight)
             except Exception:
                 pass
-        
+
         elif "ARP" in pkt:
             # ARP doesn't have IP layers in the same way, skip or log simply
             pass
 
-    def _get_process_by_port(self, port):
-        now = time.time()
-        if port in self.port_cache:
-            app, ts = self.port_cache[port]
-            if now - ts < self.cache_timeout:
-                return app
-
+    def _on_header(self, src, dst, proto, sport, dport, size):
+        # Raw backend: addresses already arrive as ints
+        weight = self.sampler.sample()
+        if not weight:
+            return
         try:
-            for c in psutil.net_connections(kind="inet"):
-                if c.laddr.port == port:
-                    try:
-                        p = psutil.Process(c.pid)
-                        name = p.name()
-                        self.port_cache[port] = (name, now)
-                        return name
-                    except:
-                        pass
-        except:
+            self.sampler.account(size, weight)
+            self._record(src, dst, proto, sport, dport, size * weight)
+        except Exception:
             pass
-        return "Unknown"
\ No newline at end of file
+
+    def _record(self, src, dst, proto, sport, dport, size):
+        """Attributes one IPv4 packet (addresses as ints) and adds its size to the current interval."""
+        # Which side is this host? One set lookup per address, before any port lookup
+        locality = self.local.classify(src, dst)
+        app_name = "System (Unknown)"
+        direction = "up" if locality == OUTBOUND else "down"
+
+        # A. Handle TCP/UDP: only the local port needs resolving
+        if sport is not None:
+            if locality == INBOUND:
+                app_name = self._get_process_by_port(dport)
+            elif locality == OUTBOUND:
+                app_name = self._get_process_by_port(sport)
+            else:
+                # Loopback or transit: either port may be ours
+                app_name = self._get_process_by_port(dport)
+                if app_name == "Unknown":
+                    app_name = self._get_process_by_port(sport)
+                    if app_name != "Unknown": direction = "up"
+            if app_name == "Unknown":
+                app_name = "System (Unknown)"
+
+        elif proto == 1:
+            app_name = "System (ICMP/Ping)"
+        else:
+            app_name = f"System (Proto {proto})"
+
+        # Update Data with IPs
+        self.flows.add(app_name, src, dst, direction == "up", size)
+
+    def _get_process_by_port(self, port):
+        # O(1) read of the shared index; misses are cached there too
+        return self.sockets.get_name(port)
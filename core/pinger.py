@@ -1,63 +1,214 @@
-import subprocess
+import asyncio
+import itertools
+import os
+import socket
+import struct
 import threading
 import time
-import platform
-import re
+from core.config import PING_TARGETS, PING_INTERVAL, PING_TIMEOUT, PING_TCP_FALLBACK_PORT, PING_STATS_WINDOW
+from core.latency import LatencyTracker
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+def icmp_checksum(data):
+    if len(data) % 2: data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def parse_target(spec):
+    """("icmp", host, None) for "1.1.1.1", ("tcp", host, port) for "tcp://host:port"."""
+    if spec.startswith("tcp://"):
+        host, _, port = spec[len("tcp://"):].rpartition(":")
+        return "tcp", host, int(port)
+    return "icmp", spec, None
+
+class IcmpSocket:
+    """Echo requests and replies for any number of targets over one ICMP socket.
+
+    Uses an unprivileged datagram ICMP socket where the OS allows it (Linux with
+    net.ipv4.ping_group_range, macOS) and a raw socket otherwise (root/admin). Replies
+    are matched to their request by (address, identifier, sequence); with a datagram
+    socket the kernel assigns the identifier and only delivers our own replies. Raw
+    sockets, and datagram sockets on macOS, hand over the IP header too.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.pending = {}   # (address, seq) -> future of the reply's arrival time
+        self.sequence = itertools.count(1)
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.raw = False
+        except OSError:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.raw = True
+        self.ident = os.getpid() & 0xFFFF
+        self.sock.setblocking(False)
+        loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    @property
+    def kind(self):
+        return "raw" if self.raw else "datagram"
+
+    async def probe(self, address, timeout):
+        """Round-trip seconds of one echo to `address` (an IPv4 address), or None on timeout."""
+        seq = next(self.sequence) & 0xFFFF
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, self.ident, seq)
+        payload = b"network-traffic-visualizer"
+        packet = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, icmp_checksum(header + payload), self.ident, seq) + payload
+        arrived = self.loop.create_future()
+        self.pending[(address, seq)] = arrived
+        sent = time.monotonic()
+        try:
+            self.sock.sendto(packet, (address, 0))
+            return await asyncio.wait_for(arrived, timeout) - sent
+        except (asyncio.TimeoutError, OSError):
+            return None
+        finally:
+            self.pending.pop((address, seq), None)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, (address, _) = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue
+            arrived = time.monotonic()
+            if data and data[0] >> 4 == 4:
+                # An IPv4 header first (raw sockets, macOS datagram sockets): no ICMP
+                # type starts with 0x4_, so an echo reply never looks like one
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8: continue
+            kind, _, _, ident, seq = struct.unpack("!BBHHH", data[:8])
+            if kind != ICMP_ECHO_REPLY or (self.raw and ident != self.ident): continue
+            future = self.pending.get((address, seq))
+            if future is not None and not future.done():
+                future.set_result(arrived)
+
+    def close(self):
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+async def tcp_probe(host, port, timeout):
+    """Seconds to complete (or be refused by) a TCP handshake, or None on timeout."""
+    started = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except ConnectionRefusedError:
+        return time.monotonic() - started   # the RST came back: still a full round trip
+    except (asyncio.TimeoutError, OSError):
+        return None
+    elapsed = time.monotonic() - started
+    writer.close()
+    return elapsed
 
 class NetworkPinger:
-    def __init__(self):
+    """Probes every target concurrently from one asyncio loop on a background thread.
+
+    Each target gets its own probe task that fires every `interval` seconds on the
+    monotonic clock (start times spread across the first interval), so a slow or
+    unreachable target never delays the others. Targets map a display name to an
+    IPv4 address (ICMP echo, see IcmpSocket) or "tcp://host:port" (TCP connect time).
+    If no ICMP socket can be opened, ICMP targets are probed with TCP connects to
+    tcp_fallback_port instead.
+
+    get_pings() returns each target's latest round trip in ms, or None if that probe
+    was lost. get_stats() returns LatencyStats per target (percentiles, jitter and
+    loss over the last stats_window seconds, see core.latency).
+    """
+    def __init__(self, targets=None, interval=PING_INTERVAL, timeout=PING_TIMEOUT,
+                 tcp_fallback_port=PING_TCP_FALLBACK_PORT, stats_window=PING_STATS_WINDOW):
         self.running = False
         self.lock = threading.Lock()
-        # TARGETS:
-        # 1. Cloudflare (1.1.1.1)
-        # 2. Google (8.8.8.8)
-        # 3. Mumbai Server (Quad9 DNS - 9.9.9.9) - Guaranteed to reply
-        self.targets = {
-            "Cloudflare (1.1.1.1)": "1.1.1.1",
-            "Google (8.8.8.8)": "8.8.8.8",
-            "Mumbai Server": "9.9.9.9" 
-        }
-        self.pings = {name: 0.0 for name in self.targets}
+        self.targets = dict(targets or PING_TARGETS)
+        self.interval = interval
+        self.timeout = timeout
+        self.tcp_fallback_port = tcp_fallback_port
+        self.pings = {name: None for name in self.targets}
+        self.stats = {name: {"sent": 0, "lost": 0} for name in self.targets}
+        self.trackers = {name: LatencyTracker(window=stats_window) for name in self.targets}
+        self.method = None
+        self.loop = None
 
     def start(self):
         self.running = True
-        self.thread = threading.Thread(target=self._ping_loop, daemon=True)
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
         self.thread.start()
+        self.ready.wait()
 
     def stop(self):
         self.running = False
+        if self.loop is not None and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                pass  # the loop closed in between
 
     def get_pings(self):
         with self.lock:
             return self.pings.copy()
 
-    def _ping_loop(self):
-        while self.running:
-            for name, ip in self.targets.items():
-                if not self.running: break
-                latency = self._measure_ping(ip)
-
-                with self.lock:
-                    self.pings[name] = latency
-            time.sleep(1) 
+    def get_stats(self, names=None):
+        """{name: LatencyStats} for the given targets (all by default)."""
+        now = time.monotonic()
+        with self.lock:
+            return {name: self.trackers[name].summary(now) for name in (names or self.targets)}
 
-    def _measure_ping(self, ip):
+    def _run_loop(self):
+        # Selector loop everywhere: the ICMP socket needs add_reader (not on Proactor)
+        self.loop = asyncio.SelectorEventLoop()
         try:
-            param = '-n' if platform.system().lower() == 'windows' else '-c'
-            
-            # Using 9.9.9.9 which is designed to reply to pings
-            command = ['ping', param, '1', '-w', '1000', ip]
-            
-            startupinfo = None
-            if platform.system() == "Windows":
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            
-            output = subprocess.check_output(command, startupinfo=startupinfo, text=True)
-            
-            match = re.search(r"time[=<](\d+[\.]?\d*)", output)
-            if match:
-                return float(match.group(1))
-            return 0.0 
-        except Exception:
-            return 0.0
\ No newline at end of file
+            self.loop.run_until_complete(self._main())
+        finally:
+            self.loop.close()
+
+    async def _main(self):
+        self.stop_event = asyncio.Event()
+        icmp = None
+        if any(parse_target(spec)[0] == "icmp" for spec in self.targets.values()):
+            try:
+                icmp = IcmpSocket(self.loop)
+                self.method = f"icmp ({icmp.kind})"
+            except OSError as e:
+                print(f"ICMP sockets unavailable ({e}), probing TCP port {self.tcp_fallback_port} instead")
+                self.method = "tcp"
+        self.ready.set()
+
+        tasks = []
+        for i, (name, spec) in enumerate(self.targets.items()):
+            offset = i * self.interval / max(1, len(self.targets))
+            tasks.append(asyncio.ensure_future(self._probe_loop(name, spec, icmp, offset)))
+        await self.stop_event.wait()
+        for task in tasks: task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if icmp is not None: icmp.close()
+
+    async def _probe_loop(self, name, spec, icmp, offset):
+        kind, host, port = parse_target(spec)
+        if kind == "icmp" and icmp is None: kind, port = "tcp", self.tcp_fallback_port
+        if kind == "icmp":
+            try:
+                host = (await self.loop.getaddrinfo(host, None, family=socket.AF_INET))[0][4][0]
+            except OSError:
+                pass  # left as is: every probe fails and is recorded as lost (None)
+        due = time.monotonic() + offset
+        while self.running:
+            await asyncio.sleep(max(0.0, due - time.monotonic()))
+            due += self.interval
+            if kind == "icmp":
+                rtt = await icmp.probe(host, self.timeout)
+            else:
+                rtt = await tcp_probe(host, port, self.timeout)
+            ms = rtt * 1000 if rtt is not None else None
+            with self.lock:
+                self.stats[name]["sent"] += 1
+                if rtt is None: self.stats[name]["lost"] += 1
+                self.pings[name] = ms
+                self.trackers[name].record(ms, time.monotonic())
+            # After a timeout longer than the interval, carry on from now rather than burst
+            due = max(due, time.monotonic())
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import deque, namedtuple
+from core.config import TICK_INTERVAL, SAVE_INTERVAL
+from core.rates import merge_changes
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Everything the UI shows for one tick. Published snapshots are never modified:
+# `changes` covers every tick since the last snapshot the UI took, so none are lost
+# when it falls behind. download_kb/upload_kb are the interface counters in KB/s;
+# pings are the latest round trips (None: lost) and latency their LatencyStats.
+Snapshot = namedtuple("Snapshot", "tick time changes sampling download_kb upload_kb pings latency")
+
+class TimingStats:
+    """The last `size` durations, summarised in ms for get_metrics()."""
+    def __init__(self, size=600):
+        self.samples = deque(maxlen=size)
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        if seconds > self.max: self.max = seconds
+
+    def summary(self):
+        # Copy first: the owning thread may append while another reads
+        ordered = sorted(self.samples)
+        if not ordered: return {"mean_ms": 0.0, "p99_ms": 0.0, "max_ms": self.max * 1000}
+        return {
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+class TrafficPipeline:
+    """Runs capture -> aggregate -> persist on its own thread, off the UI's main loop.
+
+    Every `interval` seconds of the monotonic clock it drains the traffic source, folds
+    the tick into the aggregator (totals, rates, log and cloud queues), reads the
+    interface counters and the latest pings and latency stats, and publishes a Snapshot; every
+    save_interval it also saves the aggregator. Ticks are scheduled from the start
+    time, not from the end of the previous tick, so slow ticks do not accumulate
+    drift; a tick that overruns whole intervals skips them (counted in `stats`).
+
+    The UI calls latest() from its own clock and only renders what it gets. The
+    aggregator belongs to this thread while it runs; the UI may still use its
+    database reads and cloud client, which are thread-safe.
+    """
+    def __init__(self, source, aggregator, pinger=None, interval=TICK_INTERVAL, save_interval=SAVE_INTERVAL):
+        self.source = source
+        self.aggregator = aggregator
+        self.pinger = pinger
+        self.interval = interval
+        self.save_interval = save_interval
+        self.running = False
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.taken = True       # the UI has seen self.snapshot
+        self.ticks = 0
+        self.last_net_io = None
+        self.last_net_time = None
+        self.jitter = TimingStats()     # how late each tick started
+        self.tick_time = TimingStats()  # how long each tick took
+        self.stats = {"ticks": 0, "skipped": 0, "saves": 0, "errors": 0}
+
+    def start(self):
+        self._interface_rates()  # baseline for the first tick
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """Stops after the tick in progress and makes a final save."""
+        self.running = False
+        self.wakeup.set()
+        if hasattr(self, "thread"): self.thread.join(timeout)
+
+    def latest(self):
+        """The newest Snapshot if it has not been returned before, else None."""
+        with self.lock:
+            if self.taken: return None
+            self.taken = True
+            return self.snapshot
+
+    # --- Pipeline thread ---
+    def _run(self):
+        start = time.monotonic()
+        due = start + self.interval
+        next_save = start + self.save_interval
+        while True:
+            delay = due - time.monotonic()
+            if delay > 0 and self.wakeup.wait(delay): break
+            if not self.running: break
+            began = time.monotonic()
+            self.jitter.add(began - due)
+            try:
+                self.tick()
+                if began >= next_save:
+                    self.aggregator.save_data()
+                    self.stats["saves"] += 1
+                    next_save += self.save_interval
+            except Exception as e:
+                # One bad tick must not end capture for the rest of the session
+                self.stats["errors"] += 1
+                print(f"Pipeline Error: {e}")
+            finished = time.monotonic()
+            self.tick_time.add(finished - began)
+
+            due += self.interval
+            if finished >= due:
+                missed = int((finished - due) // self.interval) + 1
+                self.stats["skipped"] += missed
+                due += missed * self.interval
+        self.aggregator.save_data()
+
+    def tick(self):
+        """One capture -> aggregate step; publishes its Snapshot."""
+        traffic_data = self.source.get_traffic_data()
+        changes = self.aggregator.calculate_rates(traffic_data, sampling=self.source.get_sampling_stats())
+        download_kb, upload_kb = self._interface_rates()
+        pings = self.pinger.get_pings() if self.pinger is not None else {}
+        latency = self.pinger.get_stats() if self.pinger is not None else {}
+        self.ticks += 1
+        self.stats["ticks"] = self.ticks
+
+        with self.lock:
+            if not self.taken:
+                changes = merge_changes(self.snapshot.changes, changes)
+            self.snapshot = Snapshot(self.ticks, time.time(), changes, dict(self.aggregator.sampling),
+                                     download_kb, upload_kb, pings, latency)
+            self.taken = False
+
+    def _interface_rates(self):
+        # The NIC counters see every byte, sampled or not: the main graph uses these
+        if psutil is None: return 0.0, 0.0
+        net_io, now = psutil.net_io_counters(), time.monotonic()
+        last, last_time = self.last_net_io, self.last_net_time
+        self.last_net_io, self.last_net_time = net_io, now
+        if last is None or now <= last_time: return 0.0, 0.0
+        elapsed = now - last_time
+        return ((net_io.bytes_recv - last.bytes_recv) / 1024 / elapsed,
+                (net_io.bytes_sent - last.bytes_sent) / 1024 / elapsed)
+
+    def get_metrics(self):
+        return {"stats": dict(self.stats), "tick_jitter": self.jitter.summary(), "tick_time": self.tick_time.summary()}
@@ -1,15 +1,10 @@
-import psutil
+from core.socket_index import get_socket_index
 
 def get_process_by_ports(src_port, dst_port):
-    try:
-        for conn in psutil.net_connections(kind="inet"):
-            if not conn.laddr:
-                continue
-
-            if conn.laddr.port in (src_port, dst_port):
-                if conn.pid:
-                    return psutil.Process(conn.pid).name()
-    except Exception:
-        pass
+    index = get_socket_index()
+    for port in (src_port, dst_port):
+        entry = index.lookup(port)
+        if entry:
+            return entry[1]
 
     return "system"
@@ -0,0 +1,105 @@
+from collections import deque, namedtuple
+from core.config import RATE_SMOOTHING, RATE_EWMA_ALPHA, RATE_WINDOW, RATE_IDLE_TIMEOUT
+
+# What changed in one tick: {app: (down, up)} for new and changed apps, [app] for gone ones
+RateChanges = namedtuple("RateChanges", "added updated removed")
+
+def merge_changes(older, newer):
+    """One RateChanges equal to applying `older` and then `newer`; neither is modified."""
+    added, updated, removed = dict(older.added), dict(older.updated), list(older.removed)
+    for app_name in newer.removed:
+        updated.pop(app_name, None)
+        # An app that came and went in between was never shown
+        if added.pop(app_name, None) is None: removed.append(app_name)
+    for app_name, rate in newer.added.items():
+        if app_name in removed:
+            removed.remove(app_name)
+            updated[app_name] = rate
+        else:
+            added[app_name] = rate
+    for app_name, rate in newer.updated.items():
+        if app_name in added: added[app_name] = rate
+        else: updated[app_name] = rate
+    return RateChanges(added, updated, removed)
+
+class RateEngine:
+    """Smoothed per-app KB/s, kept only for the apps that are currently active.
+
+    update() takes the bytes each app moved this tick. Apps enter the active set with
+    their first bytes and leave it after idle_timeout seconds without any; every tick
+    walks the active set only, so the cost follows current activity and not the
+    number of apps ever seen. Rates are updated in place in `current` and either
+    EWMA-smoothed or averaged over a sliding window. Only differences are reported:
+    apps that appeared, apps that left, and apps whose shown rate moved by more than
+    min_change KB/s.
+    """
+    def __init__(self, smoothing=RATE_SMOOTHING, alpha=RATE_EWMA_ALPHA, window=RATE_WINDOW,
+                 idle_timeout=RATE_IDLE_TIMEOUT, min_change=0.01):
+        if smoothing not in ("ewma", "window"):
+            raise ValueError(f"unknown rate smoothing: {smoothing!r}")
+        self.smoothing = smoothing
+        self.alpha = alpha
+        self.window = window
+        self.idle_timeout = idle_timeout
+        self.min_change = min_change
+
+        self.current = {}       # app -> [down, up] KB/s, active apps only
+        self.shown = {}         # app -> (down, up) last reported to consumers
+        self.last_active = {}   # app -> time of its latest bytes
+        self.samples = {}       # "window" mode: app -> deque of (time, down_bytes, up_bytes)
+        self.started = None
+
+    def update(self, app_bytes, elapsed, now):
+        """Folds in one tick of {app: [down_bytes, up_bytes]}; returns its RateChanges."""
+        if self.started is None: self.started = now - elapsed
+        for app_name in app_bytes:
+            self.last_active[app_name] = now
+            if app_name not in self.current:
+                self.current[app_name] = [0.0, 0.0]
+
+        added, updated, removed = {}, {}, []
+        horizon = now - self.idle_timeout
+        for app_name in list(self.current):
+            if self.last_active[app_name] <= horizon:
+                del self.current[app_name], self.last_active[app_name]
+                self.samples.pop(app_name, None)
+                if self.shown.pop(app_name, None) is not None:
+                    removed.append(app_name)
+                continue
+
+            moved = app_bytes.get(app_name)
+            rate = self.current[app_name]
+            if self.smoothing == "ewma":
+                self._ewma(rate, moved, elapsed)
+            else:
+                self._window(app_name, rate, moved, now)
+
+            shown = self.shown.get(app_name)
+            if shown is None:
+                shown = self.shown[app_name] = (rate[0], rate[1])
+                added[app_name] = shown
+            elif abs(rate[0] - shown[0]) > self.min_change or abs(rate[1] - shown[1]) > self.min_change:
+                shown = self.shown[app_name] = (rate[0], rate[1])
+                updated[app_name] = shown
+        return RateChanges(added, updated, removed)
+
+    def _ewma(self, rate, moved, elapsed):
+        down, up = (moved[0] / 1024 / elapsed, moved[1] / 1024 / elapsed) if moved else (0.0, 0.0)
+        if rate[0] == rate[1] == 0.0:
+            # A new (or fully decayed) app starts at its first reading, not from zero
+            rate[0], rate[1] = down, up
+            return
+        rate[0] += self.alpha * (down - rate[0])
+        rate[1] += self.alpha * (up - rate[1])
+
+    def _window(self, app_name, rate, moved, now):
+        samples = self.samples.get(app_name)
+        if samples is None:
+            samples = self.samples[app_name] = deque()
+        if moved:
+            samples.append((now, moved[0], moved[1]))
+        while samples and samples[0][0] <= now - self.window:
+            samples.popleft()
+        span = min(self.window, now - self.started)
+        rate[0] = sum(s[1] for s in samples) / 1024 / span
+        rate[1] = sum(s[2] for s in samples) / 1024 / span
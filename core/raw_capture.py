@@ -0,0 +1,228 @@
+import mmap
+import select
+import socket
+import struct
+from core.bpf import attach_filter, compile_filter
+
+# Linux <linux/if_packet.h> / <linux/if_ether.h>
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_AUXDATA = 8
+PACKET_VERSION = 10
+PACKET_FANOUT = 18
+TPACKET_V3 = 2
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+ETH_P_8021Q = 0x8100
+ETH_P_8021AD = 0x88A8
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+# <asm-generic/socket.h>: u32 sk_meminfo[], [0] receive queue bytes, [1] its limit
+SO_MEMINFO = 55
+
+# struct tpacket3_hdr is 48 bytes, followed by struct sockaddr_ll
+TPACKET3_HDR = struct.Struct("=IIIIIIHH")
+SLL_PROTOCOL_OFFSET = 48 + 2
+BLOCK_HDR = struct.Struct("=III")  # block_status, num_pkts, offset_to_first_pkt (at +8)
+# struct tpacket_auxdata: tp_status, tp_len, tp_snaplen, tp_mac, tp_net, vlan tci/tpid
+TPACKET_AUXDATA = struct.Struct("=IIIHHHH")
+AUXDATA_SPACE = socket.CMSG_SPACE(TPACKET_AUXDATA.size)
+
+IPV4_HDR = struct.Struct("!B5xHxB2xII")
+PORTS = struct.Struct("!HH")
+ETHERTYPE = struct.Struct("!H")
+
+def parse_ipv4(buf, off, caplen, wirelen):
+    """Returns (src, dst, proto, sport, dport, wirelen) from an IPv4 header, or None.
+
+    `buf` is anything struct can read (memoryview, mmap, bytes). Addresses are returned
+    as ints; ports are None for non-TCP/UDP packets and for non-first fragments,
+    matching what scapy dissects.
+    """
+    if caplen < 20: return None
+    ver_ihl, frag, proto, src, dst = IPV4_HDR.unpack_from(buf, off)
+    if ver_ihl >> 4 != 4: return None
+    sport = dport = None
+    ihl = (ver_ihl & 0x0F) * 4
+    if (proto == 6 or proto == 17) and not frag & 0x1FFF and caplen >= ihl + 4:
+        sport, dport = PORTS.unpack_from(buf, off + ihl)
+    return src, dst, proto, sport, dport, wirelen
+
+def parse_frame(buf, off, caplen, wirelen):
+    """Same as parse_ipv4, starting from an Ethernet header (VLAN tags are skipped)."""
+    if caplen < 14: return None
+    ethertype = ETHERTYPE.unpack_from(buf, off + 12)[0]
+    l3 = 14
+    while (ethertype == ETH_P_8021Q or ethertype == ETH_P_8021AD) and caplen >= l3 + 4:
+        ethertype = ETHERTYPE.unpack_from(buf, off + l3 + 2)[0]
+        l3 += 4
+    if ethertype != ETH_P_IP: return None
+    return parse_ipv4(buf, off + l3, caplen - l3, wirelen)
+
+class RawCapture:
+    """Reads frames from an AF_PACKET socket, through a TPACKET_V3 mmap ring when possible.
+
+    poll() hands one parsed header tuple at a time to a callback and never builds
+    per-packet objects; packets that are not IPv4 are skipped before the callback.
+    The capture filter runs in the kernel and truncates accepted frames to snaplen.
+    Each poll() handles at most one lap of the ring, or socket_batch frames without
+    it, so the caller gets control back under any load.
+    """
+    def __init__(self, iface=None, capture_filter="", snaplen=262144, fanout=None,
+                 block_size=1 << 20, block_count=16, frame_size=2048, block_timeout_ms=100, socket_batch=4096):
+        self.iface = iface
+        self.fanout = fanout
+        self.capture_filter = capture_filter
+        self.snaplen = snaplen
+        self.block_size = block_size
+        self.block_count = block_count
+        self.frame_size = frame_size
+        self.block_timeout_ms = block_timeout_ms
+        self.socket_batch = socket_batch
+        self.sock = None
+        self.ring = None
+        self.current_block = 0
+        self.buffer = None
+        self.kernel_packets = 0
+        self.kernel_drops = 0
+
+    def open(self):
+        # Protocol 0 receives nothing until bind(), so no frame slips past the filter
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        attach_filter(self.sock, compile_filter(self.capture_filter, self.snaplen))
+        try:
+            self._setup_ring()
+        except OSError as e:
+            print(f"TPACKET_V3 ring unavailable ({e}), falling back to recv()")
+            self.ring = None
+            self.buffer = bytearray(65536)
+            # recv() only sees the frame as the filter trimmed it; the wire length
+            # (tp_len, as in the ring's tpacket3_hdr) comes with each packet's auxdata
+            self.sock.setsockopt(SOL_PACKET, PACKET_AUXDATA, 1)
+            self._grow_receive_buffer(self.block_size * self.block_count)
+        self.sock.bind((self.iface or "", ETH_P_ALL))
+        if self.fanout is not None:
+            # PACKET_FANOUT: the kernel spreads flows over every socket in the group
+            self.sock.setsockopt(SOL_PACKET, PACKET_FANOUT, struct.pack("=I", self.fanout))
+        self.poller = select.poll()
+        self.poller.register(self.sock.fileno(), select.POLLIN | select.POLLERR)
+        return self
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        if self.sock is not None:
+            self.read_stats()
+            self.sock.close()
+            self.sock = None
+
+    def read_stats(self):
+        """Accumulates PACKET_STATISTICS (the kernel resets them on every read).
+
+        kernel_packets counts frames that passed the filter, kernel_drops those the
+        ring had no room for. Frames rejected by the filter are not counted by the kernel.
+        """
+        if self.sock is not None:
+            try:
+                # tpacket_stats_v3 on the ring, the 8-byte tpacket_stats without it
+                packets, drops = struct.unpack_from("II", self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 12))
+                self.kernel_packets += packets
+                self.kernel_drops += drops
+            except OSError:
+                pass
+        return self.kernel_packets, self.kernel_drops
+
+    def _setup_ring(self):
+        self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        frame_count = (self.block_size // self.frame_size) * self.block_count
+        req = struct.pack("=IIIIIII", self.block_size, self.block_count, self.frame_size,
+                          frame_count, self.block_timeout_ms, 0, 0)
+        self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+        self.ring = mmap.mmap(self.sock.fileno(), self.block_size * self.block_count,
+                              mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self.current_block = 0
+
+    def _grow_receive_buffer(self, size):
+        """Lets the socket queue as much as the ring would have held (the default
+        ~200 KiB overflows within a millisecond of a burst)."""
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUFFORCE, size)
+        except (OSError, AttributeError):
+            # Unprivileged: capped at net.core.rmem_max
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+
+    def backlog(self):
+        """How far behind the kernel we are, 0..1: the fraction of ring blocks filled and
+        still waiting for us, or without the ring, how full the socket's receive queue is."""
+        if self.ring is None: return self._queue_backlog()
+        ready = 0
+        for block in range(self.block_count):
+            if BLOCK_HDR.unpack_from(self.ring, block * self.block_size + 8)[0] & TP_STATUS_USER:
+                ready += 1
+        return ready / self.block_count
+
+    def _queue_backlog(self):
+        try:
+            queued, limit = struct.unpack_from("=II", self.sock.getsockopt(socket.SOL_SOCKET, SO_MEMINFO, 36))
+            return min(1.0, queued / limit) if limit else 0.0
+        except OSError:
+            # Before Linux 4.12: only drops since the last check show we fell behind
+            drops = self.kernel_drops
+            self.read_stats()
+            return 1.0 if self.kernel_drops > drops else 0.0
+
+    def poll(self, callback, timeout_ms=1000):
+        """Feeds every packet that is ready (waiting up to timeout_ms) to callback(*header)."""
+        if self.ring is not None:
+            return self._poll_ring(callback, timeout_ms)
+        return self._poll_socket(callback, timeout_ms)
+
+    def _poll_ring(self, callback, timeout_ms):
+        ring = self.ring
+        handled = 0
+        waited = False
+        blocks = 0
+        # At most one lap of the ring per call so the caller can notice stop()
+        while blocks < self.block_count:
+            base = self.current_block * self.block_size
+            status, num_pkts, first = BLOCK_HDR.unpack_from(ring, base + 8)
+            if not status & TP_STATUS_USER:
+                if blocks or waited: break
+                self.poller.poll(timeout_ms)
+                waited = True
+                continue
+
+            pos = base + first
+            for _ in range(num_pkts):
+                next_off, _, _, snaplen, wirelen, _, mac, net = TPACKET3_HDR.unpack_from(ring, pos)
+                if ETHERTYPE.unpack_from(ring, pos + SLL_PROTOCOL_OFFSET)[0] == ETH_P_IP:
+                    header = parse_ipv4(ring, pos + net, snaplen - (net - mac), wirelen)
+                    if header is not None: callback(*header)
+                pos += next_off
+            handled += num_pkts
+
+            # Hand the block back to the kernel
+            struct.pack_into("=I", ring, base + 8, TP_STATUS_KERNEL)
+            self.current_block = (self.current_block + 1) % self.block_count
+            blocks += 1
+        return handled
+
+    def _poll_socket(self, callback, timeout_ms):
+        handled = 0
+        if not self.poller.poll(timeout_ms): return 0
+        view = memoryview(self.buffer)
+        while handled < self.socket_batch:
+            try:
+                caplen, ancdata, _, _ = self.sock.recvmsg_into([self.buffer], AUXDATA_SPACE, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return handled
+            wirelen = caplen
+            for level, kind, data in ancdata:
+                if level == SOL_PACKET and kind == PACKET_AUXDATA:
+                    wirelen = TPACKET_AUXDATA.unpack_from(data)[1]
+            header = parse_frame(view, 0, caplen, wirelen)
+            if header is not None: callback(*header)
+            handled += 1
+        return handled
@@ -0,0 +1,255 @@
+import json
+import mmap
+import struct
+import time
+from core.local_addrs import LocalAddresses
+from core.packet_sniffer import PacketSniffer
+from core.raw_capture import ETHERTYPE, ETH_P_IP, parse_frame, parse_ipv4
+
+PCAP_MAGIC_USEC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+PCAPNG_IDB = 1
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+def _parse_sll(buf, off, caplen, wirelen):
+    if caplen < 16 or ETHERTYPE.unpack_from(buf, off + 14)[0] != ETH_P_IP: return None
+    return parse_ipv4(buf, off + 16, caplen - 16, wirelen)
+
+def _parse_sll2(buf, off, caplen, wirelen):
+    if caplen < 20 or ETHERTYPE.unpack_from(buf, off)[0] != ETH_P_IP: return None
+    return parse_ipv4(buf, off + 20, caplen - 20, wirelen)
+
+# linktype -> header parser with the same signature and result as parse_frame
+LINK_PARSERS = {
+    LINKTYPE_ETHERNET: parse_frame,
+    LINKTYPE_RAW: parse_ipv4,
+    LINKTYPE_IPV4: parse_ipv4,
+    12: parse_ipv4,  # raw IP on some BSDs
+    LINKTYPE_LINUX_SLL: _parse_sll,
+    LINKTYPE_LINUX_SLL2: _parse_sll2,
+}
+
+class PcapReader:
+    """Iterates (timestamp, linktype, buf, offset, caplen, wirelen) over a pcap or pcapng file.
+
+    With use_mmap the file is mapped and `buf` is the mapping itself, so records are
+    parsed in place without copying; otherwise records are read one at a time.
+    """
+    def __init__(self, path, use_mmap=False):
+        self.path = path
+        self.use_mmap = use_mmap
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            if self.use_mmap:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    yield from self._records(_MappedStream(data))
+            else:
+                yield from self._records(_FileStream(f))
+
+    def _records(self, stream):
+        head = stream.peek(4)
+        if len(head) < 4: return
+        if struct.unpack("<I", head)[0] == PCAPNG_SHB:
+            yield from self._pcapng(stream)
+        else:
+            yield from self._pcap(stream)
+
+    def _pcap(self, stream):
+        header = stream.read(24)
+        magic = struct.unpack("<I", header[:4])[0]
+        endian = "<"
+        if magic not in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            endian = ">"
+            magic = struct.unpack(">I", header[:4])[0]
+            if magic not in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+                raise ValueError(f"{self.path}: not a pcap/pcapng file")
+        scale = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+        linktype = struct.unpack(endian + "I", header[20:24])[0] & 0x0FFFFFFF
+        record = struct.Struct(endian + "IIII")
+
+        while True:
+            rec = stream.read(16)
+            if len(rec) < 16: return
+            sec, frac, caplen, wirelen = record.unpack(rec)
+            buf, off = stream.take(caplen)
+            if buf is None: return
+            yield sec + frac * scale, linktype, buf, off, caplen, wirelen
+
+    def _pcapng(self, stream):
+        endian = "<"
+        interfaces = []  # (linktype, snaplen, ts scale)
+        while True:
+            head = stream.read(8)
+            if len(head) < 8: return
+            block_type = struct.unpack(endian + "I", head[:4])[0]
+            if block_type == PCAPNG_SHB:
+                # Byte order is only known from the section header itself
+                bom = stream.peek(4)
+                endian = "<" if struct.unpack("<I", bom)[0] == PCAPNG_BYTE_ORDER else ">"
+                interfaces = []
+            total_len = struct.unpack(endian + "I", head[4:8])[0]
+            body, off = stream.take(total_len - 8)
+            if body is None: return
+
+            if block_type == PCAPNG_IDB:
+                linktype, _, snaplen = struct.unpack_from(endian + "HHI", body, off)
+                interfaces.append((linktype, snaplen, _pcapng_ts_scale(body, off + 8, off + total_len - 12, endian)))
+            elif block_type == PCAPNG_EPB:
+                iface, ts_high, ts_low, caplen, wirelen = struct.unpack_from(endian + "IIIII", body, off)
+                if iface >= len(interfaces): continue
+                linktype, _, scale = interfaces[iface]
+                yield ((ts_high << 32) | ts_low) * scale, linktype, body, off + 20, caplen, wirelen
+            elif block_type == PCAPNG_SPB and interfaces:
+                wirelen = struct.unpack_from(endian + "I", body, off)[0]
+                linktype, snaplen, _ = interfaces[0]
+                caplen = min(wirelen, snaplen or wirelen, total_len - 16)
+                # Simple packets carry no timestamp
+                yield None, linktype, body, off + 4, caplen, wirelen
+
+def _pcapng_ts_scale(buf, pos, end, endian):
+    """Reads if_tsresol from an interface block's options (default: microseconds)."""
+    while pos + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", buf, pos)
+        if code == 0: break
+        if code == 9 and length >= 1:
+            value = buf[pos + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        pos += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+class _FileStream:
+    def __init__(self, f):
+        self.f = f
+
+    def peek(self, n):
+        pos = self.f.tell()
+        data = self.f.read(n)
+        self.f.seek(pos)
+        return data
+
+    def read(self, n):
+        return self.f.read(n)
+
+    def take(self, n):
+        data = self.f.read(n)
+        if len(data) < n: return None, 0
+        return data, 0
+
+class _MappedStream:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def peek(self, n):
+        return self.data[self.pos:self.pos + n]
+
+    def read(self, n):
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += len(chunk)
+        return chunk
+
+    def take(self, n):
+        if self.pos + n > len(self.data): return None, 0
+        off = self.pos
+        self.pos += n
+        return self.data, off
+
+class StaticPortMap:
+    """Process attribution from a fixed port -> app map (for captures from another host)."""
+    def __init__(self, ports=None):
+        self.ports = {int(port): name for port, name in (ports or {}).items()}
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def get_name(self, port):
+        return self.ports.get(port, "Unknown")
+
+class ReplaySource:
+    """Drives pcap records through PacketSniffer parsing/attribution and the aggregator.
+
+    speed=None replays as fast as possible; otherwise the original packet spacing is
+    honored, divided by speed. Every `tick` seconds of capture time the accumulated
+    flows go through aggregator.calculate_rates (and so into SQLite), exactly like the
+    live app's one-second UI tick. However run() ends (end of input, stop(), an
+    exception such as KeyboardInterrupt), it flushes the last tick and saves totals.
+    """
+    def __init__(self, paths, aggregator, resolver=None, local_prefixes=(), speed=None, tick=1.0,
+                 save_every=5, use_mmap=False):
+        self.paths = paths
+        self.aggregator = aggregator
+        # The capture's host is not this one: locality comes only from the given prefixes
+        self.sniffer = PacketSniffer(resolver=resolver or StaticPortMap(),
+                                     local=LocalAddresses(local_prefixes, live=False))
+        self.speed = speed
+        self.tick = tick
+        self.save_every = save_every
+        self.use_mmap = use_mmap
+        self.running = False
+        self.stats = {"packets": 0, "ignored": 0, "ticks": 0, "log_rows": 0}
+
+    def run(self):
+        self.running = True
+        record = self.sniffer._record
+        stats = self.stats
+        wall_start = time.monotonic()
+        first_ts = None
+        next_tick = None
+        last_ts = 0.0
+
+        try:
+            for path in self.paths:
+                for ts, linktype, buf, off, caplen, wirelen in PcapReader(path, self.use_mmap):
+                    if not self.running: return stats
+                    if ts is None: ts = last_ts
+                    last_ts = ts
+                    if first_ts is None:
+                        first_ts = ts
+                        next_tick = ts + self.tick
+                        self.aggregator.last_check_time = ts
+
+                    while ts >= next_tick:
+                        self._flush(next_tick)
+                        next_tick += self.tick
+
+                    if self.speed:
+                        delay = (ts - first_ts) / self.speed - (time.monotonic() - wall_start)
+                        if delay > 0: time.sleep(delay)
+
+                    parse = LINK_PARSERS.get(linktype)
+                    header = parse(buf, off, caplen, wirelen) if parse else None
+                    if header is None:
+                        stats["ignored"] += 1
+                        continue
+                    record(*header)
+                    stats["packets"] += 1
+        finally:
+            # Also after stop() or Ctrl-C: the last partial tick and the totals are kept
+            if next_tick is not None:
+                self._flush(next_tick)
+            self.aggregator.save_data()
+            stats["seconds"] = time.monotonic() - wall_start
+        return stats
+
+    def stop(self):
+        self.running = False
+
+    def _flush(self, now):
+        data = self.sniffer.get_traffic_data()
+        self.stats["log_rows"] += sum(1 for down, up in data.values() if down or up)
+        self.aggregator.calculate_rates(data, now=now)
+        self.stats["ticks"] += 1
+        if self.save_every and self.stats["ticks"] % self.save_every == 0:
+            self.aggregator.save_data()
@@ -0,0 +1,72 @@
+from core.config import LOG_RETENTION
+
+# (tier, bucket seconds), finest first; "raw" is instance_logs itself
+TIERS = (("1m", 60), ("1h", 3600), ("1d", 86400))
+STEPS = {"raw": 1, **dict(TIERS)}
+
+# Which end is remote: down rows are keyed (remote -> local), up rows (local -> remote)
+REMOTE_IP = "CASE WHEN download_speed >= upload_speed THEN src_ip ELSE dst_ip END"
+
+ROLLUP_SQL = """
+    INSERT INTO log_rollup_{tier} (bucket, app_id, remote_ip, down_sum, up_sum, down_max, up_max, samples)
+    SELECT CAST(timestamp / {step} AS INTEGER) * {step}, app_id, {remote},
+           SUM(download_speed), SUM(upload_speed), MAX(download_speed), MAX(upload_speed), COUNT(*)
+    FROM instance_logs WHERE id > ? AND id <= ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT (bucket, app_id, remote_ip) DO UPDATE SET
+        down_sum = down_sum + excluded.down_sum,
+        up_sum = up_sum + excluded.up_sum,
+        down_max = MAX(down_max, excluded.down_max),
+        up_max = MAX(up_max, excluded.up_max),
+        samples = samples + excluded.samples
+"""
+
+class LogRollups:
+    """Incremental 1-minute / 1-hour / 1-day rollups of instance_logs.
+
+    Each run() takes the raw rows logged since the last run (tracked by row id, so
+    nothing is read twice) and UPSERTs them into every tier at once, merging sums,
+    maxima and sample counts per (bucket, app, remote IP); partially filled buckets
+    simply keep accumulating. Runs on the storage writer's connection, inside its
+    transaction; the tables live in core.schema. Expired rows are removed by
+    core.maintenance; `retention` here only tells readers which tiers still cover
+    a range.
+    """
+    def __init__(self, retention=LOG_RETENTION, batch_rows=50000):
+        self.retention = dict(retention)
+        self.batch_rows = batch_rows
+
+    def run(self, cursor):
+        """Rolls up one batch. Returns True if raw rows are still waiting."""
+        last_id = int(self._get(cursor, "raw_id", 0))
+        cursor.execute("SELECT id, timestamp FROM instance_logs ORDER BY id DESC LIMIT 1")
+        newest = cursor.fetchone()
+        backlog = False
+        if newest and newest[0] > last_id:
+            upto = min(newest[0], last_id + self.batch_rows)
+            for tier, step in TIERS:
+                cursor.execute(ROLLUP_SQL.format(tier=tier, step=step, remote=REMOTE_IP), (last_id, upto))
+            self._set(cursor, "raw_id", upto)
+            self._set(cursor, "latest", newest[1])
+            backlog = upto < newest[0]
+
+        return backlog
+
+    def pick_tier(self, start, end, now, min_points=60):
+        """Coarsest tier with at least min_points buckets in [start, end) that still holds `start`."""
+        span = max(0.0, end - start)
+        covering = [tier for tier in ("raw",) + tuple(t for t, _ in TIERS)
+                    if self.retention.get(tier) is None or now - self.retention[tier] <= start]
+        for tier in reversed(covering):
+            if span / STEPS[tier] >= min_points:
+                return tier
+        # Range too short for any tier's resolution: the finest one that still has it
+        return covering[0] if covering else TIERS[-1][0]
+
+    def _get(self, cursor, name, default):
+        cursor.execute("SELECT value FROM rollup_state WHERE name = ?", (name,))
+        row = cursor.fetchone()
+        return row[0] if row else default
+
+    def _set(self, cursor, name, value):
+        cursor.execute("INSERT OR REPLACE INTO rollup_state (name, value) VALUES (?, ?)", (name, value))
@@ -0,0 +1,70 @@
+import math
+import random
+import time
+
+class AdaptiveSampler:
+    """Switches the sniffer to 1-in-N packet sampling while the capture is falling behind.
+
+    update() is fed a backlog pressure in [0, 1] (ring occupancy or capture lag); N
+    doubles above high_water and halves below low_water, at most once per hold_time.
+    sample() returns the weight to scale a packet by (0 = skip), so byte totals stay
+    unbiased. The error of those estimates is tracked per interval as a 95% bound on
+    the relative error of the total (Horvitz-Thompson variance with p = 1/N).
+    """
+    def __init__(self, high_water=0.5, low_water=0.1, max_rate=1024, hold_time=0.5, mode="systematic"):
+        self.high_water = high_water
+        self.low_water = low_water
+        self.max_rate = max_rate
+        self.hold_time = hold_time
+        self.mode = mode
+        self.rate = 1
+        self.counter = 0
+        self.changed_at = 0.0
+        self._reset_interval()
+
+    def _reset_interval(self):
+        self.estimate = 0.0
+        self.variance = 0.0
+        self.sampled = 0
+        self.max_rate_seen = self.rate
+
+    def update(self, pressure):
+        now = time.monotonic()
+        if now - self.changed_at < self.hold_time: return
+        if pressure > self.high_water and self.rate < self.max_rate:
+            self.rate *= 2
+        elif pressure < self.low_water and self.rate > 1:
+            self.rate //= 2
+        else:
+            return
+        self.changed_at = now
+        self.counter = 0
+        if self.rate > self.max_rate_seen: self.max_rate_seen = self.rate
+
+    def sample(self):
+        rate = self.rate
+        if rate == 1: return 1
+        if self.mode == "random":
+            return rate if random.random() * rate < 1 else 0
+        self.counter += 1
+        if self.counter < rate: return 0
+        self.counter = 0
+        return rate
+
+    def account(self, size, weight):
+        """Adds one kept packet's contribution to the interval's error estimate."""
+        if weight > 1:
+            self.estimate += size * weight
+            self.variance += size * size * weight * (weight - 1)
+            self.sampled += 1
+        else:
+            self.estimate += size
+
+    def snapshot(self):
+        """Returns {'rate', 'max_rate', 'error'} for the interval so far and starts a new one."""
+        error = 0.0
+        if self.estimate > 0 and self.variance > 0:
+            error = 1.96 * math.sqrt(self.variance) / self.estimate
+        stats = {"rate": self.rate, "max_rate": self.max_rate_seen, "error": error}
+        self._reset_interval()
+        return stats
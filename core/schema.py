@@ -0,0 +1,184 @@
+import socket
+import struct
+import time
+
+# PRAGMA user_version of the current layout. 0 = new file or the original text schema.
+SCHEMA_VERSION = 2
+
+ROLLUP_TIERS = ("1m", "1h", "1d")
+# App for legacy rows that were logged without an app name
+MISSING_APP_NAME = "Unknown"
+
+IPV4 = struct.Struct("!i")
+
+def pack_ip(text):
+    """Compact storage form of an address: signed 32-bit int (IPv4, 4 bytes on disk),
+    16-byte blob (IPv6), or the text itself for anything else (e.g. a wildcard)."""
+    if text is None: return None
+    try:
+        return IPV4.unpack(socket.inet_pton(socket.AF_INET, text))[0]
+    except (OSError, TypeError):
+        pass
+    try:
+        return socket.inet_pton(socket.AF_INET6, text)
+    except (OSError, TypeError):
+        return text
+
+def unpack_ip(value):
+    if isinstance(value, int):
+        return socket.inet_ntop(socket.AF_INET, IPV4.pack(value))
+    if isinstance(value, bytes):
+        return socket.inet_ntop(socket.AF_INET6, value)
+    return value
+
+# --- Current layout ---
+APPS_DDL = (
+    "CREATE TABLE IF NOT EXISTS apps (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+)
+# Trigram index for substring search over app names (needs SQLite 3.34+)
+APPS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS apps_fts USING fts5(name, content='apps', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS apps_fts_insert AFTER INSERT ON apps BEGIN
+           INSERT INTO apps_fts (rowid, name) VALUES (new.id, new.name);
+       END""",
+    "INSERT INTO apps_fts (apps_fts) VALUES ('rebuild')",
+)
+INSTANCE_LOGS_DDL = """
+    CREATE TABLE IF NOT EXISTS instance_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp REAL,
+        app_id INTEGER REFERENCES apps (id),
+        download_speed REAL,
+        upload_speed REAL,
+        src_ip,
+        dst_ip
+    )
+"""
+ROLLUP_DDL = """
+    CREATE TABLE IF NOT EXISTS log_rollup_{tier} (
+        bucket INTEGER,
+        app_id INTEGER,
+        remote_ip,
+        down_sum REAL,
+        up_sum REAL,
+        down_max REAL,
+        up_max REAL,
+        samples INTEGER,
+        PRIMARY KEY (bucket, app_id, remote_ip)
+    )
+"""
+OTHER_DDL = (
+    """CREATE TABLE IF NOT EXISTS app_traffic (
+           app_name TEXT PRIMARY KEY,
+           download_bytes INTEGER,
+           upload_bytes INTEGER
+       )""",
+    "CREATE TABLE IF NOT EXISTS rollup_state (name TEXT PRIMARY KEY, value REAL)",
+)
+INDEX_DDL = (
+    # Per-app history newest-first, and time-range scans / retention. Neither index is
+    # covering: log reads seek here, then fetch the row from the table by rowid. Adding
+    # the speed and address columns would nearly double the bytes stored per log row.
+    "CREATE INDEX IF NOT EXISTS idx_instance_logs_app_time ON instance_logs (app_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_instance_logs_timestamp ON instance_logs (timestamp)",
+)
+
+def migrate(conn):
+    """Brings the database to SCHEMA_VERSION in place, in one transaction.
+
+    Returns True if the apps_fts trigram index is available (otherwise app search
+    falls back to LIKE over the small apps table).
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    cursor = conn.cursor()
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"database schema v{version} is newer than this app (v{SCHEMA_VERSION})")
+    if version < SCHEMA_VERSION:
+        started = time.monotonic()
+        cursor.execute("BEGIN")
+        try:
+            legacy = "app_name" in _columns(cursor, "instance_logs")
+            for ddl in APPS_DDL + OTHER_DDL: cursor.execute(ddl)
+            has_fts = _create_fts(cursor)
+            if legacy:
+                _migrate_text_schema(conn, cursor)
+            else:
+                cursor.execute(INSTANCE_LOGS_DDL)
+                for tier in ROLLUP_TIERS: cursor.execute(ROLLUP_DDL.format(tier=tier))
+            for ddl in INDEX_DDL: cursor.execute(ddl)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if legacy:
+            print(f"Migrated traffic database to schema v{SCHEMA_VERSION} in {time.monotonic() - started:.1f} s")
+    else:
+        has_fts = bool(_columns(cursor, "apps_fts"))
+    return has_fts
+
+def enable_incremental_vacuum(conn):
+    """Switches a file created before auto_vacuum=INCREMENTAL over, so maintenance can
+    return free pages to the filesystem. This takes one full VACUUM, which rewrites
+    the whole file and locks it throughout: run it offline (tools.vacuum_db), never
+    from the app. Returns False if the file already used incremental vacuum."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+def _columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+def _create_fts(cursor):
+    try:
+        cursor.execute("SAVEPOINT fts")
+        for ddl in APPS_FTS_DDL: cursor.execute(ddl)
+        cursor.execute("RELEASE fts")
+        return True
+    except Exception:
+        cursor.execute("ROLLBACK TO fts")
+        cursor.execute("RELEASE fts")
+        return False
+
+def _migrate_text_schema(conn, cursor):
+    """v0/v1 -> v2: app names into the apps dictionary, IPs packed, ids preserved."""
+    conn.create_function("pack_ip", 1, pack_ip, deterministic=True)
+    rollups = [tier for tier in ROLLUP_TIERS if _columns(cursor, f"log_rollup_{tier}")]
+
+    cursor.execute("INSERT OR IGNORE INTO apps (name) SELECT DISTINCT app_name FROM instance_logs WHERE app_name IS NOT NULL")
+    for tier in rollups:
+        cursor.execute(f"INSERT OR IGNORE INTO apps (name) SELECT DISTINCT app_name FROM log_rollup_{tier} WHERE app_name IS NOT NULL")
+    # Legacy rows without an app name are kept under a placeholder app, never dropped
+    cursor.execute("INSERT OR IGNORE INTO apps (name) VALUES (?)", (MISSING_APP_NAME,))
+    missing_id = cursor.execute("SELECT id FROM apps WHERE name = ?", (MISSING_APP_NAME,)).fetchone()[0]
+
+    cursor.execute("DROP INDEX IF EXISTS idx_instance_logs_timestamp")
+    cursor.execute("ALTER TABLE instance_logs RENAME TO instance_logs_v1")
+    cursor.execute(INSTANCE_LOGS_DDL)
+    # Keeping ids keeps the rollup watermark (rollup_state.raw_id) valid
+    cursor.execute("""
+        INSERT INTO instance_logs (id, timestamp, app_id, download_speed, upload_speed, src_ip, dst_ip)
+        SELECT l.id, l.timestamp, COALESCE(a.id, ?), l.download_speed, l.upload_speed, pack_ip(l.src_ip), pack_ip(l.dst_ip)
+        FROM instance_logs_v1 l LEFT JOIN apps a ON a.name = l.app_name
+        ORDER BY l.id
+    """, (missing_id,))
+    cursor.execute("DROP TABLE instance_logs_v1")
+
+    for tier in ROLLUP_TIERS:
+        if tier in rollups:
+            cursor.execute(f"ALTER TABLE log_rollup_{tier} RENAME TO log_rollup_{tier}_v1")
+        cursor.execute(ROLLUP_DDL.format(tier=tier))
+        if tier in rollups:
+            cursor.execute(f"""
+                INSERT INTO log_rollup_{tier} (bucket, app_id, remote_ip, down_sum, up_sum, down_max, up_max, samples)
+                SELECT r.bucket, COALESCE(a.id, ?), pack_ip(r.remote_ip), r.down_sum, r.up_sum, r.down_max, r.up_max, r.samples
+                FROM log_rollup_{tier}_v1 r LEFT JOIN apps a ON a.name = r.app_name
+                WHERE true
+                ON CONFLICT (bucket, app_id, remote_ip) DO UPDATE SET
+                    down_sum = down_sum + excluded.down_sum, up_sum = up_sum + excluded.up_sum,
+                    down_max = MAX(down_max, excluded.down_max), up_max = MAX(up_max, excluded.up_max),
+                    samples = samples + excluded.samples
+            """, (missing_id,))
+            cursor.execute(f"DROP TABLE log_rollup_{tier}_v1")
@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+import psutil
+from core.platform import IS_LINUX
+
+PROC_NET_FILES = ("/proc/net/tcp", "/proc/net/tcp6", "/proc/net/udp", "/proc/net/udp6")
+
+class SocketIndex:
+    """Port -> (pid, name) index kept current by a background thread.
+
+    Lookups are plain dict reads, so the packet path never touches the socket table.
+    On Linux the index is built by diffing /proc/net/{tcp,udp}{,6}: only sockets that
+    appeared since the last pass need their inode resolved to a pid.
+    """
+    def __init__(self, refresh_interval=1.0, miss_ttl=2.0):
+        self.refresh_interval = refresh_interval
+        self.miss_ttl = miss_ttl
+        self.running = False
+        self.wake = threading.Event()
+
+        self.ports = {}     # port -> (pid, name), replaced wholesale on every refresh
+        self.inodes = {}    # socket inode -> (pid, name), used by capture-free engines
+        self.misses = {}    # port -> monotonic time of the last miss
+
+        self._rows = {}     # proc file -> {inode: port} from the previous pass
+        self._owners = {}   # inode -> pid (None if no process owns it)
+        self._names = {}    # pid -> process name
+
+    def start(self):
+        if self.running: return self
+        self.running = True
+        self._refresh()
+        self.thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+
+    def lookup(self, port):
+        """Returns (pid, name) for a local port, or None. Never blocks."""
+        entry = self.ports.get(port)
+        if entry is not None:
+            return entry
+
+        # Cached miss: only ask the refresher for an early pass once per miss_ttl
+        now = time.monotonic()
+        last = self.misses.get(port)
+        if last is None or now - last >= self.miss_ttl:
+            self.misses[port] = now
+            self.wake.set()
+        return None
+
+    def get_name(self, port):
+        entry = self.lookup(port)
+        return entry[1] if entry else "Unknown"
+
+    def lookup_inode(self, inode):
+        return self.inodes.get(inode)
+
+    # --- Background refresh ---
+    def _refresh_loop(self):
+        while self.running:
+            self.wake.wait(self.refresh_interval)
+            self.wake.clear()
+            if not self.running: break
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"Socket Index Error: {e}")
+            # Coalesce bursts of misses into at most one extra pass per interval
+            time.sleep(min(self.refresh_interval, 0.2))
+
+    def _refresh(self):
+        if IS_LINUX and os.path.exists(PROC_NET_FILES[0]):
+            ports, inodes = self._scan_proc()
+        else:
+            ports, inodes = self._scan_psutil()
+        self.ports = ports
+        self.inodes = inodes
+        # Misses for ports that now resolve are no longer interesting
+        if self.misses:
+            self.misses = {p: ts for p, ts in self.misses.items() if p not in ports}
+
+    def _scan_proc(self):
+        current = {}
+        new_inodes = set()
+        for path in PROC_NET_FILES:
+            rows = self._read_proc_net(path)
+            previous = self._rows.get(path, {})
+            new_inodes.update(inode for inode in rows if inode not in previous)
+            self._rows[path] = rows
+            current.update(rows)
+
+        # Forget sockets that disappeared, resolve only the ones that appeared
+        self._owners = {inode: pid for inode, pid in self._owners.items() if inode in current}
+        unresolved = {inode for inode in new_inodes if inode not in self._owners}
+        if unresolved:
+            self._owners.update(self._resolve_inodes(unresolved))
+
+        live_pids = set()
+        ports, inodes = {}, {}
+        for inode, port in current.items():
+            pid = self._owners.get(inode)
+            if pid is None: continue
+            name = self._process_name(pid)
+            if name is None: continue
+            live_pids.add(pid)
+            entry = (pid, name)
+            inodes[inode] = entry
+            ports.setdefault(port, entry)
+        self._names = {pid: name for pid, name in self._names.items() if pid in live_pids}
+        return ports, inodes
+
+    def _read_proc_net(self, path):
+        rows = {}
+        try:
+            with open(path, "rb") as f:
+                f.readline()  # header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 10: continue
+                    inode = int(fields[9])
+                    if inode == 0: continue  # TIME_WAIT and friends have no owner
+                    local = fields[1]
+                    rows[inode] = int(local[local.rindex(b":") + 1:], 16)
+        except OSError:
+            pass
+        return rows
+
+    def _resolve_inodes(self, wanted):
+        found = {inode: None for inode in wanted}
+        remaining = len(wanted)
+        try:
+            pids = [p for p in os.listdir("/proc") if p.isdigit()]
+        except OSError:
+            return found
+        for pid in pids:
+            fd_dir = f"/proc/{pid}/fd"
+            try:
+                fds = os.listdir(fd_dir)
+            except OSError:
+                continue
+            for fd in fds:
+                try:
+                    target = os.readlink(f"{fd_dir}/{fd}")
+                except OSError:
+                    continue
+                if not target.startswith("socket:["): continue
+                inode = int(target[8:-1])
+                if inode in found and found[inode] is None:
+                    found[inode] = int(pid)
+                    remaining -= 1
+                    if remaining == 0: return found
+        return found
+
+    def _scan_psutil(self):
+        ports = {}
+        try:
+            for c in psutil.net_connections(kind="inet"):
+                if not c.laddr or not c.pid or c.laddr.port in ports: continue
+                name = self._process_name(c.pid)
+                if name is not None:
+                    ports[c.laddr.port] = (c.pid, name)
+        except Exception:
+            pass
+        live_pids = {pid for pid, _ in ports.values()}
+        self._names = {pid: name for pid, name in self._names.items() if pid in live_pids}
+        return ports, {}
+
+    def _process_name(self, pid):
+        name = self._names.get(pid)
+        if name is None:
+            try:
+                name = psutil.Process(pid).name()
+            except Exception:
+                return None
+            self._names[pid] = name
+        return name
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+def get_socket_index():
+    """Returns the process-wide index, starting it on first use."""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = SocketIndex().start()
+        return _shared_index
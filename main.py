@@ -1,4 +1,4 @@
-import psutil
+import time
 from kivy.config import Config
 Config.set('input', 'mouse', 'mouse,multitouch_on_demand')
 
@@ -8,10 +8,26 @@ from kivy.clock import Clock
 from kivy.core.window import Window
 
 from core.packet_sniffer import PacketSniffer
+from core.config import CAPTURE_BACKEND
+from core.platform import IS_LINUX
 from core.aggregator import TrafficAggregator
+from core.archive import open_archive
+from core.pipeline import TrafficPipeline, TimingStats
 from core.pinger import NetworkPinger  
 from ui.widgets import TrafficGraph, AppDashboard, LogViewer, PingGraph, LoginPopup
 
+def format_sampling(sampling):
+    rate = sampling["max_rate"]
+    if rate <= 1:
+        return "Capture: every packet"
+    return f"Capture overloaded: sampling 1 in {rate}, app speeds are estimates (+/-{sampling['error'] * 100:.1f}%)"
+
+def format_latency(name, stats):
+    if stats is None or stats.p50 is None:
+        return f"{name}: no replies" + (f" ({stats.loss * 100:.0f}% loss)" if stats and stats.sent else "")
+    return (f"{name}: p50 {stats.p50:.1f} / p95 {stats.p95:.1f} / p99 {stats.p99:.1f} ms, "
+            f"jitter {stats.jitter:.1f} ms, loss {stats.loss * 100:.1f}%")
+
 class NetworkApp(App):
     def build(self):
         Window.size = (900, 700)
@@ -19,62 +35,72 @@ class NetworkApp(App):
 
     def on_start(self):
         # 1. Start Sniffer
-        self.sniffer = PacketSniffer()
+        if CAPTURE_BACKEND == "sockdiag" and IS_LINUX:
+            from core.sock_diag import SockDiagSource
+            self.sniffer = SockDiagSource()
+        else:
+            self.sniffer = PacketSniffer()
         self.sniffer.start()
 
         # 2. Start Aggregator
-        self.aggregator = TrafficAggregator()
+        self.aggregator = TrafficAggregator(archive=open_archive())
         
         # 3. Start Pinger 
         self.pinger = NetworkPinger()
         self.pinger.start()
 
-        # 4. Schedule Updates
-        Clock.schedule_interval(self.update_ui, 1.0)
-        Clock.schedule_interval(self.save_database, 5.0)
+        # 4. Capture -> aggregate -> persist runs on its own thread; the UI only renders
+        self.pipeline = TrafficPipeline(self.sniffer, self.aggregator, self.pinger)
+        self.pipeline.start()
 
-        # --- NEW: Initialize Hardware Counter ---
-        self.last_net_io = psutil.net_io_counters()
+        # 5. Schedule Updates: poll for new snapshots well within one tick
+        self.frame_time = TimingStats()   # Kivy frame intervals
+        self.render_time = TimingStats()  # update_ui per snapshot
+        self.last_tick = 0
+        Clock.schedule_interval(self.update_ui, 0.1)
+        Clock.schedule_interval(self.frame_time.add, 0)
 
     def update_ui(self, dt):
-        # --- Update Traffic Tab ---
-        traffic_data = self.sniffer.get_traffic_data()
-        rates = self.aggregator.calculate_rates(traffic_data)
-        
-        # --- NEW: Hybrid Speed Fix (Accurate Hardware Stats) ---
-        current_net_io = psutil.net_io_counters()
-        
-        # Calculate bytes since last second
-        bytes_recv = current_net_io.bytes_recv - self.last_net_io.bytes_recv
-        bytes_sent = current_net_io.bytes_sent - self.last_net_io.bytes_sent
-        
-        # Convert to KB/s
-        download_kb = bytes_recv / 1024
-        upload_kb = bytes_sent / 1024
-        
-        # Save for next loop
-        self.last_net_io = current_net_io
+        snapshot = self.pipeline.latest()
+        if snapshot is None: return
+        started = time.perf_counter()
 
-        # Update the Main Graph with ACCURATE numbers
+        # --- Update Traffic Tab ---
+        # The main graph uses the NIC counters (every byte); the app list the sniffer's flows
         if "main_graph" in self.root.ids:
-            self.root.ids.main_graph.update_graph(download_kb, upload_kb)
-        # -------------------------------------------------------
+            self.root.ids.main_graph.update_graph(snapshot.download_kb, snapshot.upload_kb)
 
         if "dashboard" in self.root.ids:
-            # Keep using Sniffer data for the App List (Details)
-            self.root.ids.dashboard.update_apps(rates)
+            # A snapshot covers every tick since the last one taken
+            self.root.ids.dashboard.update_apps(snapshot.changes, snapshot.tick - self.last_tick)
+        self.last_tick = snapshot.tick
+
+        if "sampling_label" in self.root.ids:
+            self.root.ids.sampling_label.text = format_sampling(snapshot.sampling)
             
         # --- Update Latency Tab ---
+        # Lost probes are None: no point on the graph, counted in the loss figures below it
         if "ping_graph" in self.root.ids:
-            pings = self.pinger.get_pings()
             self.root.ids.ping_graph.update_graph(
-                pings.get("Cloudflare (1.1.1.1)", 0),
-                pings.get("Google (8.8.8.8)", 0)
+                snapshot.pings.get("Cloudflare (1.1.1.1)"),
+                snapshot.pings.get("Google (8.8.8.8)")
             )
-
-    def save_database(self, dt):
-        if hasattr(self, 'aggregator'):
-            self.aggregator.save_data()
+        if "ping_stats" in self.root.ids:
+            self.root.ids.ping_stats.text = "\n".join(
+                format_latency(name, snapshot.latency.get(name))
+                for name in ("Cloudflare (1.1.1.1)", "Google (8.8.8.8)"))
+        self.render_time.add(time.perf_counter() - started)
+
+    def get_metrics(self):
+        """Pipeline tick jitter and duration, UI frame intervals and render time (ms),
+        plus the storage writer's ("db": file sizes, queue, maintenance) and the cloud
+        sync's ("cloud": batch, outbox backlog) counters."""
+        metrics = self.pipeline.get_metrics()
+        metrics["ui_frame"] = self.frame_time.summary()
+        metrics["ui_render"] = self.render_time.summary()
+        metrics["db"] = self.aggregator.db.get_metrics()
+        metrics["cloud"] = self.aggregator.cloud.get_metrics()
+        return metrics
 
     def open_db_view(self):
         """Opens the Log Viewer Popup"""
@@ -102,7 +128,21 @@ class NetworkApp(App):
 
     def on_stop(self):
         if hasattr(self, 'sniffer'): self.sniffer.stop()
-        if hasattr(self, 'aggregator'): self.aggregator.save_data()
+        if hasattr(self, 'pipeline'):
+            # Finishes the tick in progress and saves the totals
+            self.pipeline.stop()
+            metrics = self.get_metrics()
+            print(f"Pipeline: tick jitter p99 {metrics['tick_jitter']['p99_ms']:.1f} ms, "
+                  f"UI frame p99 {metrics['ui_frame']['p99_ms']:.1f} ms")
+            db = metrics["db"]
+            print(f"Database: {db['db_bytes'] / 1e6:.1f} MB (+{db['wal_bytes'] / 1e6:.1f} MB WAL), "
+                  f"{db['queued']} batches queued, {db['dropped']} rows dropped, "
+                  f"max maintenance step {db['max_step_ms']:.1f} ms")
+        if hasattr(self, 'aggregator'):
+            # Unsent logs stay in the outbox for the next run
+            self.aggregator.cloud.stop(timeout=2)
+            # Waits for the storage thread to commit everything still queued
+            self.aggregator.db.close()
         if hasattr(self, 'pinger'): self.pinger.stop() 
 
 if __name__ == "__main__":
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, "tests", "data")
+
+# The app runs from the repository root (python main.py); so do the tests
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,64 @@
+"""TrafficArchive retention, size cap and concurrent use."""
+import os
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from core.archive import TrafficArchive
+
+def tick(bytes_down=1000):
+    return {("firefox", "93.1.2.3", "10.0.0.5"): [bytes_down, 10]}
+
+def fill(archive, start, seconds):
+    for second in range(seconds):
+        archive.append(start + second, tick())
+    archive.flush()
+
+def segment_starts(path):
+    return sorted(int(entry) for entry in os.listdir(path) if entry.isdigit())
+
+def test_retention_deletes_old_sealed_segments(tmp_path):
+    archive = TrafficArchive(str(tmp_path), segment_seconds=10, retention=30, max_bytes=None)
+    fill(archive, 1000, 100)
+    # Pruned when the 1090 segment started: newest row 1089, so segments whose
+    # last row is before 1059 are gone
+    assert segment_starts(str(tmp_path)) == [1050, 1060, 1070, 1080, 1090]
+    assert archive.stats["pruned_segments"] == 5
+    assert archive.top_apps(0, 2000)[0][1] == 50 * 1000
+
+def test_size_cap_deletes_oldest_first_and_keeps_current(tmp_path):
+    archive = TrafficArchive(str(tmp_path), segment_seconds=10, retention=None, max_bytes=1)
+    fill(archive, 1000, 35)
+    # Every sealed segment is over the cap; only the one being written survives
+    assert segment_starts(str(tmp_path)) == [1030]
+    fill(archive, 1035, 10)
+    assert segment_starts(str(tmp_path)) == [1040]
+
+def test_reopening_prunes(tmp_path):
+    fill(TrafficArchive(str(tmp_path), segment_seconds=10, retention=None, max_bytes=None), 1000, 50)
+    assert len(segment_starts(str(tmp_path))) == 5
+    TrafficArchive(str(tmp_path), segment_seconds=10, retention=15, max_bytes=None)
+    assert segment_starts(str(tmp_path)) == [1030, 1040]
+
+def test_queries_while_another_thread_appends(tmp_path):
+    archive = TrafficArchive(str(tmp_path), segment_seconds=10, retention=None, max_bytes=None)
+    errors = []
+    def writer():
+        try:
+            for second in range(2000):
+                archive.append(1000 + second, tick())
+                if second % 7 == 0: archive.flush()
+            archive.flush()
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while thread.is_alive():
+        top = archive.top_apps(0, 10000)
+        times, down, up = archive.series(1000, 3000, 100, "firefox")
+        assert not top or top[0][1] % 1000 == 0
+        assert down.sum() % 1000 == 0
+    thread.join()
+    assert not errors
+    assert archive.top_apps(0, 10000) == [("firefox", 2000 * 1000, 2000 * 10)]
@@ -0,0 +1,115 @@
+"""CloudClient against the stand-in server (tools.cloud_server) on localhost."""
+import gzip
+import json
+import time
+
+import pytest
+
+from core.cloud_client import CloudClient, encode_batch
+from tools.cloud_server import TOKEN, StandInServer, decode_batch
+
+LOGS = [
+    (1700000000.0, "firefox", 1500.5, 20.0, "93.1.2.3", "10.0.0.5"),
+    (1700000000.0, "spotify", 0.0, 3.25, "2001:db8::1", "fe80::2"),
+    (1700000001.5, "firefox", 7.0, 0.0, "93.1.2.4", "10.0.0.5"),
+    (1700000002.0, "Unknown", 1.0, 1.0, None, None),
+]
+
+def make_logs(count, start=1700000000.0):
+    return [(start + i, f"app{i % 7}", float(i), float(i % 3), f"93.1.{i % 250}.1", "10.0.0.5")
+            for i in range(count)]
+
+def add_ticks(client, logs, per_tick=25):
+    # The outbox hands out whole appends, so add them a tick's worth at a time
+    for start in range(0, len(logs), per_tick):
+        client.add_logs(logs[start:start + per_tick])
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline: return False
+        time.sleep(0.01)
+    return True
+
+@pytest.fixture
+def server():
+    server = StandInServer(keep_rows=True).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def make_client(server, tmp_path):
+    clients = []
+    def make(**options):
+        options = dict(dict(interval=0.05, min_batch=50, max_batch=2000, max_backoff=0.2, timeout=2.0), **options)
+        client = CloudClient(server.base_url, outbox_path=str(tmp_path / f"outbox{len(clients)}"), **options)
+        clients.append(client)
+        return client
+    yield make
+    for client in clients: client.stop(timeout=5)
+
+def test_encode_batch_round_trips_through_server_decoder():
+    status = [{"name": "firefox", "down": 1.5, "up": 0.0}]
+    raw, body = encode_batch(LOGS, status, client="abc", seq=42)
+    assert gzip.decompress(body) == raw
+    payload, rows = decode_batch(body, "gzip")
+    assert rows == LOGS
+    assert (payload["client"], payload["seq"], payload["status"]) == ("abc", 42, status)
+    # Each app name is sent once
+    assert payload["apps"] == ["firefox", "spotify", "Unknown"]
+    assert decode_batch(raw)[1] == LOGS
+
+def test_server_decoder_reads_row_lists():
+    assert decode_batch(json.dumps({"logs": LOGS, "status": []}).encode())[1] == LOGS
+
+def test_client_delivers_every_row_in_order(server, make_client):
+    client = make_client()
+    assert client.login("user", "secret")
+    logs = make_logs(1000)
+    add_ticks(client, logs)
+    assert wait_for(lambda: client.get_metrics()["backlog"] == 0)
+    assert server.rows == logs
+    assert server.stats["duplicates"] == 0 and server.stats["gaps"] == 0
+
+def test_batch_halves_on_413(server, make_client):
+    server.max_rows = 100
+    client = make_client()
+    client.batch = 800
+    add_ticks(client, make_logs(1000))
+    assert client.login("user", "secret")
+    assert wait_for(lambda: client.get_metrics()["backlog"] == 0)
+    # 800 -> 400 -> 200 -> 100 fits; nothing was stored from the rejected batches, and
+    # fast replies do not grow the batch back past the server's limit
+    assert server.stats["too_large"] == 3
+    metrics = client.get_metrics()
+    assert metrics["too_large"] == 3 and metrics["failures"] == 0
+    assert metrics["batch"] == 100
+    assert server.rows == make_logs(1000)
+
+def test_batch_halves_on_timeout(server, make_client):
+    server.latency = 0.5
+    client = make_client(timeout=0.1)
+    client.batch = 400
+    add_ticks(client, make_logs(500))
+    assert client.login("user", "secret")
+    assert wait_for(lambda: client.get_metrics()["batch"] == client.min_batch)
+    assert client.get_metrics()["failures"] >= 3
+    # Once the server answers in time again, everything arrives exactly once
+    server.latency = 0.0
+    assert wait_for(lambda: client.get_metrics()["backlog"] == 0)
+    assert server.stats["rows"] == 500 and server.stats["gaps"] == 0
+
+def test_401_logs_out_and_keeps_the_backlog(server, make_client):
+    client = make_client()
+    add_ticks(client, make_logs(200))
+    with client.lock:
+        client.token = "expired-token"
+        client.wakeup.notify()
+    assert wait_for(lambda: client.token is None)
+    assert client.get_metrics()["backlog"] == 200
+    assert client.get_metrics()["failures"] == 0   # no backoff: it waits for a login instead
+    assert server.stats["syncs"] == 0
+    # Logging in again sends what was waiting
+    assert client.login("user", "secret") and client.token == TOKEN
+    assert wait_for(lambda: client.get_metrics()["backlog"] == 0)
+    assert server.rows == make_logs(200)
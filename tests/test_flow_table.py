@@ -0,0 +1,40 @@
+"""DoubleBufferedFlows drains: the same totals tick after tick, with cached labels."""
+import threading
+
+from core.flow_table import OTHER, DoubleBufferedFlows, ip_to_int
+
+A, B, C = ip_to_int("10.0.0.5"), ip_to_int("93.1.2.3"), ip_to_int("93.1.2.4")
+
+def test_drains_reuse_labels_and_stay_exact():
+    flows = DoubleBufferedFlows(threading.Lock())
+    for tick in range(3):
+        flows.add("firefox", B, A, False, 1000 + tick)
+        flows.add("firefox", A, B, True, 10)
+        flows.add("spotify", C, A, False, 500)
+        assert flows.swap_and_drain() == {
+            ("firefox", "93.1.2.3", "10.0.0.5"): (1000 + tick, 0),
+            ("firefox", "10.0.0.5", "93.1.2.3"): (0, 10),
+            ("spotify", "93.1.2.4", "10.0.0.5"): (500, 0),
+        }
+    assert len(flows.labels) == 3 and len(flows.ip_cache) == 3
+    # An interval without traffic drains empty
+    assert flows.swap_and_drain() == {}
+
+def test_folded_flows_drain_as_other():
+    flows = DoubleBufferedFlows(threading.Lock(), max_flows=2)
+    flows.add("firefox", B, A, False, 1000)
+    flows.add("firefox", C, A, False, 10)
+    flows.add("firefox", A, A, False, 20)   # takes over the 10-byte flow's slot
+    data = flows.swap_and_drain()
+    assert data[("firefox", OTHER, OTHER)] == (10, 0)
+    assert sum(down for down, _ in data.values()) == 1030
+    assert flows.stats["folded"] == 1
+
+def test_label_cache_is_cleared_once_flows_churn():
+    flows = DoubleBufferedFlows(threading.Lock())
+    for tick in range(6):
+        for i in range(40000):
+            flows.add("app", tick * 40000 + i, A, False, 1)
+        assert len(flows.swap_and_drain()) == 40000
+    # 4x the 40000 flows of a drain (but at least 65536) is the most kept
+    assert len(flows.labels) <= 160000 + 40000
@@ -0,0 +1,71 @@
+"""Outbox: appends never wait on a peek's file reads, and close() is safe mid-sync."""
+import builtins
+import threading
+
+import core.outbox
+from core.outbox import Outbox
+
+def rows(start, count):
+    return [[start + i, "firefox", 1.0, 0.0, "93.1.2.3", "10.0.0.5"] for i in range(count)]
+
+def drain(outbox, max_rows=100):
+    delivered = []
+    while True:
+        batch = outbox.peek(max_rows)
+        if batch is None: return delivered
+        delivered.extend(batch.rows)
+        outbox.ack(batch)
+
+def test_append_does_not_wait_for_peek(tmp_path, monkeypatch):
+    outbox = Outbox(str(tmp_path), 1 << 20)
+    outbox.append(rows(0, 10))
+    reading, appended = threading.Event(), threading.Event()
+    def slow_open(*args, **kwargs):
+        reading.set()
+        appended.wait(5)
+        return builtins.open(*args, **kwargs)
+    monkeypatch.setattr(core.outbox, "open", slow_open, raising=False)
+    result = []
+    peeker = threading.Thread(target=lambda: result.append(outbox.peek(100)))
+    peeker.start()
+    assert reading.wait(5)
+    # The peek is inside its file read: an append must not wait for it
+    appender = threading.Thread(target=lambda: outbox.append(rows(10, 10)) and appended.set())
+    appender.start()
+    done = appended.wait(2)
+    appended.set()
+    appender.join()
+    assert done
+    peeker.join()
+    monkeypatch.undo()
+    # The batch is what was there when the peek started; the new rows come next
+    assert result[0].rows == rows(0, 10)
+    outbox.ack(result[0])
+    assert drain(outbox) == rows(10, 10)
+
+def test_concurrent_append_and_drain_deliver_every_row_once(tmp_path):
+    outbox = Outbox(str(tmp_path), 1 << 24, segment_bytes=4096)
+    def writer():
+        for i in range(500): outbox.append(rows(i * 7, 7))
+    thread = threading.Thread(target=writer)
+    thread.start()
+    delivered = []
+    while thread.is_alive() or outbox.backlog:
+        delivered.extend(drain(outbox, max_rows=50))
+    thread.join()
+    delivered.extend(drain(outbox))
+    assert delivered == rows(0, 3500)
+
+def test_close_while_a_batch_is_in_flight(tmp_path):
+    outbox = Outbox(str(tmp_path), 1 << 20)
+    outbox.append(rows(0, 10))
+    batch = outbox.peek(100)
+    outbox.close()
+    # The sync thread outlived stop(): its ack still counts, nothing else gets in
+    outbox.ack(batch)
+    assert outbox.peek(100) is None
+    assert not outbox.append(rows(10, 5))
+    assert outbox.stats["dropped"] == 5
+    outbox.close()
+    reopened = Outbox(str(tmp_path), 1 << 20)
+    assert reopened.backlog == 0 and reopened.peek(100) is None
@@ -0,0 +1,194 @@
+"""NetworkPinger and IcmpSocket: fallbacks, reply matching and loss with fake sockets,
+then real probes of 127.0.0.1 (the ICMP one skipped where no ICMP socket can be opened)."""
+import asyncio
+import os
+import socket
+import struct
+import time
+
+import pytest
+
+import core.pinger
+from core.pinger import ICMP_ECHO_REPLY, IcmpSocket, NetworkPinger, tcp_probe
+
+class FakeSocket:
+    """Records what is sent and hands out queued (data, address) replies. Its fileno
+    is a pipe that never becomes readable, so a real loop can watch it."""
+    def __init__(self, kind):
+        self.kind = kind
+        self.sent = []
+        self.replies = []
+        self.read_fd, self.write_fd = os.pipe()
+
+    def setblocking(self, flag): pass
+    def fileno(self): return self.read_fd
+
+    def sendto(self, data, address):
+        self.sent.append((data, address))
+
+    def recvfrom(self, size):
+        if not self.replies: raise BlockingIOError
+        return self.replies.pop(0)
+
+    def close(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+class FakeLoop:
+    def __init__(self): self.readers = {}
+    def add_reader(self, fd, callback): self.readers[fd] = callback
+    def remove_reader(self, fd): self.readers.pop(fd, None)
+
+def fake_socket_module(monkeypatch, allowed):
+    """socket.socket that only opens the given types; returns the attempted types."""
+    attempts = []
+    def make(family, kind, proto=0):
+        attempts.append(kind)
+        if kind not in allowed: raise PermissionError(1, "Operation not permitted")
+        return FakeSocket(kind)
+    monkeypatch.setattr(core.pinger.socket, "socket", make)
+    return attempts
+
+def echo_reply(request, ip_header=False):
+    _, _, _, ident, seq = struct.unpack("!BBHHH", request[:8])
+    reply = struct.pack("!BBHHH", ICMP_ECHO_REPLY, 0, 0, ident, seq) + request[8:]
+    # Raw sockets (and macOS datagram ones) also see the 20-byte IP header
+    return (b"\x45" + b"\0" * 19 + reply) if ip_header else reply
+
+@pytest.fixture
+def loop():
+    loop = asyncio.SelectorEventLoop()
+    yield loop
+    loop.close()
+
+# --- IcmpSocket ---
+def test_datagram_socket_is_tried_first(monkeypatch):
+    attempts = fake_socket_module(monkeypatch, {socket.SOCK_DGRAM, socket.SOCK_RAW})
+    icmp = IcmpSocket(FakeLoop())
+    assert attempts == [socket.SOCK_DGRAM] and icmp.kind == "datagram"
+    icmp.close()
+
+def test_falls_back_to_raw_socket(monkeypatch):
+    attempts = fake_socket_module(monkeypatch, {socket.SOCK_RAW})
+    loop = FakeLoop()
+    icmp = IcmpSocket(loop)
+    assert attempts == [socket.SOCK_DGRAM, socket.SOCK_RAW] and icmp.kind == "raw"
+    assert list(loop.readers) == [icmp.sock.fileno()]
+    icmp.close()
+    assert not loop.readers
+
+def test_no_icmp_socket_raises(monkeypatch):
+    fake_socket_module(monkeypatch, set())
+    with pytest.raises(OSError):
+        IcmpSocket(FakeLoop())
+
+@pytest.mark.parametrize("allowed, ip_header", [(socket.SOCK_DGRAM, False), (socket.SOCK_DGRAM, True),
+                                                (socket.SOCK_RAW, True)], ids=["datagram", "datagram-macos", "raw"])
+def test_reply_is_matched_to_its_probe(monkeypatch, loop, allowed, ip_header):
+    fake_socket_module(monkeypatch, {allowed})
+    icmp = IcmpSocket(loop)
+    async def probe_and_reply():
+        probe = asyncio.ensure_future(icmp.probe("192.0.2.1", 1.0))
+        await asyncio.sleep(0)
+        request, address = icmp.sock.sent[0]
+        assert address == ("192.0.2.1", 0)
+        icmp.sock.replies += [
+            (echo_reply(request, ip_header), ("192.0.2.99", 0)),   # another host: ignored
+            (echo_reply(request, ip_header), ("192.0.2.1", 0)),
+        ]
+        icmp._on_readable()
+        return await probe
+    rtt = loop.run_until_complete(probe_and_reply())
+    assert rtt is not None and 0 <= rtt < 1.0
+    assert not icmp.pending
+    icmp.close()
+
+def test_timeout_returns_none(monkeypatch, loop):
+    fake_socket_module(monkeypatch, {socket.SOCK_DGRAM})
+    icmp = IcmpSocket(loop)
+    started = time.monotonic()
+    assert loop.run_until_complete(icmp.probe("192.0.2.1", 0.05)) is None
+    assert time.monotonic() - started < 1.0
+    assert len(icmp.sock.sent) == 1 and not icmp.pending
+    icmp.close()
+
+# --- NetworkPinger ---
+def counts(pinger):
+    with pinger.lock: return {name: dict(stats) for name, stats in pinger.stats.items()}
+
+def run_pinger(pinger, probes):
+    pinger.start()
+    deadline = time.monotonic() + 5
+    while min(c["sent"] for c in counts(pinger).values()) < probes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pinger.stop()
+    pinger.thread.join(5)
+
+def test_icmp_timeouts_are_recorded_as_loss(monkeypatch):
+    class SilentIcmp:
+        kind = "datagram"
+        def __init__(self, loop): pass
+        async def probe(self, address, timeout):
+            return None   # as IcmpSocket.probe after a timeout (see above)
+        def close(self): pass
+    monkeypatch.setattr(core.pinger, "IcmpSocket", SilentIcmp)
+    pinger = NetworkPinger({"lan": "127.0.0.1"}, interval=0.02, timeout=0.01)
+    run_pinger(pinger, probes=3)
+    assert pinger.method == "icmp (datagram)"
+    lan = counts(pinger)["lan"]
+    assert lan["sent"] >= 3 and lan["lost"] == lan["sent"]
+    assert pinger.get_pings() == {"lan": None}
+    stats = pinger.get_stats()["lan"]
+    assert stats.loss == 1.0 and stats.p50 is None
+
+def test_falls_back_to_tcp_probe_without_icmp(monkeypatch):
+    def no_icmp(loop): raise PermissionError(1, "Operation not permitted")
+    probed = []
+    async def fake_tcp_probe(host, port, timeout):
+        probed.append((host, port))
+        return 0.005 if host == "127.0.0.1" else None
+    monkeypatch.setattr(core.pinger, "IcmpSocket", no_icmp)
+    monkeypatch.setattr(core.pinger, "tcp_probe", fake_tcp_probe)
+    pinger = NetworkPinger({"lan": "127.0.0.1", "gone": "192.0.2.1", "web": "tcp://127.0.0.1:8080"},
+                           interval=0.02, timeout=0.01, tcp_fallback_port=443)
+    run_pinger(pinger, probes=2)
+    assert pinger.method == "tcp"
+    # ICMP targets go to the fallback port; explicit TCP targets keep theirs
+    assert set(probed) == {("127.0.0.1", 443), ("192.0.2.1", 443), ("127.0.0.1", 8080)}
+    sent = counts(pinger)
+    assert sent["lan"]["lost"] == 0 and sent["gone"]["lost"] == sent["gone"]["sent"]
+    pings = pinger.get_pings()
+    assert pings["lan"] == pytest.approx(5.0) and pings["gone"] is None
+
+# --- Real probes on loopback ---
+def test_tcp_probe_times_a_listener(loop):
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    try:
+        rtt = loop.run_until_complete(tcp_probe("127.0.0.1", listener.getsockname()[1], 1.0))
+    finally:
+        listener.close()
+    assert rtt is not None and 0 < rtt < 0.5
+
+def test_tcp_probe_counts_a_refused_port(loop):
+    # Bound but not listening: the handshake is answered with a RST
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    try:
+        rtt = loop.run_until_complete(tcp_probe("127.0.0.1", closed.getsockname()[1], 1.0))
+    finally:
+        closed.close()
+    assert rtt is not None and 0 < rtt < 0.5
+
+def test_icmp_probe_of_loopback(loop):
+    try:
+        icmp = IcmpSocket(loop)
+    except OSError as e:
+        pytest.skip(f"no ICMP socket: {e}")
+    try:
+        rtts = [loop.run_until_complete(icmp.probe("127.0.0.1", 1.0)) for _ in range(3)]
+    finally:
+        icmp.close()
+    assert all(rtt is not None and 0 < rtt < 0.5 for rtt in rtts)
+    assert not icmp.pending
@@ -0,0 +1,76 @@
+"""The v0/v1 text schema migrates to v2 without losing rows."""
+import sqlite3
+
+import pytest
+
+from core.maintenance import Maintenance
+from core.schema import MISSING_APP_NAME, SCHEMA_VERSION, enable_incremental_vacuum, migrate
+
+LEGACY_LOGS = """
+    CREATE TABLE instance_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp REAL, app_name TEXT, download_speed REAL, upload_speed REAL,
+        src_ip TEXT, dst_ip TEXT
+    )
+"""
+LEGACY_ROLLUP = """
+    CREATE TABLE log_rollup_1m (
+        bucket REAL, app_name TEXT, remote_ip TEXT,
+        down_sum REAL, up_sum REAL, down_max REAL, up_max REAL, samples INTEGER,
+        PRIMARY KEY (bucket, app_name, remote_ip)
+    )
+"""
+
+@pytest.fixture
+def legacy(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"), isolation_level=None)
+    conn.execute(LEGACY_LOGS)
+    conn.execute(LEGACY_ROLLUP)
+    conn.executemany("INSERT INTO instance_logs (timestamp, app_name, download_speed, upload_speed, src_ip, dst_ip) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", [
+                         (100.0, "firefox", 1.5, 0.5, "93.1.2.3", "10.0.0.5"),
+                         (101.0, None, 2.0, 0.0, "93.1.2.4", "10.0.0.5"),
+                         (102.0, MISSING_APP_NAME, 3.0, 1.0, "93.1.2.4", "10.0.0.5"),
+                     ])
+    conn.executemany("INSERT INTO log_rollup_1m VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        (60.0, "firefox", "93.1.2.3", 10.0, 1.0, 5.0, 1.0, 3),
+        (60.0, None, "93.1.2.4", 4.0, 0.0, 4.0, 0.0, 1),
+        # Same bucket and remote as the nameless row once both map to the placeholder
+        (60.0, MISSING_APP_NAME, "93.1.2.4", 6.0, 2.0, 6.0, 2.0, 2),
+    ])
+    yield conn
+    conn.close()
+
+def test_rows_without_app_name_survive(legacy):
+    migrate(legacy)
+    assert legacy.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    rows = legacy.execute("""
+        SELECT l.id, a.name, l.download_speed FROM instance_logs l JOIN apps a ON a.id = l.app_id ORDER BY l.id
+    """).fetchall()
+    assert rows == [(1, "firefox", 1.5), (2, MISSING_APP_NAME, 2.0), (3, MISSING_APP_NAME, 3.0)]
+
+def test_rollups_without_app_name_are_merged(legacy):
+    migrate(legacy)
+    rows = legacy.execute("""
+        SELECT a.name, r.down_sum, r.up_sum, r.down_max, r.up_max, r.samples
+        FROM log_rollup_1m r JOIN apps a ON a.id = r.app_id ORDER BY a.name
+    """).fetchall()
+    assert rows == [(MISSING_APP_NAME, 10.0, 2.0, 6.0, 2.0, 3), ("firefox", 10.0, 1.0, 5.0, 1.0, 3)]
+
+def test_incremental_vacuum_is_switched_on_offline_only(legacy):
+    migrate(legacy)
+    legacy.execute("CREATE TABLE filler (data BLOB)")
+    legacy.executemany("INSERT INTO filler VALUES (?)", [(b"x" * 4000,)] * 50)
+    legacy.execute("DROP TABLE filler")
+    # Neither startup nor a maintenance step rewrites the file
+    maintenance = Maintenance()
+    cursor = legacy.cursor()
+    while maintenance.step(cursor): pass
+    assert legacy.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    assert maintenance.incremental is False and maintenance.stats["vacuumed_pages"] == 0
+    assert legacy.execute("PRAGMA freelist_count").fetchone()[0] > 0
+    # tools.vacuum_db
+    assert enable_incremental_vacuum(legacy)
+    assert legacy.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert legacy.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert not enable_incremental_vacuum(legacy)
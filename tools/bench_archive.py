@@ -0,0 +1,131 @@
+"""Long-range query latency: SQL over instance_logs vs. the columnar archive.
+
+Writes the same synthetic ticks into an instance_logs table (current schema) and
+into a TrafficArchive spread over --days of capture time, then times a top-apps
+query over the whole range and over a 7-day window that starts mid-hour, plus an
+hourly series for one app. Needs numpy.
+
+    python -m tools.bench_archive [--rows 5000000] [--days 30] [--dir /tmp/bench_archive]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+
+from core.archive import TrafficArchive
+from core.schema import migrate, pack_ip
+from tools.synthetic import SyntheticTraffic
+
+SQL_TOP_APPS = """
+    SELECT a.name, SUM(l.download_speed), SUM(l.upload_speed)
+    FROM instance_logs l JOIN apps a ON a.id = l.app_id
+    WHERE l.timestamp >= ? AND l.timestamp < ?
+    GROUP BY l.app_id
+    ORDER BY SUM(l.download_speed) + SUM(l.upload_speed) DESC LIMIT ?
+"""
+SQL_SERIES = """
+    SELECT CAST((timestamp - ?) / ? AS INTEGER), SUM(download_speed), SUM(upload_speed)
+    FROM instance_logs
+    WHERE app_id = (SELECT id FROM apps WHERE name = ?) AND timestamp >= ? AND timestamp < ?
+    GROUP BY 1
+"""
+
+def build(args, start_ts):
+    traffic = SyntheticTraffic(flows=args.flows, apps=args.apps, seed=1)
+    pool = [traffic.flow_dict(active=args.active) for _ in range(64)]
+    ticks = args.rows // args.active
+    step = args.days * 86400 / ticks
+
+    conn = sqlite3.connect(os.path.join(args.dir, "logs.db"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    migrate(conn)
+    for name in traffic.app_names:
+        conn.execute("INSERT INTO apps (name) VALUES (?)", (name,))
+    app_ids = dict(conn.execute("SELECT name, id FROM apps").fetchall())
+    archive = TrafficArchive(os.path.join(args.dir, "archive"))
+
+    t_sql = t_archive = 0.0
+    rows = []
+    for i in range(ticks):
+        now = start_ts + i * step
+        data = pool[i % len(pool)]
+        t = time.perf_counter()
+        archive.append(now, data)
+        if i % 1000 == 999: archive.flush()
+        t_archive += time.perf_counter() - t
+        for (app, src, dst), (down, up) in data.items():
+            rows.append((now, app_ids[app], down / 1024 / step, up / 1024 / step, pack_ip(src), pack_ip(dst)))
+        if len(rows) >= 200000 or i == ticks - 1:
+            t = time.perf_counter()
+            conn.executemany("INSERT INTO instance_logs (timestamp, app_id, download_speed, upload_speed, src_ip, dst_ip) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            t_sql += time.perf_counter() - t
+            rows = []
+    t = time.perf_counter()
+    archive.close()
+    t_archive += time.perf_counter() - t
+    conn.close()
+    return ticks * args.active, t_sql, t_archive, traffic.app_names[len(traffic.app_names) // 2]
+
+def disk_bytes(path):
+    if os.path.isfile(path): return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--active", type=int, default=200, help="flows per tick")
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--flows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=5, help="repeats per query (median is reported)")
+    parser.add_argument("--dir", default="bench_archive")
+    args = parser.parse_args()
+
+    if os.path.exists(args.dir): shutil.rmtree(args.dir)
+    os.makedirs(args.dir)
+    start_ts = 1.7e9 - 1.7e9 % 3600
+    end_ts = start_ts + args.days * 86400
+    rows, t_sql, t_archive, app = build(args, start_ts)
+    print(f"Wrote {rows:,} rows over {args.days:g} days: SQLite {rows / t_sql:,.0f} rows/s, "
+          f"archive {rows / t_archive:,.0f} rows/s")
+
+    conn = sqlite3.connect(os.path.join(args.dir, "logs.db"))
+    archive = TrafficArchive(os.path.join(args.dir, "archive"))
+    week = (start_ts + 86400 * 3 + 1800, start_ts + 86400 * 10 + 1800)
+    queries = {
+        f"top apps, {args.days:g} days": (
+            lambda: conn.execute(SQL_TOP_APPS, (start_ts, end_ts, 10)).fetchall(),
+            lambda: archive.top_apps(start_ts, end_ts, 10)),
+        "top apps, 7 days mid-hour": (
+            lambda: conn.execute(SQL_TOP_APPS, (week[0], week[1], 10)).fetchall(),
+            lambda: archive.top_apps(week[0], week[1], 10)),
+        "hourly series, one app": (
+            lambda: conn.execute(SQL_SERIES, (start_ts, 3600, app, start_ts, end_ts)).fetchall(),
+            lambda: archive.series(start_ts, end_ts, 3600, app)),
+    }
+    top_sql = [row[0] for row in conn.execute(SQL_TOP_APPS, (start_ts, end_ts, 10))]
+    top_archive = [row[0] for row in archive.top_apps(start_ts, end_ts, 10)]
+
+    print(f"{'':<32}{'sqlite':>12}{'archive':>12}")
+    print(f"{'bytes/row on disk':<32}{disk_bytes(os.path.join(args.dir, 'logs.db')) / rows:>12.1f}"
+          f"{disk_bytes(os.path.join(args.dir, 'archive')) / rows:>12.1f}")
+    for label, (sql, columnar) in queries.items():
+        print(f"{label + ' ms':<32}{timed(sql, args.queries):>12.2f}{timed(columnar, args.queries):>12.2f}")
+    print(f"Same top 10: {top_sql == top_archive}")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
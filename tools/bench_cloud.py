@@ -0,0 +1,110 @@
+"""Sustained CloudClient upload rate against the local stand-in server.
+
+Feeds synthetic log rows at --rate rows/s (10 ticks a second) for --seconds and
+reports the rows/s the server actually stored, the outbox backlog and drops left
+over, batch sizes and compression. --rate 0 instead fills the outbox once and
+measures how fast it drains. --outage fails every sync for that many seconds first,
+so the rows pile up in the outbox and drain afterwards; --restart closes the client
+halfway through and opens a new one on the same outbox. Rows the server received
+twice (lost replies, restarts) are de-duplicated by sequence number and reported.
+For comparison, the old sync loop (requests.post, a new connection and 50 JSON rows
+per request) is timed without its 2 s sleep.
+
+    python -m tools.bench_cloud [--rate 20000] [--seconds 10] [--latency 0.02] [--fail-rate 0.05]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import requests
+
+from core.cloud_client import CloudClient
+from tools.cloud_server import StandInServer, TOKEN
+from tools.synthetic import SyntheticTraffic
+
+def open_client(server, outbox):
+    client = CloudClient(base_url=server.base_url, outbox_path=outbox, interval=0.5)
+    client.login("bench", "bench")
+    return client
+
+def run_client(server, rows, args, outbox):
+    client = open_client(server, outbox)
+    offered = 0
+    start = time.monotonic()
+    if args.rate:
+        per_tick = max(1, int(args.rate / 10))
+        ticks = int(args.seconds * 10)
+        for i in range(ticks):
+            if args.restart and i == ticks // 2:
+                client.stop()
+                client = open_client(server, outbox)
+            chunk = i * per_tick % len(rows)
+            client.add_logs(rows[chunk:chunk + per_tick])
+            offered += len(rows[chunk:chunk + per_tick])
+            time.sleep(max(0.0, start + (i + 1) / 10 - time.monotonic()))
+    else:
+        client.add_logs(rows[:args.rows])
+        offered = args.rows
+    # Then let the backlog drain (bounded by --seconds more)
+    deadline = time.monotonic() + args.seconds
+    while client.get_metrics()["backlog"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - start
+    metrics = client.get_metrics()
+    client.stop()
+    return offered, elapsed, metrics
+
+def run_legacy(server, rows, seconds):
+    sent = 0
+    start = time.monotonic()
+    while time.monotonic() - start < seconds:
+        chunk = rows[sent % len(rows):sent % len(rows) + 50]
+        r = requests.post(f"{server.base_url}/sync", json={"logs": chunk, "status": []},
+                          headers={"Authorization": f"Bearer {TOKEN}"}, timeout=3)
+        if r.status_code == 200: sent += len(chunk)
+    return sent / (time.monotonic() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=20000, help="rows/s offered; 0 drains --rows at once")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rows", type=int, default=200000, help="rows for --rate 0")
+    parser.add_argument("--latency", type=float, default=0.0, help="server seconds per sync")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of syncs that fail")
+    parser.add_argument("--lost-ack-rate", type=float, default=0.0, help="fraction of syncs stored but failed")
+    parser.add_argument("--outage", type=float, default=0.0, help="seconds of failed syncs at the start")
+    parser.add_argument("--restart", action="store_true", help="reopen the client halfway through")
+    parser.add_argument("--flows", type=int, default=5000)
+    parser.add_argument("--apps", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = SyntheticTraffic(flows=args.flows, apps=args.apps, seed=1).log_rows(max(args.rows, 100000), per_second=1000)
+    server = StandInServer(latency=args.latency, fail_rate=1.0 if args.outage else args.fail_rate,
+                           lost_ack_rate=args.lost_ack_rate).start()
+    if args.outage:
+        threading.Timer(args.outage, lambda: setattr(server, "fail_rate", args.fail_rate)).start()
+    workdir = tempfile.mkdtemp()
+    try:
+        offered, elapsed, metrics = run_client(server, rows, args, os.path.join(workdir, "outbox"))
+    finally:
+        shutil.rmtree(workdir)
+    stored = server.stats["rows"]
+    print(f"CloudClient: {stored:,} of {offered:,} rows stored in {elapsed:.1f} s = {stored / elapsed:,.0f} rows/s"
+          + (f" ({args.rate:,.0f} offered)" if args.rate else ""))
+    print(f"  backlog {metrics['backlog']:,}, dropped {metrics['dropped']:,}, failures {metrics['failures']}, "
+          f"batches {metrics['batches']}, final batch {metrics['batch']}, last latency {metrics['last_latency_ms']:.1f} ms")
+    print(f"  server: {server.stats['duplicates']:,} duplicate rows skipped, {server.stats['gaps']:,} missing")
+    if metrics["sent_bytes"]:
+        print(f"  gzip {metrics['raw_bytes'] / metrics['sent_bytes']:.1f}x, "
+              f"{metrics['sent_bytes'] / max(1, metrics['sent_rows']):.1f} bytes/row on the wire, "
+              f"{server.stats['connections']} connection(s)")
+    server.fail_rate = server.lost_ack_rate = 0.0
+    print(f"Old sync loop without its sleep: {run_legacy(server, rows, min(args.seconds, 5)):,.0f} rows/s "
+          f"(25 rows/s with it)")
+    server.stop()
+
+if __name__ == "__main__":
+    main()
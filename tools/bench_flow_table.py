@@ -0,0 +1,127 @@
+"""Per-packet cost and memory of the sniffer's flow table vs. the old dict-of-lists.
+
+Each storage takes the packets and is drained twice, as two ticks with the same
+flows: the first drain builds every address string, the second ("steady") is what
+a tick costs the pipeline thread once the flows have been seen.
+
+    python -m tools.bench_flow_table [--flows 100000] [--packets 1000000] [--apps 50]
+"""
+import argparse
+import gc
+import random
+import threading
+import time
+import tracemalloc
+
+from core.flow_table import DoubleBufferedFlows, int_to_ip
+
+def make_flows(flow_count, app_count, seed=1):
+    rng = random.Random(seed)
+    apps = [f"app-{i}" for i in range(app_count)]
+    flows = []
+    for _ in range(flow_count):
+        flows.append((rng.choice(apps), rng.getrandbits(32), rng.getrandbits(32), rng.random() < 0.3))
+    return flows
+
+class LegacyFlows:
+    """The previous PacketSniffer storage: string-tuple keys and [down, up] lists."""
+    def __init__(self, lock):
+        self.lock = lock
+        self.traffic_data = {}
+
+    def add(self, app_name, src_ip, dst_ip, is_up, size):
+        key = (app_name, src_ip, dst_ip)
+        with self.lock:
+            if key not in self.traffic_data:
+                self.traffic_data[key] = [0, 0]
+            if is_up:
+                self.traffic_data[key][1] += size
+            else:
+                self.traffic_data[key][0] += size
+
+    def swap_and_drain(self):
+        with self.lock:
+            data = self.traffic_data.copy()
+            self.traffic_data.clear()
+        return data
+
+class TimedLock:
+    """Records how long the reader holds the lock, i.e. how long the packet path could stall."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.held = 0.0
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.acquired = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.held = time.perf_counter() - self.acquired
+        self.lock.release()
+
+def measure(name, store, packets, flow_count):
+    add = store.add
+    drain_ms = []
+    for _ in range(2):
+        # Per-packet cost
+        start = time.perf_counter()
+        for app, src, dst, is_up, size in packets:
+            add(app, src, dst, is_up, size)
+        add_secs = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data = store.swap_and_drain()
+        drain_ms.append((time.perf_counter() - start) * 1000)
+        assert len(data) == flow_count, (name, len(data))
+    return add_secs, store.lock.held * 1000, drain_ms, data
+
+def resident_bytes(factory, flows, to_address):
+    gc.collect()
+    tracemalloc.start()
+    store = factory(threading.Lock())
+    for app, src, dst, is_up in flows:
+        # Addresses are built inside the traced region: the legacy keys kept their strings
+        store.add(app, to_address(src), to_address(dst), is_up, 64)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flows", type=int, default=100000)
+    parser.add_argument("--packets", type=int, default=1000000)
+    parser.add_argument("--apps", type=int, default=50)
+    args = parser.parse_args()
+
+    flows = make_flows(args.flows, args.apps)
+    rng = random.Random(2)
+    # Every flow at least once, then a random mix
+    order = flows + [rng.choice(flows) for _ in range(max(0, args.packets - len(flows)))]
+    packed = [(app, src, dst, is_up, 60 + (src & 1023)) for app, src, dst, is_up in order]
+    # The legacy path received dotted strings from scapy
+    strings = {}
+    for _, src, dst, _ in flows:
+        strings[src] = int_to_ip(src)
+        strings[dst] = int_to_ip(dst)
+    legacy = [(app, strings[src], strings[dst], is_up, size) for app, src, dst, is_up, size in packed]
+
+    results = []
+    for name, factory, packets, to_address in (
+        ("dict-of-lists", LegacyFlows, legacy, int_to_ip),
+        ("flow-table", DoubleBufferedFlows, packed, int),
+    ):
+        add_secs, held_ms, drain_ms, data = measure(name, factory(TimedLock()), packets, args.flows)
+        memory = resident_bytes(factory, flows, to_address)
+        results.append((name, add_secs, held_ms, drain_ms, memory, data))
+
+    print(f"{args.flows:,} flows, {len(packed):,} packets, {args.apps} apps")
+    print(f"{'storage':<16}{'ns/packet':>12}{'lock held ms':>14}{'first drain ms':>16}{'steady drain ms':>17}"
+          f"{'MiB @ flows':>14}")
+    for name, add_secs, held_ms, (first_ms, steady_ms), memory, _ in results:
+        print(f"{name:<16}{add_secs / len(packed) * 1e9:>12,.0f}{held_ms:>14,.3f}{first_ms:>16,.1f}{steady_ms:>17,.1f}"
+              f"{memory / 2**20:>14,.1f}")
+    legacy_data = {key: tuple(value) for key, value in results[0][5].items()}
+    assert legacy_data == results[1][5], "flow-table totals differ from dict-of-lists"
+
+if __name__ == "__main__":
+    main()
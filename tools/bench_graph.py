@@ -0,0 +1,66 @@
+"""Per-tick cost of the live graphs' data path, by window length.
+
+For each window, fills two RingSeries with a full window of synthetic samples and
+times what one tick costs the UI thread: appending a sample to each line, the
+running max for the y axis and the decimated vertex lists for a --width pixel
+wide graph. For comparison, the old update_graph (lists of (x, y) tuples with
+pop(0), shifting every x and rescanning for the max) is timed with the same
+window.
+
+    python -m tools.bench_graph [--width 800] [--ticks 2000]
+"""
+import argparse
+import math
+import random
+import time
+
+from ui.series import RingSeries
+
+WINDOWS = {"1 min": 60, "1 hour": 3600, "24 hours": 86400}
+
+def legacy_tick(points_down, points_up, down, up, window):
+    current_x = len(points_down)
+    points_down.append((current_x, down))
+    points_up.append((current_x, up))
+    if len(points_down) > window:
+        points_down.pop(0)
+        points_up.pop(0)
+        points_down[:] = [(x - 1, y) for x, y in points_down]
+        points_up[:] = [(x - 1, y) for x, y in points_up]
+    max_v = max(max([y for x, y in points_down] or [0]), max([y for x, y in points_up] or [0]))
+    return max_v, len(points_down)
+
+def samples(n, seed=1):
+    rng = random.Random(seed)
+    return [abs(500 + 400 * math.sin(i / 300) + rng.gauss(0, 100)) for i in range(n)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=800, help="graph width in pixels")
+    parser.add_argument("--ticks", type=int, default=2000, help="ticks timed per window")
+    args = parser.parse_args()
+
+    for label, window in WINDOWS.items():
+        data = samples(window + args.ticks)
+        lines = [RingSeries(max(WINDOWS.values()), window, args.width) for _ in range(2)]
+        for value in data[:window]:
+            for series in lines: series.append(value)
+        t = time.perf_counter()
+        for value in data[window:]:
+            for series in lines: series.append(value)
+            max(series.max() for series in lines)
+            vertices = [series.points() for series in lines]
+        per_tick = (time.perf_counter() - t) / args.ticks
+        print(f"{label:>8}: RingSeries {per_tick * 1e6:8.1f} us/tick, "
+              f"{max(len(v) for v in vertices)} vertices per line")
+
+        points_down, points_up = [(i, y) for i, y in enumerate(data[:window])], [(i, y) for i, y in enumerate(data[:window])]
+        ticks = max(1, min(args.ticks, 2_000_000 // window))
+        t = time.perf_counter()
+        for value in data[window:window + ticks]:
+            legacy_tick(points_down, points_up, value, value, window)
+        per_tick = (time.perf_counter() - t) / ticks
+        print(f"{'':>8}  old lists  {per_tick * 1e6:8.1f} us/tick, {len(points_down)} vertices per line")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""NetworkPinger at scale, against loopback.
+
+Probes --targets loopback addresses (127.0.0.1, 127.0.0.2, ... all answer ICMP on
+Linux) plus a TCP target on a local listener, each every --interval seconds for
+--seconds, and reports the samples collected, losses, round-trip percentiles, the
+CPU the prober used and how long get_stats() takes over every target. For
+comparison, one sequential sweep of the old approach (a `ping -c 1` process per
+target) is timed over a few targets, if ping is installed.
+
+    python -m tools.bench_pinger [--targets 500] [--interval 1.0] [--seconds 10]
+"""
+import argparse
+import shutil
+import socket
+import subprocess
+import time
+
+from core.pinger import NetworkPinger
+
+def percentile(values, pct):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1024)
+    targets = {f"lo-{i}": f"127.0.{i // 250}.{i % 250 + 1}" for i in range(args.targets)}
+    targets["tcp"] = f"tcp://127.0.0.1:{listener.getsockname()[1]}"
+
+    pinger = NetworkPinger(targets, interval=args.interval, timeout=args.timeout)
+    rtts = []
+    cpu = time.process_time()
+    pinger.start()
+    start = time.monotonic()
+    while time.monotonic() - start < args.seconds:
+        time.sleep(args.interval)
+        rtts.extend(ms for ms in pinger.get_pings().values() if ms is not None)
+        while True:   # accept and drop the TCP probes' connections
+            listener.setblocking(False)
+            try: listener.accept()[0].close()
+            except BlockingIOError: break
+    pinger.stop()
+    cpu = time.process_time() - cpu
+    elapsed = time.monotonic() - start
+    t = time.perf_counter()
+    stats = pinger.get_stats()
+    stats_ms = (time.perf_counter() - t) * 1000
+
+    sent = sum(s["sent"] for s in pinger.stats.values())
+    lost = sum(s["lost"] for s in pinger.stats.values())
+    print(f"{len(targets)} targets via {pinger.method}: {sent:,} probes in {elapsed:.1f} s "
+          f"({sent / elapsed:,.0f}/s, {sent / len(targets) / elapsed * args.interval:.2f} per target per interval), "
+          f"{lost} lost")
+    print(f"  rtt p50 {percentile(rtts, 50):.3f} ms, p99 {percentile(rtts, 99):.3f} ms; "
+          f"prober CPU {cpu / elapsed * 100:.1f}% of one core")
+    worst = max(stats.values(), key=lambda s: s.p99 or 0)
+    print(f"  get_stats() over {len(stats)} targets: {stats_ms:.1f} ms; worst p99 {worst.p99 or 0:.3f} ms, "
+          f"jitter {worst.jitter or 0:.3f} ms, loss {worst.loss * 100:.1f}%")
+
+    if shutil.which("ping"):
+        sweep = list(targets.values())[:5]
+        t = time.monotonic()
+        for ip in sweep:
+            subprocess.run(["ping", "-c", "1", "-w", "1", ip], capture_output=True)
+        per_target = (time.monotonic() - t) / len(sweep)
+        print(f"Old sequential ping: {per_target * 1000:.1f} ms per target, "
+              f"so at most {1 / per_target:,.0f} targets per second")
+    listener.close()
+
+if __name__ == "__main__":
+    main()
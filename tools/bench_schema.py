@@ -0,0 +1,131 @@
+"""Row size and log search latency of the original text schema vs. the normalized one.
+
+Builds an instance_logs table in the original layout (app name and IPs as TEXT in
+every row), measures it, migrates it in place with DatabaseManager and measures
+again. Sizes come from SQLite's dbstat table (bytes of pages, per table/index).
+
+    python -m tools.bench_schema [--rows 10000000] [--apps 200] [--db /tmp/bench_schema.db]
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from core.database import DatabaseManager
+from tools.synthetic import SyntheticTraffic
+
+LEGACY_DDL = """
+    CREATE TABLE instance_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp REAL,
+        app_name TEXT,
+        download_speed REAL,
+        upload_speed REAL,
+        src_ip TEXT,
+        dst_ip TEXT
+    )
+"""
+LEGACY_SEARCH = """
+    SELECT timestamp, app_name, download_speed, upload_speed, src_ip, dst_ip
+    FROM instance_logs
+    WHERE app_name LIKE ?
+    ORDER BY id DESC LIMIT ?
+"""
+LEGACY_LATEST = """
+    SELECT timestamp, app_name, download_speed, upload_speed, src_ip, dst_ip
+    FROM instance_logs
+    ORDER BY id DESC LIMIT ?
+"""
+BASE_NAMES = ("firefox", "chrome", "slack", "zoom", "spotify", "steam", "dropbox", "code",
+              "python3", "sshd", "nginx", "postgres", "discord", "telegram", "thunderbird", "docker")
+
+def app_name(i):
+    return f"{BASE_NAMES[i % len(BASE_NAMES)]}-{i // len(BASE_NAMES)}"
+
+def build_legacy(path, rows, apps, flows, chunk=200000):
+    traffic = SyntheticTraffic(flows=flows, apps=apps, seed=1)
+    names = {name: app_name(i) for i, name in enumerate(traffic.app_names)}
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(LEGACY_DDL)
+    # Pretend history is already rolled up so the migrated run measures the schema alone
+    conn.execute("CREATE TABLE rollup_state (name TEXT PRIMARY KEY, value REAL)")
+    start_ts = time.time() - rows / 1000
+    for offset in range(0, rows, chunk):
+        batch = traffic.log_rows(min(chunk, rows - offset), start_ts=start_ts + offset / 1000, per_second=1000)
+        conn.executemany("INSERT INTO instance_logs (timestamp, app_name, download_speed, upload_speed, src_ip, dst_ip) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", [(r[0], names[r[1]]) + r[2:] for r in batch])
+    conn.execute("INSERT INTO rollup_state VALUES ('raw_id', (SELECT MAX(id) FROM instance_logs))")
+    conn.commit()
+    conn.close()
+
+def sizes(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT COUNT(*) FROM instance_logs").fetchone()[0]
+    by_name = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    indexes = [name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'instance_logs'")]
+    conn.close()
+    table = by_name.get("instance_logs", 0)
+    return rows, table / rows, (table + sum(by_name.get(name, 0) for name in indexes)) / rows
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, len(result)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--flows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=5, help="repeats per search (median is reported)")
+    parser.add_argument("--db", default="bench_schema.db")
+    args = parser.parse_args()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix): os.remove(args.db + suffix)
+    searches = {
+        "latest": None,
+        "one app": app_name(args.apps // 2),
+        "app family": BASE_NAMES[3],
+        "short (2 chars)": BASE_NAMES[5][:2],
+        "no match": "zzzz",
+    }
+
+    t = time.perf_counter()
+    build_legacy(args.db, args.rows, args.apps, args.flows)
+    print(f"Built {args.rows:,} legacy rows in {time.perf_counter() - t:.1f} s")
+    rows, table_bytes, total_bytes = sizes(args.db)
+    before = {}
+    conn = sqlite3.connect(args.db)
+    for label, text in searches.items():
+        if text is None:
+            before[label] = timed(lambda: conn.execute(LEGACY_LATEST, (100,)).fetchall(), args.queries)
+        else:
+            before[label] = timed(lambda: conn.execute(LEGACY_SEARCH, (f"%{text}%", 100)).fetchall(), args.queries)
+    conn.close()
+
+    t = time.perf_counter()
+    db = DatabaseManager(args.db)
+    migrate_time = time.perf_counter() - t
+    after = {label: timed(lambda: db.fetch_logs(limit=100, app_filter=text), args.queries)
+             for label, text in searches.items()}
+    db.close()
+    rows_after, table_after, total_after = sizes(args.db)
+
+    print(f"Migrated in place in {migrate_time:.1f} s ({rows_after:,} rows kept)")
+    print(f"{'':<24}{'before':>14}{'after':>14}")
+    print(f"{'table bytes/row':<24}{table_bytes:>14.1f}{table_after:>14.1f}")
+    print(f"{'with indexes bytes/row':<24}{total_bytes:>14.1f}{total_after:>14.1f}")
+    for label in searches:
+        (ms_before, n_before), (ms_after, n_after) = before[label], after[label]
+        print(f"{'search ' + label + ' ms':<24}{ms_before:>14.2f}{ms_after:>14.2f}   ({n_before} / {n_after} rows)")
+
+if __name__ == "__main__":
+    main()
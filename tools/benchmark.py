@@ -0,0 +1,400 @@
+"""Benchmarks every stage of the capture -> aggregate -> storage -> UI pipeline.
+
+Runs headless (Kivy is always stubbed; scapy, psutil and requests only when missing)
+on synthetic traffic, prints a summary and writes machine-readable JSON. With
+--baseline, metrics that got worse by more than --tolerance are flagged and the
+exit status is 1.
+
+    python -m tools.benchmark --flows 10000 --apps 50 --packets 200000 --output bench.json
+    python -m tools.benchmark --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tools import stubs
+
+STUBBED = stubs.install()
+
+from core.aggregator import TrafficAggregator
+from core.cloud_client import CloudClient
+from core.database import DatabaseManager
+from core.maintenance import Maintenance
+from core.packet_sniffer import PacketSniffer
+from core.pipeline import TrafficPipeline, TimingStats
+from core.rollups import LogRollups
+from tools.synthetic import SyntheticTraffic
+
+def percentile(values, pct):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class Results:
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better):
+        self.metrics[name] = {"value": value, "unit": unit, "better": better}
+
+    def timings(self, prefix, samples, unit="ms", scale=1000):
+        values = [s * scale for s in samples]
+        self.add(f"{prefix}.mean_{unit}", sum(values) / len(values), unit, "lower")
+        self.add(f"{prefix}.p99_{unit}", percentile(values, 99), unit, "lower")
+
+def traced(fn):
+    """Runs fn() under tracemalloc; returns (result, peak MiB).
+
+    Tracing slows allocation-heavy code severalfold, so stages time an untraced pass
+    and then repeat the work on a fresh instance here just for the memory peak.
+    """
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak / 2**20
+
+# --- Stages ---
+def bench_sniffer_raw(traffic, results, args):
+    packets = traffic.packets(args.packets)
+    clock = time.perf_counter
+
+    def run(paced=True):
+        sniffer = PacketSniffer(resolver=traffic.resolver(), local=traffic.local_addresses())
+        sniffer.running = True
+        on_header = sniffer._on_header
+        samples = []
+        start = clock()
+        if args.rate and paced:
+            # Paced: feed 10 ms batches at the target rate and record how far behind we fall
+            batch = max(1, int(args.rate / 100))
+            max_lag = 0.0
+            for i in range(0, len(packets), batch):
+                due = start + i / args.rate
+                now = clock()
+                if now < due: time.sleep(due - now)
+                else: max_lag = max(max_lag, now - due)
+                for header in packets[i:i + batch]: on_header(*header)
+            results.add("sniffer_raw.max_lag_ms", max_lag * 1000, "ms", "lower")
+        else:
+            for i, header in enumerate(packets):
+                if i & 15:
+                    on_header(*header)
+                else:
+                    t = clock()
+                    on_header(*header)
+                    samples.append(clock() - t)
+        elapsed = clock() - start
+        sniffer.get_traffic_data()
+        return samples, elapsed
+
+    samples, elapsed = run()
+    _, peak = traced(lambda: run(paced=False))
+    results.add("sniffer_raw.packets_per_sec", len(packets) / elapsed, "pkt/s", "higher")
+    if samples: results.timings("sniffer_raw.per_packet", samples, "us", 1e6)
+    results.add("sniffer_raw.peak_mib", peak, "MiB", "lower")
+
+def bench_sniffer_scapy(traffic, results, args):
+    packets = traffic.scapy_packets(min(args.packets, 20000)) if "scapy" not in STUBBED else None
+    if not packets: return
+    sniffer = PacketSniffer(resolver=traffic.resolver(), local=traffic.local_addresses())
+    sniffer.running = True
+    on_packet = sniffer._on_packet
+    samples = []
+    start = time.perf_counter()
+    for pkt in packets:
+        t = time.perf_counter()
+        on_packet(pkt)
+        samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    results.add("sniffer_scapy.packets_per_sec", len(packets) / elapsed, "pkt/s", "higher")
+    results.timings("sniffer_scapy.per_packet", samples, "us", 1e6)
+
+def bench_sockdiag(traffic, results, args):
+    """Dump + diff cost of the capture-free backend with --sockets loopback connections open."""
+    import socket
+    from core.platform import IS_LINUX
+    from core.sock_diag import SockDiagSource, NETLINK_SOCK_DIAG
+    if not IS_LINUX or not args.sockets: return
+    try:
+        diag = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG)
+    except OSError:
+        return
+
+    count = args.sockets
+    try:
+        import resource
+        count = min(count, resource.getrlimit(resource.RLIMIT_NOFILE)[0] - 64)
+    except ImportError:
+        pass
+
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1024)
+    conns = []
+    try:
+        for _ in range(count // 2):
+            client = socket.create_connection(server.getsockname())
+            conns += [client, server.accept()[0]]
+        source = SockDiagSource(resolver=traffic.resolver())
+        source.poll(diag)
+        samples = []
+        for i in range(args.queries):
+            for conn in conns[::2]: conn.send(b"x" * 64)
+            t = time.perf_counter()
+            source.poll(diag)
+            samples.append(time.perf_counter() - t)
+            source.get_traffic_data()
+        results.add("sockdiag.sockets", source.tracked, "sockets", "higher")
+        results.timings("sockdiag.poll", samples)
+    finally:
+        for conn in conns: conn.close()
+        server.close()
+        diag.close()
+
+def bench_aggregator(traffic, results, args, workdir):
+    ticks = [traffic.flow_dict(active=args.active) for _ in range(args.ticks)]
+
+    def run(name):
+        db = DatabaseManager(os.path.join(workdir, name))
+        if args.idle_apps:
+            # Apps seen long ago: part of the totals, but with no traffic now
+            db.save_traffic({f"idle-{i}": [i, i] for i in range(args.idle_apps)})
+            db.flush()
+        # Logged out, as in a fresh session: logs still go to the outbox
+        aggregator = TrafficAggregator(db=db, cloud=CloudClient(outbox_path=os.path.join(workdir, name + ".outbox")))
+        samples = []
+        now = time.time()
+        for i, data in enumerate(ticks):
+            t = time.perf_counter()
+            aggregator.calculate_rates(data, now=now + i + 1)
+            samples.append(time.perf_counter() - t)
+        return aggregator, samples
+
+    aggregator, samples = run("aggregator.db")
+    (traced_aggregator, _), peak = traced(lambda: run("aggregator_traced.db"))
+    traced_aggregator.db.close()
+    results.timings("aggregator.tick", samples)
+    results.add("aggregator.peak_mib", peak, "MiB", "lower")
+
+    # One save per tick, as in the app: enqueue cost on the UI thread, then until committed
+    samples, committed = [], []
+    now = time.time() + len(ticks)
+    for i in range(20):
+        aggregator.calculate_rates(ticks[i % len(ticks)], now=now + i + 1)
+        t = time.perf_counter()
+        aggregator.save_data()
+        samples.append(time.perf_counter() - t)
+        aggregator.db.flush()
+        committed.append(time.perf_counter() - t)
+    results.timings("storage.save_traffic", samples)
+    results.timings("storage.save_traffic_committed", committed)
+    aggregator.db.close()
+
+def bench_sqlite_logging(traffic, results, args, workdir):
+    rows = traffic.log_rows(args.log_rows, per_second=args.active)
+    batch = args.active
+
+    def run(db):
+        start = time.perf_counter()
+        for i in range(0, len(rows), batch):
+            db.log_instances(rows[i:i + batch])
+        enqueued = time.perf_counter() - start
+        db.flush()
+        return enqueued, time.perf_counter() - start
+
+    traced_db = DatabaseManager(os.path.join(workdir, "logging_traced.db"), queue_size=len(rows) // batch + 1)
+    _, peak = traced(lambda: run(traced_db))
+    traced_db.close()
+    db = DatabaseManager(os.path.join(workdir, "logging.db"), queue_size=len(rows) // batch + 1)
+    enqueued, elapsed = run(db)
+    results.add("storage.log_rows_per_sec", len(rows) / elapsed, "rows/s", "higher")
+    # What the UI thread actually pays per tick now that commits are write-behind
+    results.add("storage.log_enqueue_us", enqueued / max(1, len(rows) // batch) * 1e6, "us", "lower")
+    results.add("storage.peak_mib", peak, "MiB", "lower")
+
+    # Log viewer queries on the table just written
+    for label, app_filter in (("latest", None), ("search", traffic.app_names[len(traffic.app_names) // 2][-3:])):
+        samples = []
+        for _ in range(args.queries):
+            t = time.perf_counter()
+            db.fetch_logs(limit=100, app_filter=app_filter)
+            samples.append(time.perf_counter() - t)
+        results.timings(f"log_viewer.{label}", samples)
+    db.close()
+
+def bench_maintenance(results, workdir):
+    """Caps the logging stage's database at half its live size, one upkeep step at a time."""
+    path = os.path.join(workdir, "logging.db")
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    while LogRollups().run(cursor): pass
+    conn.commit()
+    maintenance = Maintenance(max_bytes=None)
+    maintenance.step(cursor)  # measures the live size
+    maintenance.max_bytes = maintenance.stats["live_bytes"] // 2
+    samples = []
+    more = True
+    while more:
+        t = time.perf_counter()
+        more = maintenance.step(cursor)
+        samples.append(time.perf_counter() - t)
+        conn.commit()
+    conn.close()
+    results.timings("storage.maintenance_step", samples)
+    results.add("storage.maintenance_steps", len(samples), "steps", "lower")
+    results.add("storage.capped_db_mib", os.path.getsize(path) / 2**20, "MiB", "lower")
+
+def bench_pipeline(traffic, results, args, workdir):
+    """Frame intervals of a 60 fps main loop while ticks run on it (as update_ui used to)
+    and while they run on a TrafficPipeline thread, plus each mode's tick lateness."""
+    ticks = [traffic.flow_dict(active=args.active) for _ in range(16)]
+
+    class Source:
+        count = 0
+        def get_traffic_data(self):
+            self.count += 1
+            return ticks[self.count % len(ticks)]
+        def get_sampling_stats(self):
+            return {"rate": 1, "max_rate": 1, "error": 0.0}
+
+    frame, interval, duration = 1 / 60, 0.1, args.pipeline_seconds
+
+    def main_loop(on_frame):
+        # Half of each frame is Python-side drawing, the rest is slept out like Kivy's
+        # clock does; a frame that runs long is a visible stutter
+        frames = TimingStats(size=None)
+        start = last = time.perf_counter()
+        while last - start < duration:
+            on_frame(last)
+            while time.perf_counter() - last < frame / 2: pass
+            time.sleep(max(0.0, frame - (time.perf_counter() - last)))
+            now = time.perf_counter()
+            frames.add(now - last)
+            last = now
+        return frames
+
+    for mode in ("inline", "thread"):
+        aggregator = TrafficAggregator(db=DatabaseManager(os.path.join(workdir, f"pipeline_{mode}.db")),
+                                       cloud=CloudClient(outbox_path=os.path.join(workdir, f"pipeline_{mode}.outbox")))
+        pipeline = TrafficPipeline(Source(), aggregator, interval=interval, save_interval=5 * interval)
+        if mode == "inline":
+            jitter, due = pipeline.jitter, [time.perf_counter() + interval]
+            def on_frame(now):
+                if now < due[0]: return
+                jitter.add(now - due[0])
+                due[0] += interval
+                pipeline.tick()
+                if pipeline.ticks % 5 == 0: aggregator.save_data()
+            frames = main_loop(on_frame)
+        else:
+            pipeline.start()
+            frames = main_loop(lambda now: pipeline.latest())
+            pipeline.stop()
+        aggregator.db.close()
+        results.timings(f"pipeline.{mode}.ui_frame", list(frames.samples))
+        results.add(f"pipeline.{mode}.ui_frame.max_ms", frames.max * 1000, "ms", "lower")
+        results.timings(f"pipeline.{mode}.tick_jitter", list(pipeline.jitter.samples))
+
+def bench_graphs(results, args):
+    from ui.widgets import TrafficGraph, PingGraph
+    day = TrafficGraph()
+    day.set_window(86400)
+    for name, widget in (("traffic_graph", TrafficGraph()), ("ping_graph", PingGraph()),
+                         ("traffic_graph_24h", day)):
+        samples = []
+        for i in range(args.graph_updates):
+            t = time.perf_counter()
+            widget.update_graph(float(i % 500), float(i % 70))
+            samples.append(time.perf_counter() - t)
+        results.timings(f"ui.{name}.update", samples, "us", 1e6)
+
+# --- Reporting ---
+def compare(current, baseline, tolerance):
+    regressions = []
+    for name, metric in sorted(current.items()):
+        base = baseline.get(name)
+        if not base or not base["value"]: continue
+        change = (metric["value"] - base["value"]) / base["value"]
+        worse = change < -tolerance if metric["better"] == "higher" else change > tolerance
+        if worse: regressions.append((name, base["value"], metric["value"], change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flows", type=int, default=10000, help="distinct flows in the population")
+    parser.add_argument("--apps", type=int, default=50, help="distinct applications")
+    parser.add_argument("--packets", type=int, default=200000, help="packets through the sniffer callback")
+    parser.add_argument("--rate", type=float, help="pace the sniffer stage at this many packets/s")
+    parser.add_argument("--sockets", type=int, default=2000, help="open TCP sockets for the sockdiag stage (0 skips)")
+    parser.add_argument("--active", type=int, default=1000, help="flows with traffic per aggregator tick")
+    parser.add_argument("--ticks", type=int, default=30, help="aggregator ticks")
+    parser.add_argument("--idle-apps", type=int, default=5000, help="apps with stored totals but no current traffic")
+    parser.add_argument("--log-rows", type=int, default=200000, help="rows written to instance_logs")
+    parser.add_argument("--queries", type=int, default=20, help="log viewer queries per kind")
+    parser.add_argument("--pipeline-seconds", type=float, default=5.0, help="main loop run time per pipeline mode")
+    parser.add_argument("--graph-updates", type=int, default=3600, help="graph updates per widget")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    traffic = SyntheticTraffic(flows=args.flows, apps=args.apps, seed=args.seed)
+    results = Results()
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_sniffer_raw(traffic, results, args)
+        bench_sniffer_scapy(traffic, results, args)
+        bench_sockdiag(traffic, results, args)
+        bench_aggregator(traffic, results, args, workdir)
+        bench_sqlite_logging(traffic, results, args, workdir)
+        bench_maintenance(results, workdir)
+        bench_pipeline(traffic, results, args, workdir)
+        bench_graphs(results, args)
+
+    try:
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        results.add("process.max_rss_mib", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, "MiB", "lower")
+    except ImportError:
+        pass
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stubbed": STUBBED,
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "metrics": results.metrics,
+    }
+
+    for name, metric in results.metrics.items():
+        print(f"{name:<40}{metric['value']:>16,.3f} {metric['unit']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(results.metrics, baseline, args.tolerance)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: {before:,.3f} -> {after:,.3f} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
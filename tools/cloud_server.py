@@ -0,0 +1,143 @@
+"""Local stand-in for the cloud dashboard API, for testing and benchmarking CloudClient.
+
+Serves POST /api/login (any credentials) and POST /api/sync over HTTP/1.1 keep-alive.
+Sync bodies may be gzipped and either columnar (CloudClient) or the older row list.
+Columnar rows are de-duplicated by (client, seq): rows below the next sequence number
+expected from that client are counted as duplicates and not stored again.
+--latency delays every sync, --fail-rate fails that fraction of them with a 503,
+--lost-ack-rate stores that fraction but still answers 503, as if the reply was lost,
+and --max-rows answers 413 to any batch with more rows than that.
+
+    python -m tools.cloud_server [--port 5000] [--latency 0.05] [--fail-rate 0.1] [--lost-ack-rate 0.1]
+                                 [--max-rows 500]
+"""
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.cloud_client import LOG_COLUMNS
+
+TOKEN = "stand-in-token"
+
+def decode_batch(body, encoding=None):
+    """Sync body -> (payload, rows), rows as (timestamp, app, down, up, src, dst)
+    tuples whichever format the body used."""
+    if encoding == "gzip": body = gzip.decompress(body)
+    payload = json.loads(body)
+    logs = payload.get("logs", [])
+    if payload.get("format") == "columnar":
+        apps = payload["apps"]
+        columns = [logs[name] for name in LOG_COLUMNS]
+        rows = [(ts, apps[app], down, up, src, dst) for ts, app, down, up, src, dst in zip(*columns)]
+    else:
+        rows = [tuple(row) for row in logs]
+    return payload, rows
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, fail_rate=0.0, lost_ack_rate=0.0, commands=None, max_rows=None,
+                 keep_rows=False):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.lost_ack_rate = lost_ack_rate
+        self.max_rows = max_rows
+        self.rows = [] if keep_rows else None   # every stored row, in order, for tests
+        self.commands = list(commands or [])   # handed out once, with the next sync
+        self.lock = threading.Lock()
+        self.stats = {"syncs": 0, "rows": 0, "duplicates": 0, "gaps": 0, "failed": 0, "too_large": 0, "bytes": 0,
+                      "connections": 0}
+        self.next_seq = {}   # client -> sequence number of the next new row
+        self.status = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock: self.server.stats["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/api/login":
+            return self._reply(200, {"access_token": TOKEN})
+        if self.path != "/api/sync":
+            return self._reply(404, {"error": "not found"})
+        if self.headers.get("Authorization") != f"Bearer {TOKEN}":
+            return self._reply(401, {"error": "bad token"})
+        if server.latency: time.sleep(server.latency)
+        if random.random() < server.fail_rate:
+            with server.lock: server.stats["failed"] += 1
+            return self._reply(503, {"error": "unavailable"})
+
+        payload, logs = decode_batch(body, self.headers.get("Content-Encoding"))
+        if server.max_rows is not None and len(logs) > server.max_rows:
+            with server.lock: server.stats["too_large"] += 1
+            return self._reply(413, {"error": "batch too large"})
+        with server.lock:
+            client, seq = payload.get("client"), payload.get("seq")
+            if client is not None and seq is not None and logs:
+                expected = server.next_seq.get(client, seq)
+                repeated = min(len(logs), max(0, expected - seq))
+                server.stats["duplicates"] += repeated
+                server.stats["gaps"] += max(0, seq - expected)   # rows the client dropped
+                server.next_seq[client] = max(expected, seq + len(logs))
+                logs = logs[repeated:]
+            server.stats["syncs"] += 1
+            server.stats["rows"] += len(logs)
+            if server.rows is not None: server.rows.extend(logs)
+            server.stats["bytes"] += int(self.headers.get("Content-Length", 0))
+            server.status = payload.get("status", [])
+            if random.random() < server.lost_ack_rate:
+                server.stats["failed"] += 1
+                return self._reply(503, {"error": "reply lost"})
+            commands, server.commands = server.commands, []
+        self._reply(200, {"commands": commands})
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every sync")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of syncs answered with 503")
+    parser.add_argument("--lost-ack-rate", type=float, default=0.0, help="fraction of syncs stored but answered with 503")
+    parser.add_argument("--max-rows", type=int, default=None, help="answer 413 to batches with more rows")
+    args = parser.parse_args()
+    server = StandInServer(args.port, args.latency, args.fail_rate, args.lost_ack_rate, max_rows=args.max_rows)
+    print(f"Stand-in cloud API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(server.stats)
+
+if __name__ == "__main__":
+    main()
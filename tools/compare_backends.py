@@ -0,0 +1,92 @@
+"""Differential check of the raw header parser against the scapy path.
+
+Feeds every frame of one or more pcap files through both PacketSniffer callbacks
+(scapy dissection -> _on_packet, struct parser -> _on_header) and compares the
+resulting (app, src, dst) -> (down, up) records. Also reports packets/sec of each.
+
+    python -m tools.compare_backends capture.pcap [more.pcap ...] [--ports ports.json]
+"""
+import argparse
+import sys
+import time
+
+from scapy.all import Ether, IP, RawPcapReader
+from core.packet_sniffer import PacketSniffer
+from core.raw_capture import parse_frame, parse_ipv4
+from core.replay import StaticPortMap
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+
+class EphemeralResolver:
+    """Without a port map, pretend ephemeral ports belong to local clients."""
+    def get_name(self, port):
+        return f"ephemeral:{port}" if port >= 32768 else "Unknown"
+
+def load_frames(path):
+    reader = RawPcapReader(path)
+    linktype = reader.linktype
+    frames = [data for data, _ in reader]
+    reader.close()
+    return linktype, frames
+
+def run_scapy(frames, linktype, resolver):
+    sniffer = PacketSniffer(resolver=resolver)
+    sniffer.running = True
+    layer = Ether if linktype == LINKTYPE_ETHERNET else IP
+    start = time.perf_counter()
+    for data in frames:
+        sniffer._on_packet(layer(data))
+    return sniffer.get_traffic_data(), time.perf_counter() - start
+
+def run_raw(frames, linktype, resolver):
+    sniffer = PacketSniffer(resolver=resolver)
+    sniffer.running = True
+    parse = parse_frame if linktype == LINKTYPE_ETHERNET else parse_ipv4
+    on_header = sniffer._on_header
+    start = time.perf_counter()
+    for data in frames:
+        n = len(data)
+        header = parse(data, 0, n, n)
+        if header is not None: on_header(*header)
+    return sniffer.get_traffic_data(), time.perf_counter() - start
+
+def compare(path, resolver):
+    linktype, frames = load_frames(path)
+    if linktype not in (LINKTYPE_ETHERNET, LINKTYPE_RAW):
+        print(f"{path}: unsupported linktype {linktype}, skipped")
+        return True
+
+    expected, scapy_secs = run_scapy(frames, linktype, resolver)
+    actual, raw_secs = run_raw(frames, linktype, resolver)
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key) != actual.get(key):
+            mismatches.append((key, expected.get(key), actual.get(key)))
+
+    count = len(frames)
+    scapy_pps = count / scapy_secs if scapy_secs else 0
+    raw_pps = count / raw_secs if raw_secs else 0
+    speedup = raw_pps / scapy_pps if scapy_pps else 0
+    print(f"{path}: {count} frames, {len(expected)} flows")
+    print(f"  scapy: {scapy_pps:,.0f} pkt/s   raw: {raw_pps:,.0f} pkt/s   ({speedup:.1f}x)")
+    for key, want, got in mismatches[:20]:
+        print(f"  MISMATCH {key}: scapy={want} raw={got}")
+    if mismatches:
+        print(f"  {len(mismatches)} mismatching flows")
+    return not mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pcaps", nargs="+")
+    parser.add_argument("--ports", help="JSON object mapping local port -> app name")
+    args = parser.parse_args()
+
+    resolver = StaticPortMap.from_file(args.ports) if args.ports else EphemeralResolver()
+
+    ok = all([compare(path, resolver) for path in args.pcaps])
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Replays pcap/pcapng files through the capture -> aggregate -> SQLite pipeline.
+
+No root or live interface is needed. Without --speed the replay runs as fast as
+possible; with --speed N it honors the original packet timestamps, N times faster.
+
+    python -m tools.replay capture.pcapng --ports ports.json --local 10.0.0.5/32 --db replay.db [--speed 1] [--mmap]
+                           [--archive replay_archive]
+"""
+import argparse
+from core.aggregator import TrafficAggregator
+from core.cloud_client import CloudClient
+from core.archive import open_archive
+from core.database import DatabaseManager
+from core.replay import ReplaySource, StaticPortMap
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pcaps", nargs="+")
+    parser.add_argument("--ports", help="JSON object mapping local port -> app name")
+    parser.add_argument("--local", action="append", default=[],
+                        help="address/prefix of the capturing host (repeatable), for traffic direction")
+    parser.add_argument("--db", default="replay_history.db", help="SQLite file to log into")
+    parser.add_argument("--speed", type=float, help="real-time multiplier (omit for max speed)")
+    parser.add_argument("--tick", type=float, default=1.0, help="aggregation interval in capture seconds")
+    parser.add_argument("--mmap", action="store_true", help="memory-map the capture files")
+    parser.add_argument("--archive", help="also write the columnar archive (core.archive) into this directory")
+    args = parser.parse_args()
+
+    resolver = StaticPortMap.from_file(args.ports) if args.ports else StaticPortMap()
+    aggregator = TrafficAggregator(db=DatabaseManager(args.db, block_when_full=True),
+                                   archive=open_archive(args.archive) if args.archive else None,
+                                   cloud=CloudClient(outbox_path=None))  # replayed logs are never uploaded
+    source = ReplaySource(args.pcaps, aggregator, resolver=resolver, local_prefixes=args.local, speed=args.speed,
+                          tick=args.tick, use_mmap=args.mmap)
+    try:
+        stats = source.run()
+    except KeyboardInterrupt:
+        source.stop()
+        stats = source.stats
+    finally:
+        aggregator.db.close()
+
+    seconds = stats.get("seconds") or 0
+    pps = stats["packets"] / seconds if seconds else 0
+    print(f"{stats['packets']:,} packets ({stats['ignored']:,} non-IPv4 ignored), "
+          f"{stats['ticks']:,} ticks, {stats['log_rows']:,} log rows")
+    if seconds:
+        print(f"{seconds:.2f} s wall, {pps:,.0f} packets/s")
+
+if __name__ == "__main__":
+    main()
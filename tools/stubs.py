@@ -0,0 +1,124 @@
+"""Minimal stand-ins so benchmarks run headless on hosts without Kivy, scapy or psutil.
+
+Only modules that fail to import are replaced (Kivy is always replaced, so no window
+is ever opened). The stubs do no work: timings measure this project's own code.
+"""
+import collections
+import importlib
+import sys
+import types
+
+def _module(name, **attrs):
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    sys.modules[name] = mod
+    return mod
+
+class _Canvas:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+    @property
+    def before(self): return self
+
+class _Widget:
+    def __init__(self, **kwargs):
+        self.children = []
+        self.parent = None
+        self.canvas = _Canvas()
+        self.width = self.height = 100
+        self.x = self.y = 0
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def add_widget(self, widget, *args):
+        self.children.append(widget)
+        widget.parent = self
+
+    def remove_widget(self, widget):
+        if widget in self.children: self.children.remove(widget)
+        widget.parent = None
+
+    def clear_widgets(self, *args):
+        for widget in self.children: widget.parent = None
+        self.children = []
+
+    def bind(self, **kwargs): pass
+    def setter(self, name): return lambda obj, value: setattr(self, name, value)
+    def open(self, *args): pass
+    def dismiss(self, *args): pass
+    def collide_point(self, *args): return False
+    def get_root_window(self): return None
+
+class _Plot:
+    def __init__(self, **kwargs):
+        self.points = []
+        self.__dict__.update(kwargs)
+
+class _Graph(_Widget):
+    def add_plot(self, plot): self.children.append(plot)
+
+def _psutil():
+    addrs = collections.namedtuple("snicaddr", "family address netmask broadcast ptp")
+    io = collections.namedtuple("snetio", "bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout")
+    class NoSuchProcess(Exception): pass
+    class Process:
+        def __init__(self, pid): raise NoSuchProcess(pid)
+    return dict(
+        net_connections=lambda kind="inet": [],
+        net_io_counters=lambda pernic=False: {} if pernic else io(0, 0, 0, 0, 0, 0, 0, 0),
+        net_if_addrs=lambda: {},
+        process_iter=lambda attrs=None: iter(()),
+        Process=Process, NoSuchProcess=NoSuchProcess, snicaddr=addrs,
+    )
+
+def _scapy():
+    class _Layer: pass
+    class _Conf:
+        iface = "stub0"
+        use_pcap = False
+    def sniff(**kwargs): raise RuntimeError("scapy is not installed")
+    return dict(sniff=sniff, conf=_Conf(), network_name=str,
+                IP=type("IP", (_Layer,), {}), TCP=type("TCP", (_Layer,), {}), UDP=type("UDP", (_Layer,), {}))
+
+def _missing(name):
+    try:
+        importlib.import_module(name)
+        return False
+    except ImportError:
+        return True
+
+def install(kivy=True):
+    """Installs stubs; returns the names of the modules that were replaced."""
+    replaced = []
+    if _missing("psutil"):
+        _module("psutil", **_psutil())
+        replaced.append("psutil")
+    if _missing("scapy.all"):
+        _module("scapy")
+        _module("scapy.all", **_scapy())
+        replaced.append("scapy")
+    if _missing("requests"):
+        def post(*args, **kwargs): raise ConnectionError("requests is not installed")
+        _module("requests", post=post, Session=lambda: types.SimpleNamespace(post=post, close=lambda: None))
+        replaced.append("requests")
+    if kivy:
+        widget_names = ("boxlayout.BoxLayout", "label.Label", "dropdown.DropDown", "button.Button",
+                        "modalview.ModalView", "scrollview.ScrollView", "textinput.TextInput",
+                        "spinner.Spinner")
+        _module("kivy")
+        _module("kivy.uix")
+        for spec in widget_names:
+            mod, cls = spec.split(".")
+            _module(f"kivy.uix.{mod}", **{cls: type(cls, (_Widget,), {})})
+        _module("kivy.metrics", dp=lambda v: v, sp=lambda v: v)
+        _module("kivy.graphics", Color=lambda *a, **k: None, Rectangle=_Plot)
+        _module("kivy.core")
+        _module("kivy.core.window", Window=_Widget())
+        _module("kivy.clock", Clock=types.SimpleNamespace(schedule_once=lambda *a, **k: None,
+                                                          schedule_interval=lambda *a, **k: None,
+                                                          create_trigger=lambda *a, **k: lambda *a: None))
+        _module("kivy_garden")
+        _module("kivy_garden.graph", Graph=_Graph, LinePlot=_Plot)
+        replaced.append("kivy")
+    return replaced
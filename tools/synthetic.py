@@ -0,0 +1,117 @@
+"""Synthetic traffic for benchmarks: flows, packets, per-tick flow dicts and log rows."""
+import random
+
+from core.flow_table import int_to_ip
+from core.local_addrs import LocalAddresses
+
+LOCAL_NET = 0x0A000000   # 10.0.0.0/8 is "this host" side
+REMOTE_NET = 0x5D000000  # 93.0.0.0/8 is the internet
+
+class SyntheticTraffic:
+    """A reproducible population of flows spread over `apps` applications.
+
+    Each app owns a few local ports (exposed through `resolver`, a StaticPortMap-like
+    get_name()), and packet popularity across flows is Zipf-like, as in real captures.
+    """
+    def __init__(self, flows=10000, apps=50, seed=1, zipf=1.1):
+        self.rng = random.Random(seed)
+        self.app_names = [f"app-{i:03d}" for i in range(apps)]
+        self.ports = {}
+        self.flows = []
+        for i in range(flows):
+            local_port = 20000 + (i % (apps * 4))
+            app = self.ports[local_port] = self.app_names[local_port % apps]
+            local = LOCAL_NET | self.rng.getrandbits(8)
+            remote = REMOTE_NET | self.rng.getrandbits(24)
+            remote_port = self.rng.choice((443, 80, 53, 8080))
+            proto = 17 if remote_port == 53 else 6
+            self.flows.append((app, local, remote, proto, local_port, remote_port))
+        # Cumulative Zipf weights for packet sampling
+        weights = [1.0 / (rank + 1) ** zipf for rank in range(flows)]
+        total = sum(weights)
+        acc = 0.0
+        self.cumulative = []
+        for w in weights:
+            acc += w / total
+            self.cumulative.append(acc)
+
+    def resolver(self):
+        ports = self.ports
+        class _Resolver:
+            def get_name(self, port):
+                return ports.get(port, "Unknown")
+        return _Resolver()
+
+    def local_addresses(self):
+        return LocalAddresses(["10.0.0.0/8"], live=False)
+
+    def packets(self, count):
+        """Header tuples (src, dst, proto, sport, dport, size) as the raw parser returns them."""
+        rng = self.rng
+        flows = self.flows
+        picks = rng.choices(range(len(flows)), cum_weights=self.cumulative, k=count)
+        out = []
+        for idx in picks:
+            _, local, remote, proto, local_port, remote_port = flows[idx]
+            size = rng.choice((66, 66, 590, 1514))
+            if rng.random() < 0.6:
+                out.append((remote, local, proto, remote_port, local_port, size))  # inbound
+            else:
+                out.append((local, remote, proto, local_port, remote_port, size))  # outbound
+        return out
+
+    def scapy_packets(self, count, fragment_every=0):
+        """Dissected scapy packets (as sniff() hands them to _on_packet); None without scapy.
+
+        With fragment_every=N, every Nth packet is instead a 3000-byte UDP datagram on
+        the same flow, sent as IP fragments: only the first one carries the ports.
+        """
+        try:
+            from scapy.all import Ether, IP, TCP, UDP, Raw, fragment
+        except ImportError:
+            return None
+        out = []
+        for n, (src, dst, proto, sport, dport, size) in enumerate(self.packets(count)):
+            if fragment_every and n % fragment_every == fragment_every - 1:
+                datagram = IP(src=int_to_ip(src), dst=int_to_ip(dst), id=n & 0xFFFF) / \
+                           UDP(sport=sport, dport=dport) / Raw(b"\0" * 2972)
+                out.extend(Ether(bytes(Ether() / piece)) for piece in fragment(datagram, fragsize=1480))
+                continue
+            l4 = TCP(sport=sport, dport=dport) if proto == 6 else UDP(sport=sport, dport=dport)
+            pkt = Ether() / IP(src=int_to_ip(src), dst=int_to_ip(dst)) / l4
+            pkt = pkt / Raw(b"\0" * max(0, size - len(pkt)))
+            out.append(Ether(bytes(pkt)))
+        return out
+
+    def write_pcap(self, path, count, fragment_every=0, start_ts=1.7e9):
+        """Writes scapy_packets() to a pcap file, one millisecond apart."""
+        from scapy.all import wrpcap
+        packets = self.scapy_packets(count, fragment_every)
+        for n, pkt in enumerate(packets):
+            pkt.time = start_ts + n / 1000
+        wrpcap(path, packets)
+        return len(packets)
+
+    def flow_dict(self, active=None):
+        """One tick of PacketSniffer.get_traffic_data() output for `active` flows."""
+        rng = self.rng
+        flows = self.flows if active is None else rng.sample(self.flows, min(active, len(self.flows)))
+        data = {}
+        for app, local, remote, _, _, _ in flows:
+            if rng.random() < 0.6:
+                data[(app, int_to_ip(remote), int_to_ip(local))] = [rng.randint(64, 200000), 0]
+            else:
+                data[(app, int_to_ip(local), int_to_ip(remote))] = [0, rng.randint(64, 50000)]
+        return data
+
+    def log_rows(self, count, start_ts=1.7e9, per_second=None):
+        """instance_logs rows (ts, app, down_kbps, up_kbps, src, dst), `per_second` rows per tick."""
+        rng = self.rng
+        per_second = per_second or len(self.flows)
+        rows = []
+        for i in range(count):
+            app, local, remote, _, _, _ = self.flows[i % len(self.flows)]
+            ts = start_ts + i // per_second
+            rows.append((ts, app, rng.random() * 500, rng.random() * 50,
+                         int_to_ip(remote), int_to_ip(local)))
+        return rows
@@ -0,0 +1,39 @@
+"""Switches a traffic database created before incremental vacuum over to it, offline.
+
+Maintenance only returns free pages to the filesystem where auto_vacuum is
+INCREMENTAL. New files get that when they are created; older ones need one full
+VACUUM, which rewrites the whole file and can take minutes on a large one. Run
+this with the app closed.
+
+    python -m tools.vacuum_db [traffic_history.db]
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from core.schema import enable_incremental_vacuum
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db", nargs="?", default="traffic_history.db")
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f"no such database: {args.db}")
+
+    before = os.path.getsize(args.db)
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        started = time.monotonic()
+        if not enable_incremental_vacuum(conn):
+            print(f"{args.db} already uses incremental vacuum")
+            return
+        elapsed = time.monotonic() - started
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    print(f"Enabled incremental vacuum on {args.db} in {elapsed:.1f} s: "
+          f"{before / 1e6:.1f} MB -> {os.path.getsize(args.db) / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import math
+from array import array
+from collections import deque
+
+NAN = float("nan")
+
+class RingSeries:
+    """The newest `capacity` samples of one graph line, decimated for drawing.
+
+    Samples go into an array used as a ring: it grows to `capacity` and then the
+    oldest sample is overwritten, so append() is O(1) however long the history. The
+    visible window is the newest `window` samples. It is cut into buckets of equal
+    sample count, aligned on the sample index so that a finished bucket never
+    changes. Each bucket keeps its min and max as samples arrive. points() draws a
+    bucket as its min and max in time order (one vertex if they are the same sample),
+    with at most max_points // 2 buckets overlapping the window. A line therefore
+    never gets more vertices than max_points (the widget's width in pixels), whether
+    the window is a minute or a day, and spikes survive the decimation. max() is the
+    window's maximum from a monotonic deque, amortized O(1) per sample.
+
+    None marks a gap (a lost probe). It takes a slot in the window but no vertex.
+    """
+    def __init__(self, capacity, window=None, max_points=800):
+        self.capacity = capacity
+        self.values = array("d")
+        self.count = 0          # samples ever appended; the newest has index count - 1
+        self.configure(window or capacity, max_points)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def configure(self, window=None, max_points=None):
+        """Changes the window (in samples) or the vertex budget and rebuilds the buckets
+        from the samples held, O(window) once."""
+        if window is not None: self.window = max(1, min(window, self.capacity))
+        if max_points is not None: self.max_points = max(4, int(max_points))
+        # An unaligned window overlaps one bucket more than it spans
+        self.per_bucket = max(1, math.ceil(self.window / (self.max_points // 2 - 1)))
+        # (i, value) vertices of finished buckets, oldest first; enough for the whole window
+        self.vertices = deque(maxlen=2 * (self.window // self.per_bucket + 1))
+        self.current = None     # the bucket being filled: [min i, min, max i, max]
+        self.current_id = None
+        self.maxima = deque()   # (i, value) with values decreasing: the window max is first
+        for i in range(max(0, self.count - self.window), self.count):
+            self._add(i, self.values[i % self.capacity])
+
+    def append(self, value):
+        value = NAN if value is None else float(value)
+        i = self.count
+        if len(self.values) < self.capacity: self.values.append(value)
+        else: self.values[i % self.capacity] = value
+        self.count += 1
+        self._add(i, value)
+
+    def clear(self):
+        self.values = array("d")
+        self.count = 0
+        self.configure()
+
+    def max(self, default=0.0):
+        """Largest sample in the window, or `default` if it holds none."""
+        return self.maxima[0][1] if self.maxima else default
+
+    def points(self, x_scale=1.0):
+        """At most max_points (x, y) vertices of the window, oldest first. x is the
+        sample's age in samples times x_scale, so the newest sample is at x = 0."""
+        first = self.count - self.window
+        newest = self.count - 1
+        points = [((i - newest) * x_scale, value) for i, value in self.vertices if i >= first]
+        if self.current is not None:
+            points.extend(((i - newest) * x_scale, value) for i, value in self._vertices(self.current))
+        return points
+
+    def _add(self, i, value):
+        bucket_id = i // self.per_bucket
+        if bucket_id != self.current_id:
+            if self.current is not None: self.vertices.extend(self._vertices(self.current))
+            self.current, self.current_id = None, bucket_id
+        while self.maxima and self.maxima[0][0] <= i - self.window:
+            self.maxima.popleft()
+        if value != value: return   # NaN: a gap
+        if self.current is None:
+            self.current = [i, value, i, value]
+        elif value < self.current[1]:
+            self.current[0], self.current[1] = i, value
+        elif value > self.current[3]:
+            self.current[2], self.current[3] = i, value
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((i, value))
+
+    @staticmethod
+    def _vertices(bucket):
+        """A bucket's min and max as (i, value) in time order, one vertex if they coincide."""
+        min_i, min_v, max_i, max_v = bucket
+        if min_i == max_i: return ((min_i, min_v),)
+        if min_i < max_i: return ((min_i, min_v), (max_i, max_v))
+        return ((max_i, max_v), (min_i, min_v))
@@ -5,17 +5,22 @@ from kivy.uix.button import Button
 from kivy.uix.modalview import ModalView
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.textinput import TextInput
+from kivy.uix.spinner import Spinner
 from kivy.metrics import dp
 from kivy.graphics import Color, Rectangle
 from kivy.core.window import Window
 from kivy_garden.graph import Graph, LinePlot 
+from kivy.clock import Clock
+from core.config import TICK_INTERVAL
+from core.export import LogExporter
+from core.flow_table import OTHER
+from ui.series import RingSeries
 import psutil
 import math
 import subprocess
 import os
 import platform
 import datetime
-import csv
 import time
 
 # --- COLOR CONSTANTS ---
@@ -27,6 +32,33 @@ COLOR_TEXT = [1, 1, 1, 1]       # White
 COLOR_PING_CF = [1, 0.5, 0, 1]  # Orange (Cloudflare)
 COLOR_PING_G  = [1, 1, 0, 1]    # Yellow (Google)
 
+# History ranges offered by the log viewer and app graphs: label -> seconds
+HISTORY_RANGES = {
+    "Last hour": 3600,
+    "Last 24 hours": 86400,
+    "Last 7 days": 7 * 86400,
+    "Last 30 days": 30 * 86400,
+    "Last year": 365 * 86400,
+}
+
+# Windows offered by the live graphs: label -> seconds. The longest sets how many
+# ticks each line keeps (a day of 1 s ticks is 86,400 samples, 0.7 MB per line).
+GRAPH_WINDOWS = {
+    "1 min": 60,
+    "5 min": 300,
+    "15 min": 900,
+    "1 hour": 3600,
+    "6 hours": 6 * 3600,
+    "24 hours": 86400,
+}
+
+def time_unit(seconds):
+    """(seconds per unit, unit name) for a time axis spanning `seconds`."""
+    if seconds <= 300: return 1, "Seconds"
+    if seconds <= 3 * 3600: return 60, "Minutes"
+    if seconds <= 3 * 86400: return 3600, "Hours"
+    return 86400, "Days"
+
 # =========================
 #   CUSTOM HOVER BUTTON
 # =========================
@@ -106,93 +138,114 @@ class LoginPopup(ModalView):
 # =========================
 #   1. TRAFFIC GRAPH
 # =========================
-class TrafficGraph(BoxLayout):
-    def __init__(self, **kwargs):
+class LiveGraph(BoxLayout):
+    """A Graph of live lines, one RingSeries per LinePlot, newest tick at x = 0.
+
+    Each tick appends one sample per line in O(1). Redrawing hands every plot at
+    most as many vertices as the graph is wide in pixels (see RingSeries), so the
+    cost per frame is the same for a 1 minute window as for 24 hours.
+    """
+    ylabel = 'Value'
+    y_step = 100        # ymax rounds up to a multiple of this
+    y_ticks = 4
+
+    def __init__(self, colors, window=60, interval=TICK_INTERVAL, **kwargs):
         super().__init__(**kwargs)
         self.orientation = 'vertical'
+        self.interval = interval
         self.graph = Graph(
-            xlabel='Time (Seconds)', ylabel='Speed (KB/s)',
-            x_ticks_minor=0, x_ticks_major=10, y_ticks_major=100,
+            xlabel='Time (Seconds ago)', ylabel=self.ylabel,
+            x_ticks_minor=0, x_ticks_major=10, y_ticks_major=self.y_step,
             y_grid_label=True, x_grid_label=True, padding=5,
-            x_grid=True, y_grid=True, xmin=0, xmax=60, ymin=0, ymax=100,
+            x_grid=True, y_grid=True, xmin=-window, xmax=0, ymin=0, ymax=self.y_step,
             label_options={'color': [1, 1, 1, 1], 'bold': True}
         )
-        self.plot_down = LinePlot(color=COLOR_DOWN, line_width=2)
-        self.plot_up = LinePlot(color=COLOR_UP, line_width=2)
-        self.graph.add_plot(self.plot_down)
-        self.graph.add_plot(self.plot_up)
+        capacity = int(max(GRAPH_WINDOWS.values()) / interval)
+        self.series = [RingSeries(capacity) for _ in colors]
+        self.plots = [LinePlot(color=color, line_width=2) for color in colors]
+        for plot in self.plots: self.graph.add_plot(plot)
         self.add_widget(self.graph)
-        self.points_down = []
-        self.points_up = []
+        self.live = True
+        self.set_window(window)
+        # Re-bucketing replays the window, so do it once after a resize settles
+        self._resized = Clock.create_trigger(self._fit_width, 0.2)
+        self.graph.bind(width=lambda *_: self._resized())
+
+    def set_window(self, seconds):
+        self.window = seconds
+        for series in self.series:
+            series.configure(window=max(1, int(seconds / self.interval)))
+        if self.live: self.show_live()
+
+    def add_samples(self, *values):
+        for series, value in zip(self.series, values):
+            series.append(value)
+        if self.live: self.draw()
+
+    def draw(self):
+        unit, _ = time_unit(self.window)
+        max_v = max(series.max() for series in self.series)
+        target_ymax = max(100, math.ceil(max_v / self.y_step) * self.y_step)
+        self.graph.ymax = int(target_ymax)
+        self.graph.y_ticks_major = int(target_ymax / self.y_ticks)
+        for plot, series in zip(self.plots, self.series):
+            plot.points = series.points(self.interval / unit)
+
+    def show_live(self):
+        self.live = True
+        unit, unit_name = time_unit(self.window)
+        self.graph.xlabel = f"Time ({unit_name} ago)"
+        self.graph.xmin = -int(math.ceil(self.window / unit))
+        self.graph.xmax = 0
+        self.graph.x_ticks_major = max(1, -self.graph.xmin // 6)
+        self.draw()
+
+    def _fit_width(self, *args):
+        for series in self.series:
+            series.configure(max_points=self.graph.width)
+        if self.live: self.draw()
+
+class TrafficGraph(LiveGraph):
+    ylabel = 'Speed (KB/s)'
+
+    def __init__(self, **kwargs):
+        super().__init__([COLOR_DOWN, COLOR_UP], **kwargs)
 
     def update_graph(self, down_val, up_val):
-        current_x = len(self.points_down)
-        self.points_down.append((current_x, down_val))
-        self.points_up.append((current_x, up_val))
-
-        if len(self.points_down) > 60:
-            self.points_down.pop(0)
-            self.points_up.pop(0)
-            self.points_down = [(x - 1, y) for x, y in self.points_down]
-            self.points_up = [(x - 1, y) for x, y in self.points_up]
-
-        max_v = max(
-            max([y for x, y in self.points_down] or [0]), 
-            max([y for x, y in self.points_up] or [0])
-        )
+        self.add_samples(down_val, up_val)
+
+    def show_history(self, series, seconds):
+        """Plots (bucket, down, up, ...) rows from the DB over the last `seconds`."""
+        self.live = False
+        unit, unit_name = time_unit(seconds)
+        now = time.time()
+        points_down = [((bucket - now) / unit, down) for bucket, down, up, *_ in series]
+        points_up = [((bucket - now) / unit, up) for bucket, down, up, *_ in series]
+        self.graph.xlabel = f"Time ({unit_name} ago)"
+        self.graph.xmin = -int(math.ceil(seconds / unit))
+        self.graph.xmax = 0
+        self.graph.x_ticks_major = max(1, -self.graph.xmin // 6)
+        max_v = max([y for x, y in points_down + points_up] or [0])
         target_ymax = max(100, math.ceil(max_v / 100) * 100)
         self.graph.ymax = int(target_ymax)
         self.graph.y_ticks_major = int(target_ymax / 4)
-        self.plot_down.points = self.points_down
-        self.plot_up.points = self.points_up
+        self.plots[0].points = points_down
+        self.plots[1].points = points_up
 
 # =========================
 #   2. PING GRAPH
 # =========================
-class PingGraph(BoxLayout):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.orientation = 'vertical'
-        self.graph = Graph(
-            xlabel='Time (Seconds)', ylabel='Latency (ms)',
-            x_ticks_minor=0, x_ticks_major=10, y_ticks_major=20,
-            y_grid_label=True, x_grid_label=True, padding=5,
-            x_grid=True, y_grid=True, xmin=0, xmax=60, ymin=0, ymax=200, 
-            label_options={'color': [1, 1, 1, 1], 'bold': True}
-        )
-        
-        self.plot_cf = LinePlot(color=COLOR_PING_CF, line_width=2)
-        self.plot_g  = LinePlot(color=COLOR_PING_G, line_width=2)
+class PingGraph(LiveGraph):
+    ylabel = 'Latency (ms)'
+    y_step = 50
+    y_ticks = 5
 
-        self.graph.add_plot(self.plot_cf)
-        self.graph.add_plot(self.plot_g)
-        
-        self.add_widget(self.graph)
-        self.points_cf = []
-        self.points_g = []
+    def __init__(self, **kwargs):
+        super().__init__([COLOR_PING_CF, COLOR_PING_G], **kwargs)
 
     def update_graph(self, ping_cf, ping_g):
-        current_x = len(self.points_cf)
-        
-        self.points_cf.append((current_x, ping_cf))
-        self.points_g.append((current_x, ping_g))
-
-        if len(self.points_cf) > 60:
-            self.points_cf.pop(0)
-            self.points_g.pop(0)
-            self.points_cf = [(x - 1, y) for x, y in self.points_cf]
-            self.points_g = [(x - 1, y) for x, y in self.points_g]
-
-        max_v = max(
-            max([y for x, y in self.points_cf] or [0]), 
-            max([y for x, y in self.points_g] or [0])
-        )
-        target_ymax = max(100, math.ceil(max_v / 50) * 50)
-        self.graph.ymax = int(target_ymax)
-        self.graph.y_ticks_major = int(target_ymax / 5)
-
-        self.plot_cf.points = self.points_cf
-        self.plot_g.points = self.points_g
+        """Adds one sample per server. None (a lost probe) adds no point instead of a 0 ms one."""
+        self.add_samples(ping_cf, ping_g)
 
 # =========================
 #   3. GRAPH POPUP
@@ -203,8 +256,12 @@ class AppGraphPopup(ModalView):
         self.size_hint = (0.9, 0.7)
         self.auto_dismiss = True
         layout = BoxLayout(orientation='vertical', padding=10)
+        self.app_name = app_name
         header = BoxLayout(size_hint_y=None, height=dp(30))
         header.add_widget(Label(text=f"Traffic: {app_name}", bold=True, font_size='18sp'))
+        self.range_spinner = Spinner(text="Live", values=["Live"] + list(HISTORY_RANGES), size_hint_x=None, width=140)
+        self.range_spinner.bind(text=self.on_range)
+        header.add_widget(self.range_spinner)
         close_btn = Button(text="Close", size_hint_x=None, width=100)
         close_btn.bind(on_release=self.dismiss)
         header.add_widget(close_btn)
@@ -213,7 +270,16 @@ class AppGraphPopup(ModalView):
         layout.add_widget(self.graph_widget)
         self.add_widget(layout)
 
+    def on_range(self, instance, value):
+        if value not in HISTORY_RANGES:
+            self.graph_widget.show_live()
+            return
+        from kivy.app import App
+        _, series = App.get_running_app().aggregator.get_history(self.app_name, HISTORY_RANGES[value])
+        self.graph_widget.show_history(series, HISTORY_RANGES[value])
+
     def update(self, down, up):
+        # Keeps recording while a history range is shown; drawn again on "Live"
         self.graph_widget.update_graph(down, up)
 
 # =========================
@@ -249,13 +315,14 @@ class TableHeader(BoxLayout):
         self.add_widget(self.btn_up)
 
 class AppRow(BoxLayout):
-    def __init__(self, app_name, **kwargs):
+    def __init__(self, app_name, popups=None, **kwargs):
         super().__init__(**kwargs)
         self.app_name = app_name
         self.size_hint_y = None
         self.height = dp(40)
         self.padding = (dp(10), 0)
-        self.popup = None
+        # app -> AppGraphPopup, shared with the dashboard that feeds them every tick
+        self.popups = {} if popups is None else popups
         with self.canvas.before:
             Color(0.3, 0.3, 0.3, 1) 
             self.rect = Rectangle(size=(self.width, 1), pos=(self.x, self.y))
@@ -278,8 +345,6 @@ class AppRow(BoxLayout):
     def update_data(self, down, up):
         self.lbl_down.text = f"{down:.2f} KB/s"
         self.lbl_up.text = f"{up:.2f} KB/s"
-        if self.popup and self.popup.parent:
-            self.popup.update(down, up)
 
     def _create_dropdown(self):
         dropdown = DropDown(auto_width=False, width=dp(160))
@@ -298,8 +363,9 @@ class AppRow(BoxLayout):
         return super().on_touch_down(touch)
 
     def open_graph(self):
-        if not self.popup: self.popup = AppGraphPopup(self.app_name)
-        self.popup.open()
+        popup = self.popups.get(self.app_name)
+        if popup is None: popup = self.popups[self.app_name] = AppGraphPopup(self.app_name)
+        popup.open()
 
     def close_app(self):
         for proc in psutil.process_iter(["name"]):
@@ -325,29 +391,51 @@ class AppDashboard(BoxLayout):
         self.scroll_view.add_widget(self.rows_container)
         self.add_widget(self.scroll_view)
         self.rows = {}
+        self.rates = {}     # app -> (down, up) currently shown, for sorting
+        self.popups = {}    # app -> its detail graph, kept while its row exists or it is open
+        self.order = []
         self.header.update_icons(self.sort_key, self.sort_desc)
 
     def change_sort(self, key):
         if self.sort_key == key: self.sort_desc = not self.sort_desc
         else: self.sort_key = key; self.sort_desc = True
         self.header.update_icons(self.sort_key, self.sort_desc)
-
-    def update_apps(self, rates):
-        current_apps = set(rates.keys())
-        existing_apps = set(self.rows.keys())
-        for app in existing_apps - current_apps:
-            self.rows_container.remove_widget(self.rows[app])
-            del self.rows[app]
-        
-        data_list = list(rates.items())
+        self._sort_rows()
+
+    def update_apps(self, changes, ticks=1):
+        """Applies the RateChanges of `ticks` pipeline ticks: only the rows of apps that
+        changed are touched. Open detail graphs still get one sample per tick from the
+        full rate map, and 0 once their app has gone idle."""
+        for app_name in changes.removed:
+            row = self.rows.pop(app_name, None)
+            self.rates.pop(app_name, None)
+            if row is not None: self.rows_container.remove_widget(row)
+        for rates in (changes.added, changes.updated):
+            for app_name, (down, up) in rates.items():
+                if app_name not in self.rows: self.rows[app_name] = AppRow(app_name, self.popups)
+                self.rows[app_name].update_data(down, up)
+                self.rates[app_name] = (down, up)
+        for app_name, popup in list(self.popups.items()):
+            if popup.parent:
+                down, up = self.rates.get(app_name, (0.0, 0.0))
+                for _ in range(ticks): popup.update(down, up)
+            elif app_name not in self.rows:
+                del self.popups[app_name]
+        # Name order only changes with the set of apps; speed order with any update
+        if changes.added or changes.removed or (changes.updated and self.sort_key != 'name'):
+            self._sort_rows()
+
+    def _sort_rows(self):
+        data_list = list(self.rates.items())
         if self.sort_key == 'name': data_list.sort(key=lambda x: x[0].lower(), reverse=not self.sort_desc)
         elif self.sort_key == 'download': data_list.sort(key=lambda x: x[1][0], reverse=self.sort_desc)
         elif self.sort_key == 'upload': data_list.sort(key=lambda x: x[1][1], reverse=self.sort_desc)
 
+        order = [app_name for app_name, _ in data_list]
+        if order == self.order: return
+        self.order = order
         self.rows_container.clear_widgets()
-        for app_name, (down, up) in data_list:
-            if app_name not in self.rows: self.rows[app_name] = AppRow(app_name)
-            self.rows[app_name].update_data(down, up)
+        for app_name in order:
             self.rows_container.add_widget(self.rows[app_name])
 
 # =========================
@@ -359,13 +447,18 @@ class LogRow(BoxLayout):
         self.size_hint_y = None
         self.height = dp(30)
         self.log_entry = log_entry 
-        ts = datetime.datetime.fromtimestamp(log_entry[0]).strftime('%H:%M:%S')
+        # Rollup rows (history ranges) carry the remote IP only and a bucket start time
+        rollup = log_entry[5] is None
+        ts = datetime.datetime.fromtimestamp(log_entry[0]).strftime('%m-%d %H:%M' if rollup else '%H:%M:%S')
         self.add_widget(Label(text=ts, size_hint_x=0.15))
         self.app_name = log_entry[1]
         self.add_widget(Label(text=self.app_name, size_hint_x=0.25, shorten=True))
         spd = f"D:{log_entry[2]:.1f} U:{log_entry[3]:.1f}"
         self.add_widget(Label(text=spd, size_hint_x=0.2))
-        ips = f"{log_entry[4]} -> {log_entry[5]}"
+        if log_entry[4] == OTHER:
+            ips = "other flows (table full)"
+        else:
+            ips = f"remote {log_entry[4]}" if rollup else f"{log_entry[4]} -> {log_entry[5]}"
         self.add_widget(Label(text=ips, size_hint_x=0.4, font_size='11sp'))
         self.dropdown = DropDown()
         btn_loc = Button(text="Open Location", size_hint_y=None, height=dp(30))
@@ -397,6 +490,7 @@ class LogViewer(ModalView):
         self.aggregator = aggregator
         self.size_hint = (0.95, 0.9)
         self.current_logs = []
+        self.exporter = None
         layout = BoxLayout(orientation='vertical', padding=10)
         header = BoxLayout(size_hint_y=None, height=dp(40), spacing=10)
         header.add_widget(Label(text="Instance Logs", bold=True, font_size='20sp', size_hint_x=0.3))
@@ -414,7 +508,11 @@ class LogViewer(ModalView):
         btn_export = Button(text="Export to CSV", size_hint_x=None, width=120)
         btn_export.bind(on_release=self.export_csv)
         actions.add_widget(btn_export)
-        actions.add_widget(Label(text="")) 
+        actions.add_widget(Label(text=""))
+        # "Latest" shows raw rows; longer ranges read the matching rollup tier
+        self.range_spinner = Spinner(text="Latest", values=["Latest"] + list(HISTORY_RANGES), size_hint_x=None, width=140)
+        self.range_spinner.bind(text=self.refresh_logs)
+        actions.add_widget(self.range_spinner)
         layout.add_widget(actions)
         headers = BoxLayout(size_hint_y=None, height=dp(30))
         headers.add_widget(Label(text="Time", size_hint_x=0.15, bold=True, color=[1,1,0,1]))
@@ -434,22 +532,30 @@ class LogViewer(ModalView):
     def refresh_logs(self, *args):
         self.list_container.clear_widgets()
         search_text = self.search_input.text.strip()
-        self.current_logs = self.aggregator.get_logs(app_filter=search_text if search_text else None)
+        seconds = HISTORY_RANGES.get(self.range_spinner.text)
+        since = time.time() - seconds if seconds else None
+        self.current_logs = self.aggregator.get_logs(app_filter=search_text if search_text else None, since=since)
         for log in self.current_logs: self.list_container.add_widget(LogRow(log))
 
-    def export_csv(self, *args):
-        if not self.current_logs: return
+    def export_csv(self, button):
+        """Streams every raw row matching the search and range to a CSV file in the
+        background; pressing the button again while it runs cancels the export."""
+        from kivy.clock import Clock
+        if self.exporter is not None and not self.exporter.finished:
+            self.exporter.cancel()
+            return
+        search_text = self.search_input.text.strip()
+        seconds = HISTORY_RANGES.get(self.range_spinner.text)
         filename = f"traffic_logs_{int(time.time())}.csv"
-        try:
-            with open(filename, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Timestamp", "App Name", "Download (KB/s)", "Upload (KB/s)", "Src IP", "Dst IP"])
-                for log in self.current_logs:
-                    ts_str = datetime.datetime.fromtimestamp(log[0]).strftime('%Y-%m-%d %H:%M:%S')
-                    writer.writerow([ts_str, log[1], log[2], log[3], log[4], log[5]])
-            print(f"Exported to {filename}")
-            original_text = args[0].text
-            args[0].text = "Saved!"
-            from kivy.clock import Clock
-            Clock.schedule_once(lambda dt: setattr(args[0], 'text', original_text), 2)
-        except Exception as e: print(f"Export Error: {e}")
\ No newline at end of file
+        self.exporter = LogExporter(self.aggregator.db, filename, app_filter=search_text or None,
+                                    start=time.time() - seconds if seconds else None).start()
+
+        def poll(dt):
+            exporter = self.exporter
+            if not exporter.finished:
+                button.text = f"Exporting {exporter.progress * 100:.0f}% (cancel)"
+                return
+            button.text = {"done": "Saved!", "cancelled": "Cancelled"}.get(exporter.state, "Export failed")
+            Clock.schedule_once(lambda dt: setattr(button, 'text', "Export to CSV"), 2)
+            return False
+        Clock.schedule_interval(poll, 0.5)
\ No newline at end of file